@@ -1,9 +1,8 @@
-from flask import Flask, render_template, request, jsonify, make_response, send_from_directory, send_file
-import requests
-import json
+from flask import Flask, render_template, request, jsonify, make_response, send_file, g
+from flask.logging import default_handler
+import click
 from flask_migrate import Migrate
 from flask_cors import CORS
-from weasyprint import HTML
 from dotenv import load_dotenv
 import os
 import psycopg2
@@ -12,20 +11,38 @@ import uuid
 import time
 from datetime import datetime, timedelta
 from io import BytesIO
-from werkzeug.security import generate_password_hash, check_password_hash
 from db import db
 from sqlalchemy import text
 from clients import Clients
 from invoices import InvoiceOperations
 from businesses import Businesses
-import jwt
-from functools import lru_cache
+from bulk_import import BulkImport
+from user_resolver import UserResolver
+from token_verifier import TokenVerifier
+from passwords import PasswordHasher, PasswordHasherBusy
+from rendering import render_pdf, render_png
+from db_metrics import init_pool_instrumentation, pool_stats
+from overdue import sweep_overdue_invoices, run_overdue_scheduler
+from schema_migrations import run_migrations as run_schema_migrations
+from log_config import init_logging, LOG_LEVEL
+from compression import init_compression, benchmark_compression, sample_invoice_list
+from json_provider import FastJSONProvider, benchmark_json
+from fx import FxRateError, summarize_by_currency, parse_rates_file, load_rates, get_rates
+from logos import (UPLOAD_FOLDER, MAX_LOGO_BYTES, HASHED_FILENAME_RE, InvalidLogo, store_logo,
+                   logo_render_source, serve_upload, serving_stats)
+from werkzeug.exceptions import RequestEntityTooLarge
 from supabase import create_client, Client
 
 
-logging.basicConfig(level=logging.DEBUG)
+# Structured JSON logs written by a background listener; request threads only enqueue
+init_logging()
 
 app = Flask(__name__)
+# app.logger follows LOG_LEVEL through the queue even with app.debug on, not Flask's DEBUG stderr handler
+app.logger.removeHandler(default_handler)
+app.logger.setLevel(LOG_LEVEL)
+# orjson-backed jsonify; UUID, date/datetime and Decimal values serialize without manual conversion
+app.json = FastJSONProvider(app)
 load_dotenv()
 DB_PASSWORD = os.getenv('DB_PASSWORD', '')
 DATABASE_URL = os.environ.get("DATABASE_URL")
@@ -33,96 +50,100 @@ SUPABASE_URL = os.environ.get("SUPABASE_URL")
 SUPABASE_KEY = os.getenv("SUPABASE_SERVICE_ROLE_KEY")
 
 supabase: Client = create_client(SUPABASE_URL, SUPABASE_KEY)
+TokenVerifier.configure(SUPABASE_URL)
 
 app.config['SQLALCHEMY_DATABASE_URI'] = DATABASE_URL
 
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 
+# Explicit pool sizing; pre-ping drops connections closed by the server or proxy
+app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {
+    'pool_size': int(os.getenv('DB_POOL_SIZE', 10)),
+    'max_overflow': int(os.getenv('DB_MAX_OVERFLOW', 20)),
+    'pool_timeout': int(os.getenv('DB_POOL_TIMEOUT', 30)),
+    'pool_recycle': int(os.getenv('DB_POOL_RECYCLE', 1800)),
+    'pool_pre_ping': True,
+}
+
 db.init_app(app)
 from models import User, Client, Invoice, Business
 
-# Initialize Flask-Migrate
-migrate = Migrate(app, db)
+# Pool checkout/checkin counters and leak warnings
+init_pool_instrumentation(app, db)
+
+# Initialize Flask-Migrate; the schema is migrated by the release step (`flask run-migrations`), never on boot
+migrate = Migrate(app, db, directory=os.path.join(os.path.dirname(os.path.abspath(__file__)), 'migrations'))
 
 CORS(app, resources={r"/*": {"origins": "*"}})
 
-UPLOAD_FOLDER = os.path.abspath('uploads')
+# Brotli/gzip response compression negotiated from Accept-Encoding
+init_compression(app)
+
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
+# Multipart boundaries and part headers on top of the logo itself
+LOGO_FORM_OVERHEAD = 64 * 1024
 
 
-# Create tables if they don't exist
-with app.app_context():
-    try:
-        db.create_all()
-        print("Database tables created successfully")
-    except Exception as e:
-        print(f"Error creating database tables: {e}")
-    
-    # Run database migrations
-    try:
-        import os
-        migration_path = os.path.join(os.path.dirname(__file__), 'migration.sql')
-        print(f"Looking for migration file at: {migration_path}")
-        
-        if os.path.exists(migration_path):
-            with open(migration_path, 'r') as f:
-                migration_sql = f.read()
-            print(f"Migration file found, size: {len(migration_sql)} characters")
-            
-            # Split the SQL into individual statements
-            statements = migration_sql.split(';')
-            print(f"Found {len(statements)} SQL statements")
-            
-            for i, statement in enumerate(statements):
-                statement = statement.strip()
-                if statement and not statement.startswith('--'):
-                    try:
-                        db.session.execute(text(statement))
-                        print(f"Executed migration {i+1}: {statement[:50]}...")
-                    except Exception as e:
-                        # Ignore constraint already exists errors
-                        if "already exists" in str(e) or "duplicate key" in str(e):
-                            print(f"Migration statement {i+1} skipped (already exists): {statement[:50]}...")
-                        else:
-                            print(f"Migration statement {i+1} failed: {e}")
-                            print(f"Full statement: {statement}")
-            
-            db.session.commit()
-            print("Database migrations completed successfully")
-        else:
-            print(f"Migration file not found at {migration_path}")
-    except Exception as e:
-        print(f"Error running migrations: {e}")
-        import traceback
-        traceback.print_exc()
+@app.before_request
+def start_request_timer():
+    g.request_started = time.monotonic()
 
 
 @app.after_request
 def after_request(response):
-    response.headers.add('Access-Control-Allow-Headers', 'Content-Type,Authorization')
-    response.headers.add('Access-Control-Allow-Methods', 'GET,POST,PUT,DELETE,OPTIONS')
+    response.headers.add('Access-Control-Allow-Headers', 'Content-Type,Authorization,If-Match')
+    response.headers.add('Access-Control-Allow-Methods', 'GET,POST,PUT,PATCH,DELETE,OPTIONS')
+    response.headers.add('Access-Control-Expose-Headers', 'ETag')
     response.headers.add('Access-Control-Allow-Origin', '*')
     response.headers['Permissions-Policy'] = 'payment=*'
-    app.logger.info(f"Request: {request.method} {request.path} - Status: {response.status_code}")
+    # Sampled per route (LOG_SAMPLE_RATES); 5xx responses are logged as errors and always kept
+    route = request.url_rule.rule if request.url_rule else request.path
+    started = g.get('request_started')
+    app.logger.log(
+        logging.ERROR if response.status_code >= 500 else logging.INFO,
+        f"{request.method} {request.path} {response.status_code}",
+        extra={
+            'route': route,
+            'method': request.method,
+            'path': request.path,
+            'status': response.status_code,
+            'duration_ms': round((time.monotonic() - started) * 1000, 1) if started else None,
+        }
+    )
     return response
 
 
 @app.route('/uploads/<filename>')
 def uploaded_file(filename):
-    return send_from_directory(UPLOAD_FOLDER, filename)
+    return serve_upload(filename)
 
 
 @app.route('/upload-logo', methods=['POST'])
 def upload_logo():
-    if 'logo' not in request.files or request.files['logo'].filename == '':
+    # Refuse oversized bodies before Werkzeug parses them (the limit is per request, so imports keep theirs)
+    request.max_content_length = MAX_LOGO_BYTES + LOGO_FORM_OVERHEAD
+    try:
+        logo = request.files.get('logo')
+    except RequestEntityTooLarge:
+        return jsonify({'error': f'Logo exceeds {MAX_LOGO_BYTES // (1024 * 1024)} MB'}), 413
+    if logo is None or logo.filename == '':
         return jsonify({'error': 'No logo file provided'}), 400
 
-    logo = request.files['logo']
-    logo_path = os.path.join(UPLOAD_FOLDER, logo.filename)
-    logo.save(logo_path)
+    # Stored under its content hash with pre-sized variants; the client filename is ignored.
+    # One byte past the limit is enough for store_logo() to reject it
+    try:
+        stored = store_logo(logo.read(MAX_LOGO_BYTES + 1))
+    except InvalidLogo as e:
+        return jsonify({'error': str(e)}), 400
 
-    logo_url = f"{request.host_url}uploads/{logo.filename}"
-    return jsonify({'message': 'Logo uploaded successfully', 'logo_url': logo_url}), 200
+    variant_urls = {name: f"{request.host_url}uploads/{filename}" for name, filename in stored['variants'].items()}
+    return jsonify({
+        'message': 'Logo uploaded successfully',
+        'logo_url': variant_urls.get('print', f"{request.host_url}uploads/{stored['original']}"),
+        'original_url': f"{request.host_url}uploads/{stored['original']}",
+        'variants': variant_urls,
+        'deduplicated': stored['deduplicated']
+    }), 200
 
 
 def parse_invoice_data(data):
@@ -221,21 +242,12 @@ def parse_invoice_data(data):
 def preview_invoice():
     try:
         data = request.get_json()
-        app.logger.debug(f"[PREVIEW] Received data: {data}")
         template_data = parse_invoice_data(data)
+        template_data['logo_url'] = logo_render_source(template_data['logo_url'], 'preview')
         html = render_template('invoice_template3.html', **template_data)
 
-        # Render PDF first
-        pdf_io = BytesIO()
-        HTML(string=html).write_pdf(pdf_io)
-        pdf_io.seek(0)
-
-        # Convert PDF to PNG using pdf2image
-        from pdf2image import convert_from_bytes
-        images = convert_from_bytes(pdf_io.read())
-        img_io = BytesIO()
-        images[0].save(img_io, format='PNG')
-        img_io.seek(0)
+        # Render PDF and convert to PNG off the event loop
+        img_io = BytesIO(render_png(html))
 
         return send_file(img_io, mimetype='image/png')
 
@@ -248,13 +260,12 @@ def preview_invoice():
 def generate_invoice():
     try:
         data = request.get_json()
-        app.logger.debug(f"[GENERATE] Received data: {data}")
         template_data = parse_invoice_data(data)
+        template_data['logo_url'] = logo_render_source(template_data['logo_url'], 'print')
         html = render_template('invoice_template3.html', **template_data)
-        pdf = HTML(string=html).write_pdf()
+        pdf = render_pdf(html)
 
         response = make_response(pdf)
-        print(template_data)
         response.headers['Content-Type'] = 'application/pdf'
         response.headers['Content-Disposition'] = f'attachment; filename=invoice_{template_data["invoice_number"]}.pdf'
         return response
@@ -271,39 +282,37 @@ def get_invoices():
         if not user_id:
             return jsonify({'success': False, 'error': 'user_id required'}), 400
 
-        # Check if this is a Supabase user ID (stored in google_id field)
-        from models import User
-        user = User.query.filter_by(google_id=user_id).first()
-        
-        if not user:
-            # Try to find by regular user ID
-            user = User.query.filter_by(id=user_id).first()
-            
-            if not user:
-                return jsonify({'success': False, 'error': 'User not found'}), 404
-        
+        # Resolve Supabase (google_id) or internal ID to the actual user ID
+        resolved_id = UserResolver.resolve(user_id)
+        if not resolved_id:
+            return jsonify({'success': False, 'error': 'User not found'}), 404
+
         # Use the actual user ID from the database
-        actual_user_id = str(user.id)
+        actual_user_id = str(resolved_id)
 
-        from models import Invoice
-        invoices = Invoice.query.filter_by(user_id=actual_user_id).all()
+        try:
+            query = InvoiceOperations.list_query(
+                actual_user_id,
+                status=request.args.get('status'),
+                currency=request.args.get('currency'),
+                invoice_number=request.args.get('invoice_number'),
+                sort=request.args.get('sort'),  # e.g. ?sort=total&order=desc
+                order=request.args.get('order'),
+            )
+        except ValueError as e:
+            return jsonify({'success': False, 'error': str(e)}), 400
+
+        invoices = db.session.execute(query).scalars().all()
         
         # You may want to serialize your invoices appropriately:
         result = []
         for inv in invoices:
-            try:
-                # Try to access business_id, but handle case where column doesn't exist
-                business_id = str(inv.business_id) if hasattr(inv, 'business_id') and inv.business_id else None
-            except Exception as e:
-                app.logger.warning(f"Error accessing business_id for invoice {inv.id}: {e}")
-                business_id = None
-                
             try:
                 result.append({
-                    'id': str(inv.id),
-                    'user_id': str(inv.user_id),
-                    'business_id': business_id,
-                    'client_id': str(inv.client_id) if inv.client_id else None,
+                    'id': inv.id,
+                    'user_id': inv.user_id,
+                    'business_id': inv.business_id,
+                    'client_id': inv.client_id,
                     'invoice_number': getattr(inv, 'invoice_number', None),
                     'data': inv.data,
                     'issued_date': inv.issued_date,
@@ -335,28 +344,8 @@ def save_invoice():
     if not user_id or not invoice_data:
         return jsonify({'success': False, 'error': 'Missing required fields (user_id, data)'}), 400
 
-    # Check if this is a Supabase user ID (stored in google_id field)
-    from models import User
-    user = User.query.filter_by(google_id=user_id).first()
-    
-    if not user:
-        # Try to find by regular user ID
-        user = User.query.filter_by(id=user_id).first()
-        
-        if not user:
-            # Create a new user automatically for Supabase Auth users
-            user = User(
-                email=f"user_{user_id[:8]}@temp.com",
-                first_name="",
-                last_name="",
-                google_id=user_id,
-                password_hash=None
-            )
-            db.session.add(user)
-            db.session.commit()
-    
-    # Use the actual user ID from the database
-    actual_user_id = str(user.id)
+    # Resolve Supabase (google_id) or internal ID, creating the user for new Supabase Auth users
+    actual_user_id = str(UserResolver.resolve(user_id, create=True))
 
     # Validate UUID format for client_id if provided
     if client_id:
@@ -388,81 +377,51 @@ def save_invoice():
 
 @app.route('/api/dashboard', methods=['GET'])
 def get_dashboard_data():
+    """Dashboard stats and recent invoices; amounts per currency and converted to ?reporting_currency="""
     user_id = request.args.get('user_id')
     if not user_id:
         return jsonify({'error': 'user_id is required'}), 400
 
     try:
-        # Check if this is a Supabase user ID (stored in google_id field)
-        from models import User
-        user = User.query.filter_by(google_id=user_id).first()
-        
-        if not user:
-            # Try to find by regular user ID
-            user = User.query.filter_by(id=user_id).first()
-            
-            if not user:
-                return jsonify({'error': 'User not found'}), 404
-        
-        # Use the actual user ID from the database
-        actual_user_id = str(user.id)
+        # Resolve Supabase (google_id) or internal ID to the actual user ID
+        resolved_id = UserResolver.resolve(user_id)
+        if not resolved_id:
+            return jsonify({'error': 'User not found'}), 404
 
-        from sqlalchemy.orm import Session
-        session = Session(bind=db.engine)
+        # Use the actual user ID from the database
+        actual_user_id = str(resolved_id)
 
-        # Get all invoices for the user
-        invoices = session.query(Invoice).filter_by(user_id=actual_user_id).all()
+        # Per (currency, status) sums from SQL; amounts are never added across currencies
+        rows = InvoiceOperations.currency_totals(actual_user_id)
+        summary = summarize_by_currency(rows, {
+            'total_revenue': ('paid',),
+            'pending_amount': ('sent', 'overdue'),
+        }, request.args.get('reporting_currency'), request.args.get('fx_version'))
 
-        # Initialize stats
         stats = {
-            'total_revenue': 0.0,
-            'pending_amount': 0.0,
-            'total_invoices': len(invoices),
-            'total_clients': 0,
-            'paid_invoices': 0,
-            'overdue_invoices': 0,
-            'monthly_growth': 0.0
+            **summary.pop('totals'),
+            'total_invoices': sum(row.count for row in rows),
+            'total_clients': db.session.execute(InvoiceOperations.client_count_query(actual_user_id)).scalar(),
+            'paid_invoices': sum(row.count for row in rows if row.status == 'paid'),
+            'overdue_invoices': sum(row.count for row in rows if row.status == 'overdue'),
+            'monthly_growth': 0.0,
+            **summary
         }
 
-        # Track unique clients
-        client_ids = set()
-
-        for invoice in invoices:
-            if invoice.client_id:
-                client_ids.add(str(invoice.client_id))
-
-            # Get amount from invoice data
-            amount = 0.0
-            if isinstance(invoice.data, dict):
-                try:
-                    amount = float(invoice.data.get('amount', 0))
-                except (ValueError, TypeError):
-                    pass
-
-            # Update stats based on status
-            if invoice.status == 'paid':
-                stats['total_revenue'] += amount
-                stats['paid_invoices'] += 1
-            elif invoice.status == 'overdue':
-                stats['pending_amount'] += amount
-                stats['overdue_invoices'] += 1
-            elif invoice.status == 'sent':
-                stats['pending_amount'] += amount
-
-        stats['total_clients'] = len(client_ids)
-
         # Get recent invoices (last 5)
+        recent = db.session.execute(InvoiceOperations.recent_query(actual_user_id, 5)).all()
         recent_invoices = []
-        for inv in sorted(invoices, key=lambda x: x.created_at, reverse=True)[:5]:
+        for inv, amount, currency in recent:
             recent_invoices.append({
-                'id': str(inv.id),
+                'id': inv.id,
                 'invoice_number': inv.data.get('invoice_number', '') if isinstance(inv.data, dict) else '',
                 'client_name': inv.data.get('to', '') if isinstance(inv.data, dict) else '',
                 'client_email': inv.data.get('email', '') if isinstance(inv.data, dict) else '',
-                'amount': float(inv.data.get('amount', 0)) if isinstance(inv.data, dict) else 0.0,
+                'amount': amount,
+                'currency': currency,
                 'status': inv.status,
-                'created_date': inv.created_at.isoformat() if inv.created_at else None,
-                'due_date': inv.due_date.isoformat() if inv.due_date else None,
+                'created_date': inv.created_at,
+                'due_date': inv.due_date,
                 'description': ', '.join([item.get('name', '') for item in inv.data.get('items', [])])
                 if isinstance(inv.data, dict) and isinstance(inv.data.get('items'), list)
                 else ''
@@ -476,6 +435,8 @@ def get_dashboard_data():
             }
         })
 
+    except FxRateError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
     except Exception as e:
         app.logger.error(f"Error in get_dashboard_data: {str(e)}", exc_info=True)
         return jsonify({
@@ -496,21 +457,25 @@ def get_invoice(invoice_id):
         if not invoice:
             return jsonify({'success': False, 'error': 'Invoice not found'}), 404
 
-        return jsonify({
+        response = jsonify({
             'success': True,
             'invoice': {
-                'id': str(invoice.id),
-                'user_id': str(invoice.user_id),
-                'business_id': str(invoice.business_id) if invoice.business_id else None,
-                'client_id': str(invoice.client_id) if invoice.client_id else None,
+                'id': invoice.id,
+                'user_id': invoice.user_id,
+                'business_id': invoice.business_id,
+                'client_id': invoice.client_id,
                 'data': invoice.data,
                 'status': invoice.status,
-                'created_at': invoice.created_at.isoformat() if invoice.created_at else None,
-                'updated_at': invoice.updated_at.isoformat() if hasattr(invoice, 'updated_at') and invoice.updated_at else None,
-                'issued_date': invoice.issued_date.isoformat() if invoice.issued_date else None,
-                'due_date': invoice.due_date.isoformat() if invoice.due_date else None
+                'created_at': invoice.created_at,
+                'updated_at': invoice.updated_at,
+                'issued_date': invoice.issued_date,
+                'due_date': invoice.due_date
             }
         })
+        # Version token for PATCH If-Match
+        if invoice.updated_at:
+            response.headers['ETag'] = InvoiceOperations.etag_for(invoice.updated_at)
+        return response
 
     except Exception as e:
         app.logger.error(f"Error getting invoice {invoice_id}: {str(e)}", exc_info=True)
@@ -533,6 +498,18 @@ def update_invoice_status(invoice_id):
     return InvoiceOperations.update_invoice_status(str(invoice_id))
 
 
+@app.route('/api/invoices/<uuid:invoice_id>', methods=['PATCH'])
+def patch_invoice(invoice_id):
+    """
+    PATCH /api/invoices/<invoice_id>?user_id=<uuid>
+    Content-Type: application/merge-patch+json
+    If-Match: <ETag from GET or a previous PATCH> (optional)
+
+    Merge-patches the invoice data in place (RFC 7396); null removes a key
+    """
+    return InvoiceOperations.patch_invoice(str(invoice_id))
+
+
 # Add delete functionality (NEW)
 @app.route('/api/invoices/<invoice_id>', methods=['DELETE'])
 def delete_invoice(invoice_id):
@@ -547,6 +524,21 @@ def delete_invoice(invoice_id):
     return InvoiceOperations.delete_invoice(str(invoice_id))
 
 
+@app.route('/api/invoices/bulk/status', methods=['POST'])
+def bulk_update_invoice_status():
+    """
+    POST /api/invoices/bulk/status     one status for many invoices in a single statement
+
+    Request body:
+    {
+        "invoice_ids": ["uuid1", "uuid2", ...],
+        "status": "paid|draft|sent|overdue|cancelled",
+        "user_id": "<uuid>"
+    }
+    """
+    return InvoiceOperations.bulk_update_invoice_status()
+
+
 # Add bulk delete functionality (NEW)
 @app.route('/api/invoices/bulk/delete', methods=['POST'])
 def bulk_delete_invoices():
@@ -562,6 +554,24 @@ def bulk_delete_invoices():
     return InvoiceOperations.bulk_delete_invoices()
 
 
+@app.route('/api/invoices/export', methods=['GET'])
+def export_invoices():
+    """
+    GET /api/invoices/export?user_id=<id>&format=csv|ndjson
+    Streams every invoice for the user; CSV has one row per line item
+    """
+    return InvoiceOperations.export_invoices()
+
+
+@app.route('/api/invoices/search', methods=['GET'])
+def search_invoices():
+    """
+    GET /api/invoices/search?user_id=<id>&q=<text>&limit=20
+    Ranked full-text search over invoice numbers, parties, line items and terms
+    """
+    return InvoiceOperations.search_invoices()
+
+
 # Add invoice statistics (NEW)
 @app.route('/api/invoices/statistics/<uuid:user_id>', methods=['GET'])
 def get_invoice_statistics(user_id):
@@ -609,28 +619,20 @@ def signup():
         existing = User.query.filter_by(email=email).first()
         if existing:
             return jsonify({'success': False, 'error': 'Email already registered.'}), 409
-        pw_hash = generate_password_hash(password)
+        pw_hash = PasswordHasher.hash(password)
         user = User(email=email, password_hash=pw_hash, first_name=first_name, last_name=last_name)
         db.session.add(user)
         db.session.commit()
         return jsonify({'success': True,
                         'user': {'id': str(user.id), 'email': user.email, 'first_name': user.first_name,
                                  'last_name': user.last_name}})
+    except PasswordHasherBusy:
+        return jsonify({'success': False, 'error': 'Too many sign-ups in progress, please retry.'}), 503, {'Retry-After': '1'}
     except Exception as e:
-        import traceback
-        print(traceback.format_exc())
+        app.logger.error(f"Registration failed: {str(e)}", exc_info=True)
         return jsonify({'success': False, 'error': str(e)}), 500
 
 
-@lru_cache(maxsize=1)
-def get_supabase_jwks():
-    """Fetch and cache Supabase JWKS keys."""
-    jwks_url = f"{SUPABASE_URL}/auth/v1/keys"
-    res = requests.get(jwks_url, timeout=5)
-    res.raise_for_status()
-    return res.json()
-
-
 @app.route("/api/auth/google", methods=["POST"])
 def google_login():
     """Handle Google OAuth login and sync with a local database"""
@@ -642,16 +644,8 @@ def google_login():
     token = auth_header.split(" ", 1)[1]
 
     try:
-        # Get Supabase JWKS
-        jwks = get_supabase_jwks()
-        unverified_header = jwt.get_unverified_header(token)
-        key = next((k for k in jwks["keys"] if k["kid"] == unverified_header["kid"]), None)
-        if not key:
-            return jsonify({"success": False, "error": "Invalid signing key"}), 401
-
-        # Verify token
-        public_key = jwt.algorithms.RSAAlgorithm.from_jwk(json.dumps(key))
-        payload = jwt.decode(token, public_key, algorithms=["RS256"], options={"verify_aud": False})
+        # Verify token against the cached Supabase signing keys
+        payload = TokenVerifier.verify(token)
 
         user_id = payload["sub"]  # Supabase user UUID
         email = payload.get("email")
@@ -666,49 +660,15 @@ def google_login():
         return jsonify({"success": False, "error": f"Token verification failed: {str(e)}"}), 401
 
     try:
-        # First check if user exists by Google ID
-        existing_user = User.query.filter_by(google_id=user_id).first()
-
-        if not existing_user:
-            # Check if user exists by email (maybe they signed up with email first)
-            existing_user = User.query.filter_by(email=email).first()
-
-        if not existing_user:
-            # Create new user - let the model generate its own UUID for id
-            new_user = User(
-                email=email,
-                first_name=first_name,
-                last_name=last_name,
-                google_id=user_id,  # Store Supabase user ID in google_id field
-                password_hash=None  # No password for OAuth users
-            )
-            db.session.add(new_user)
-            db.session.commit()
-            user_obj = new_user
-            app.logger.info(f"Created new Google user: {email} with google_id: {user_id}")
-        else:
-            # Update existing user with Google ID if it's missing
-            if not existing_user.google_id:
-                existing_user.google_id = user_id
-
-            # Update name if it's missing or empty
-            if not existing_user.first_name and first_name:
-                existing_user.first_name = first_name
-            if not existing_user.last_name and last_name:
-                existing_user.last_name = last_name
-
-            # Update timestamp
-            existing_user.updated_at = datetime.utcnow()
-
-            db.session.commit()
-            user_obj = existing_user
-            app.logger.info(f"Updated existing user for Google login: {email}")
+        # Find, link (same email) or create the user in one statement
+        user_obj = UserResolver.provision(user_id, email=email, first_name=first_name, last_name=last_name)
+        app.logger.info(f"{'Created new' if user_obj.created else 'Signed in existing'} Google user: {email}")
 
         return jsonify({
             "success": True,
             "message": "Login successful",
             "user": {
-                "id": str(user_obj.id),  # This will be our generated UUID
+                "id": user_obj.id,  # This will be our generated UUID
                 "first_name": user_obj.first_name,
                 "last_name": user_obj.last_name,
                 "email": user_obj.email,
@@ -736,8 +696,17 @@ def signin():
         return jsonify({'success': False, 'error': 'Email and password required.'}), 400
     from models import User
     user = User.query.filter_by(email=email).first()
-    if not user or not check_password_hash(user.password_hash, password):
-        return jsonify({'success': False, 'error': 'Invalid email or password.'}), 401
+    try:
+        if not user or not PasswordHasher.verify(user.password_hash, password):
+            return jsonify({'success': False, 'error': 'Invalid email or password.'}), 401
+
+        # Upgrade hashes made with older cost parameters while the plaintext is at hand
+        if PasswordHasher.needs_rehash(user.password_hash):
+            user.password_hash = PasswordHasher.hash(password)
+            db.session.commit()
+            PasswordHasher.record_rehash()
+    except PasswordHasherBusy:
+        return jsonify({'success': False, 'error': 'Too many sign-ins in progress, please retry.'}), 503, {'Retry-After': '1'}
     return jsonify({'success': True, 'user': {'id': str(user.id), 'email': user.email, 'first_name': user.first_name,
                                               'last_name': user.last_name}})
 
@@ -775,14 +744,14 @@ def check_auth_status():
         return jsonify({
             'success': True,
             'user': {
-                'id': str(user.id),
+                'id': user.id,
                 'email': user.email,
                 'first_name': user.first_name,
                 'last_name': user.last_name,
                 'google_id': user.google_id,
                 'auth_method': 'google' if user.google_id else 'native',
                 'is_guest': user.is_guest,
-                'created_at': user.created_at.isoformat() if user.created_at else None
+                'created_at': user.created_at
             }
         })
 
@@ -835,17 +804,18 @@ def update_profile():
 
         user.updated_at = datetime.utcnow()
         db.session.commit()
+        UserResolver.invalidate(user.id, user.google_id)
 
         return jsonify({
             'success': True,
             'user': {
-                'id': str(user.id),
+                'id': user.id,
                 'email': user.email,
                 'first_name': user.first_name,
                 'last_name': user.last_name,
                 'google_id': user.google_id,
                 'auth_method': 'google' if user.google_id else 'native',
-                'updated_at': user.updated_at.isoformat()
+                'updated_at': user.updated_at
             }
         })
 
@@ -877,29 +847,23 @@ def db_info():
             'message': str(e)
         }), 500
 
-@app.route('/run-migrations', methods=['POST'])
-def run_migrations():
-    """Run database migrations"""
-    try:
-        # Read the migration SQL file
-        with open('migration.sql', 'r') as f:
-            migration_sql = f.read()
-        
-        # Execute the migration SQL
-        db.session.execute(text(migration_sql))
-        db.session.commit()
-        
-        return jsonify({
-            'status': 'success',
-            'message': 'Database migration completed successfully'
-        })
-    except Exception as e:
-        app.logger.error(f"Migration failed: {str(e)}", exc_info=True)
-        db.session.rollback()
-        return jsonify({
-            'status': 'error',
-            'message': str(e)
-        }), 500
+@app.route('/db-pool')
+def db_pool():
+    """Connection pool usage, saturation and long-held connections"""
+    return jsonify({'status': 'success', 'pool': pool_stats()})
+
+
+@app.route('/password-hash-stats')
+def password_hash_stats():
+    """Password hashing executor: queue depth, rejections, rehashes and latency percentiles"""
+    return jsonify({'status': 'success', 'password_hashing': PasswordHasher.stats()})
+
+
+@app.route('/uploads-stats')
+def uploads_stats():
+    """Upload serving counters: responses, 304s and bytes sent by Python versus the front proxy"""
+    return jsonify({'status': 'success', 'uploads': serving_stats()})
+
 
 @app.route('/api/clients', methods=['POST'])
 def create_client():
@@ -913,6 +877,12 @@ def get_clients():
     return Clients.get_clients()
 
 
+@app.route('/api/clients/autocomplete', methods=['GET'])
+def autocomplete_clients():
+    """Ranked client suggestions for autocomplete (?user_id=&q=&limit=)"""
+    return Clients.autocomplete_clients()
+
+
 @app.route('/api/clients/<uuid:client_id>', methods=['GET'])
 def get_client(client_id):
     """Get a specific client by ID"""
@@ -942,6 +912,14 @@ def bulk_delete_clients():
     """Delete multiple clients at once"""
     return Clients.bulk_delete_clients()
 
+@app.route('/api/import/<kind>', methods=['POST'])
+def import_records(kind):
+    """
+    POST /api/import/<clients|businesses|invoices>?user_id=<id>&format=csv|ndjson
+    Streams a CSV/NDJSON body (or multipart 'file') and upserts it in batches with per-row errors
+    """
+    return BulkImport.import_records(kind)
+
 # Business routes
 @app.route('/api/businesses', methods=['POST'])
 def create_business():
@@ -951,6 +929,10 @@ def create_business():
 def get_businesses():
     return Businesses.get_businesses()
 
+@app.route('/api/businesses/autocomplete', methods=['GET'])
+def autocomplete_businesses():
+    return Businesses.autocomplete_businesses()
+
 @app.route('/api/businesses/<uuid:business_id>', methods=['GET'])
 def get_business(business_id):
     return Businesses.get_business(business_id)
@@ -992,6 +974,119 @@ def home():
     })
 
 
+@app.cli.command('check-query-plans')
+@click.option('--seed-rows', default=0, help='Seed this many synthetic clients/invoices first (rolled back afterwards).')
+def check_query_plans_command(seed_rows):
+    """Fail if any hot endpoint query falls back to a sequential scan"""
+    from query_plans import check_query_plans
+    failures = check_query_plans(seed_rows)
+    for name, tables in failures:
+        click.echo(f"SEQ SCAN  {name}: {', '.join(tables)}", err=True)
+    if failures:
+        raise SystemExit(1)
+    click.echo("All hot query plans use indexes")
+
+
+@app.cli.command('run-migrations')
+@click.option('--revision', default='head', help='Target Alembic revision.')
+def run_migrations_command(revision):
+    """Apply pending schema migrations under an advisory lock (deploy release step)"""
+    result = run_schema_migrations(revision)
+    click.echo(f"Schema at {result['to']} (was {result['from']}) in {result['seconds']}s")
+
+
+@app.cli.command('bench-compression')
+@click.option('--invoices', default=200, help='Invoices in the synthetic /api/invoices payload.')
+@click.option('--rounds', default=5, help='Compressions per setting to average over.')
+def bench_compression_command(invoices, rounds):
+    """Compare CPU cost against bytes saved for each compression setting on an invoice list"""
+    for r in benchmark_compression(sample_invoice_list(invoices), rounds):
+        click.echo(f"{r['encoding']:>4} level {r['level']:>2}: {r['raw_bytes']} -> {r['compressed_bytes']} bytes "
+                   f"(ratio {r['ratio']}), {r['cpu_ms']} ms CPU, {r['mb_per_cpu_s']} MB/CPU-s")
+
+
+@app.cli.command('bench-json')
+@click.option('--invoices', default=10000, help='Invoices in the synthetic /api/invoices payload.')
+@click.option('--rounds', default=5, help='Encodes per encoder to average over.')
+def bench_json_command(invoices, rounds):
+    """Compare JSON encode time of the fast provider against the stdlib encoder on an invoice list"""
+    for r in benchmark_json(sample_invoice_list(invoices), rounds):
+        click.echo(f"{r['encoder']:>6}: {r['bytes']} bytes in {r['ms']} ms")
+
+
+@app.cli.command('prepare-logos')
+def prepare_logos_command():
+    """Derive hashed print/preview variants for legacy uploads (including SVGs) ahead of first render"""
+    prepared, skipped = 0, 0
+    for filename in sorted(os.listdir(UPLOAD_FOLDER)):
+        if HASHED_FILENAME_RE.match(filename) or filename.endswith('.tmp'):
+            continue
+        with open(os.path.join(UPLOAD_FOLDER, filename), 'rb') as f:
+            try:
+                store_logo(f.read())
+                prepared += 1
+            except InvalidLogo as e:
+                click.echo(f"Skipped {filename}: {e}", err=True)
+                skipped += 1
+    click.echo(f"{prepared} logos prepared, {skipped} skipped")
+
+
+@app.cli.command('load-fx-rates')
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--version', 'version', default=None, help='Version name; defaults to the effective date, then today.')
+@click.option('--base', default=None, help='Base currency, if the file does not name one.')
+@click.option('--effective-date', default=None, help='YYYY-MM-DD the rates apply to, if the file does not say.')
+@click.option('--source', default=None, help='Where the rates came from; defaults to the file name.')
+def load_fx_rates_command(path, version, base, effective_date, source):
+    """Load a CSV/JSON file of FX rates as a new (or replacement) rate version"""
+    try:
+        rates, file_base, file_date = parse_rates_file(path)
+        version = load_rates(rates, base or file_base or 'USD', version=version,
+                             effective_date=effective_date or file_date,
+                             source=source or os.path.basename(path))
+    except FxRateError as e:
+        raise click.ClickException(str(e))
+    table = get_rates(version)
+    click.echo(f"Loaded {len(table['rates'])} rates as version {version} (base {table['base_currency']})")
+
+
+@app.cli.command('sweep-overdue')
+@click.option('--batch-size', default=1000, help='Invoices updated per transaction.')
+@click.option('--every', default=0, help='Keep sweeping every N seconds (the Procfile clock process).')
+def sweep_overdue_command(batch_size, every):
+    """Mark sent invoices past their due date as overdue"""
+    if every > 0:
+        click.echo(f"Sweeping overdue invoices every {every}s")
+        run_overdue_scheduler(every, batch_size)
+        return
+    result = sweep_overdue_invoices(batch_size)
+    if result is None:
+        click.echo("Another process is already sweeping")
+        return
+    click.echo(f"{result['updated']} invoices marked overdue for {result['users']} users "
+               f"in {result['batches']} batches")
+
+
+@app.cli.command('import')
+@click.argument('kind', type=click.Choice(BulkImport.KINDS))
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--user-id', required=True, help='Internal or Supabase user ID to import for.')
+@click.option('--format', 'fmt', type=click.Choice(BulkImport.FORMATS), default=None,
+              help='Input format; defaults to ndjson for .ndjson/.jsonl files, csv otherwise.')
+def import_command(kind, path, user_id, fmt):
+    """Bulk import clients, businesses or invoices from a CSV/NDJSON file"""
+    fmt = fmt or ('ndjson' if path.endswith(('.ndjson', '.jsonl')) else 'csv')
+    resolved_id = UserResolver.resolve(user_id, create=True)
+    with open(path, 'rb') as f:
+        result = BulkImport.import_stream(kind, f, fmt, str(resolved_id))
+
+    for error in result['errors']:
+        click.echo(f"row {error['row']}: {'; '.join(error['errors'])}", err=True)
+    rate = result['processed'] / result['seconds'] if result['seconds'] else result['processed']
+    click.echo(f"{result['processed']} rows: {result['inserted']} inserted, {result['updated']} updated, "
+               f"{result['failed']} failed in {result['seconds']}s ({rate:.0f} rows/s)")
+
+
 if __name__ == '__main__':
     app.run(port=5000, debug=True)
 
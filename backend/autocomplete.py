@@ -0,0 +1,28 @@
+from db import db
+
+
+def autocomplete_query(model, columns, user_id, term, limit):
+    """
+    Suggestion rows of `columns` from the user's `model` rows (clients or businesses).
+
+    Ranked by trigram similarity to `term` on name and email, or newest first when `term` is empty.
+    """
+    query = db.select(*columns).where(model.user_id == user_id)
+
+    if term:
+        # Substring matches use the trigram GIN indexes; '%' adds typo-tolerant name matches
+        pattern = '%' + term.replace('!', '!!').replace('%', '!%').replace('_', '!_') + '%'
+        score = db.func.greatest(
+            db.func.similarity(model.name, term),
+            db.func.word_similarity(term, model.name),
+            db.func.similarity(db.func.coalesce(model.email, ''), term)
+        )
+        query = query.where(db.or_(
+            model.name.ilike(pattern, escape='!'),
+            model.email.ilike(pattern, escape='!'),
+            model.phone.ilike(pattern, escape='!'),
+            model.name.op('%')(term)
+        )).order_by(score.desc(), model.name)
+    else:
+        query = query.order_by(model.created_at.desc())
+    return query.limit(limit)
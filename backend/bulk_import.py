@@ -0,0 +1,377 @@
+from flask import request, jsonify
+from db import db
+from sqlalchemy import text
+from psycopg2.extras import execute_values
+from clients import Clients
+from businesses import Businesses
+from invoices import InvoiceOperations
+from user_resolver import UserResolver
+from models import Business, Client, Invoice
+from datetime import date
+import psycopg2.extensions
+import csv
+import io
+import json
+import logging
+import os
+import time
+import uuid
+
+
+class BulkImport:
+    """Streaming CSV/NDJSON import of clients, businesses and invoices through a COPY staging table"""
+
+    KINDS = ('clients', 'businesses', 'invoices')
+    FORMATS = ('csv', 'ndjson')
+    BATCH_SIZE = int(os.getenv('IMPORT_BATCH_SIZE', 5000))
+    MAX_REPORTED_ERRORS = 1000
+
+    # Staging table columns (after row_no) and their Postgres types
+    STAGE_COLUMNS = {
+        'clients': [('name', 'text'), ('email', 'text'), ('address', 'text'), ('phone', 'text')],
+        'businesses': [('name', 'text'), ('email', 'text'), ('address', 'text'), ('phone', 'text'),
+                       ('website', 'text'), ('logo_url', 'text'), ('tax_id', 'text')],
+        'invoices': [('invoice_number', 'text'), ('client_id', 'uuid'), ('business_id', 'uuid'),
+                     ('data', 'jsonb'), ('issued_date', 'date'), ('due_date', 'date'), ('status', 'text')],
+    }
+
+    # Model whose String(n) column lengths bound each kind's values
+    MODELS = {'clients': Client, 'businesses': Business, 'invoices': Invoice}
+
+    @staticmethod
+    def iter_records(stream, fmt):
+        """Yield (row_no, record, parse_error) from a binary stream without reading it all into memory"""
+        # Line by line, so neither the request body nor an uploaded file is read whole
+        lines = (raw.decode('utf-8-sig', errors='replace') for raw in stream)
+        if fmt == 'csv':
+            for row_no, record in enumerate(csv.DictReader(lines), start=1):
+                yield row_no, record, None
+        else:
+            row_no = 0
+            for line in lines:
+                if not line.strip():
+                    continue
+                row_no += 1
+                try:
+                    record = json.loads(line)
+                except ValueError as e:
+                    yield row_no, None, f'Invalid JSON: {e}'
+                    continue
+                if not isinstance(record, dict):
+                    yield row_no, None, 'Each line must be a JSON object'
+                    continue
+                yield row_no, record, None
+
+    @staticmethod
+    def _clean(value):
+        if isinstance(value, str):
+            value = value.strip()
+            return value or None
+        return value
+
+    @staticmethod
+    def _parse_date(value):
+        value = BulkImport._clean(value)
+        if value is None or isinstance(value, date):
+            return value
+        return date.fromisoformat(str(value)[:10])
+
+    @staticmethod
+    def _length_errors(kind, values):
+        """Values longer than their model column allows, which would otherwise fail the whole batch"""
+        columns = BulkImport.MODELS[kind].__table__.c
+        errors = []
+        for name, value in values.items():
+            length = getattr(columns[name].type, 'length', None)
+            if value is not None and length and len(str(value)) > length:
+                errors.append(f'{name} must be at most {length} characters')
+        return errors
+
+    @staticmethod
+    def validate_record(kind, record, user_id):
+        """Return (staging row, errors) using the same rules as the single-record endpoints"""
+        record = {key: BulkImport._clean(value) for key, value in record.items() if key}
+        columns = [name for name, _ in BulkImport.STAGE_COLUMNS[kind]]
+
+        if kind in ('clients', 'businesses'):
+            # NDJSON may carry numbers (e.g. phone); the party columns are all text
+            record = {key: value if value is None else str(value) for key, value in record.items()}
+
+        if kind in ('clients', 'businesses'):
+            validate = Clients.validate_client_data if kind == 'clients' else Businesses.validate_business_data
+            errors = validate({**record, 'user_id': user_id})
+            errors += BulkImport._length_errors(kind, {name: record.get(name) for name in columns})
+            return [record.get(name) for name in columns], errors
+
+        errors = []
+        data = record.get('data')
+        if isinstance(data, str):
+            try:
+                data = json.loads(data)
+            except ValueError:
+                errors.append('data must be valid JSON')
+        if not isinstance(data, dict):
+            errors.append('data must be a JSON object')
+
+        status = (record.get('status') or 'draft').lower()
+        if not InvoiceOperations.validate_status(status):
+            errors.append(f'Invalid status. Must be one of: {", ".join(InvoiceOperations.VALID_STATUSES)}')
+
+        for key in ('client_id', 'business_id'):
+            if record.get(key) and not InvoiceOperations.validate_uuid(str(record[key])):
+                errors.append(f'Invalid {key} format')
+
+        dates = {}
+        for key in ('issued_date', 'due_date'):
+            try:
+                dates[key] = BulkImport._parse_date(record.get(key))
+            except ValueError:
+                errors.append(f'Invalid {key}, expected YYYY-MM-DD')
+
+        if errors:
+            return None, errors
+
+        invoice_number = record.get('invoice_number') or data.get('invoice_number') \
+            or f"INV-{int(time.time())}-{uuid.uuid4().hex[:8]}"
+        # currency is copied from data->>'currency' on merge
+        errors = BulkImport._length_errors('invoices', {'invoice_number': invoice_number,
+                                                        'currency': data.get('currency')})
+        if errors:
+            return None, errors
+        return [
+            str(invoice_number),
+            record.get('client_id'),
+            record.get('business_id'),
+            json.dumps(data),
+            dates['issued_date'],
+            dates['due_date'],
+            status
+        ], []
+
+    @staticmethod
+    def _dedupe_key(kind, row):
+        """Rows sharing a key would hit the same target row twice in one merge"""
+        if kind == 'invoices':
+            return row[0]
+        email = row[1]
+        return email.lower() if email else None
+
+    @staticmethod
+    def _stage(kind, rows):
+        """Load a batch into a temp staging table: COPY normally, multi-row INSERT under gevent"""
+        columns = BulkImport.STAGE_COLUMNS[kind]
+        column_list = ', '.join(['row_no'] + [name for name, _ in columns])
+        column_defs = ', '.join(['row_no integer'] + [f'{name} {type_}' for name, type_ in columns])
+
+        db.session.execute(text(f'CREATE TEMP TABLE import_stage ({column_defs}) ON COMMIT DROP'))
+        cursor = db.session.connection().connection.cursor()
+        try:
+            # psycopg2 rejects COPY when a green wait callback (psycogreen) is installed
+            if psycopg2.extensions.get_wait_callback() is None:
+                buffer = io.StringIO()
+                csv.writer(buffer).writerows(rows)
+                buffer.seek(0)
+                cursor.copy_expert(f'COPY import_stage ({column_list}) FROM STDIN WITH (FORMAT csv)', buffer)
+            else:
+                execute_values(cursor, f'INSERT INTO import_stage ({column_list}) VALUES %s', rows, page_size=1000)
+        finally:
+            cursor.close()
+
+    @staticmethod
+    def _merge_parties(kind, user_id, limit):
+        """Update existing clients/businesses matched by email, insert the rest up to the plan limit"""
+        columns = [name for name, _ in BulkImport.STAGE_COLUMNS[kind]]
+        params = {'user_id': user_id}
+
+        assignments = ', '.join(
+            ['name = s.name'] + [f'{name} = COALESCE(s.{name}, t.{name})' for name in columns if name != 'name']
+        )
+        updated = db.session.execute(text(f"""
+            UPDATE {kind} t SET {assignments}, updated_at = timezone('utc', now())
+            FROM import_stage s
+            WHERE t.user_id = CAST(:user_id AS uuid) AND s.email IS NOT NULL AND lower(t.email) = lower(s.email)
+            RETURNING s.row_no
+        """), params).scalars().all()
+
+        existing = db.session.execute(
+            text(f'SELECT count(*) FROM {kind} WHERE user_id = CAST(:user_id AS uuid)'), params
+        ).scalar()
+        params['remaining'] = max(limit - existing, 0)
+
+        column_list = ', '.join(columns)
+        selected = ', '.join(f'p.{name}' for name in columns)
+        inserted = db.session.execute(text(f"""
+            WITH picked AS (
+                SELECT s.* FROM import_stage s
+                WHERE NOT EXISTS (
+                    SELECT 1 FROM {kind} t
+                    WHERE t.user_id = CAST(:user_id AS uuid) AND s.email IS NOT NULL AND lower(t.email) = lower(s.email)
+                )
+                ORDER BY s.row_no
+                LIMIT :remaining
+            ), inserted AS (
+                INSERT INTO {kind} (id, user_id, {column_list}, created_at, updated_at)
+                SELECT gen_random_uuid(), CAST(:user_id AS uuid), {selected},
+                       timezone('utc', now()), timezone('utc', now())
+                FROM picked p
+            )
+            SELECT row_no FROM picked
+        """), params).scalars().all()
+
+        return inserted, updated, 'Client limit reached' if kind == 'clients' else 'Business limit reached'
+
+    @staticmethod
+    def _merge_invoices(user_id):
+        """Upsert invoices on invoice_number, never touching another user's invoice"""
+        params = {'user_id': user_id}
+        errors = {}
+
+        # Client/business references must exist and belong to the importing user
+        for column, table in (('client_id', 'clients'), ('business_id', 'businesses')):
+            rejected = db.session.execute(text(f"""
+                DELETE FROM import_stage s
+                WHERE s.{column} IS NOT NULL AND NOT EXISTS (
+                    SELECT 1 FROM {table} t WHERE t.id = s.{column} AND t.user_id = CAST(:user_id AS uuid)
+                )
+                RETURNING s.row_no
+            """), params).scalars().all()
+            for row_no in rejected:
+                errors[row_no] = [f'{column} not found']
+
+        rows = db.session.execute(text("""
+            WITH upserted AS (
+                INSERT INTO invoices (id, user_id, client_id, business_id, invoice_number, data,
+                                      issued_date, due_date, status, currency, created_at, updated_at)
+                SELECT gen_random_uuid(), CAST(:user_id AS uuid), s.client_id, s.business_id, s.invoice_number, s.data,
+                       s.issued_date, s.due_date, s.status, COALESCE(s.data->>'currency', 'USD'),
+                       timezone('utc', now()), timezone('utc', now())
+                FROM import_stage s
+                ON CONFLICT (invoice_number) DO UPDATE SET
+                    client_id = EXCLUDED.client_id,
+                    business_id = EXCLUDED.business_id,
+                    data = EXCLUDED.data,
+                    issued_date = EXCLUDED.issued_date,
+                    due_date = EXCLUDED.due_date,
+                    status = EXCLUDED.status,
+                    currency = EXCLUDED.currency,
+                    updated_at = timezone('utc', now())
+                WHERE invoices.user_id = EXCLUDED.user_id
+                RETURNING invoice_number, (xmax = 0) AS inserted
+            )
+            SELECT s.row_no, u.inserted FROM import_stage s JOIN upserted u USING (invoice_number)
+        """), params).all()
+
+        inserted = [row.row_no for row in rows if row.inserted]
+        updated = [row.row_no for row in rows if not row.inserted]
+        return inserted, updated, 'Invoice number already used by another account', errors
+
+    @staticmethod
+    def _flush(kind, user_id, batch, result):
+        """Stage and merge one batch in its own transaction, retrying row by row if the batch fails"""
+        if not batch:
+            return
+        try:
+            BulkImport._stage(kind, batch)
+            if kind == 'invoices':
+                inserted, updated, leftover_error, errors = BulkImport._merge_invoices(user_id)
+            else:
+                limit = Clients.CLIENT_LIMIT if kind == 'clients' else Businesses.BUSINESS_LIMIT
+                inserted, updated, leftover_error = BulkImport._merge_parties(kind, user_id, limit)
+                errors = {}
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            if len(batch) > 1:
+                # Retry row by row so one bad value only fails its own row
+                logging.warning(f"Error importing {kind} batch, retrying {len(batch)} rows one at a time: {str(e)}")
+                for row in batch:
+                    BulkImport._flush(kind, user_id, [row], result)
+                return
+            logging.error(f"Error importing {kind} row {batch[0][0]}: {str(e)}", exc_info=True)
+            inserted, updated, leftover_error, errors = [], [], 'Row failed to import', {}
+
+        handled = set(inserted) | set(updated) | set(errors)
+        for row in batch:
+            if row[0] not in handled:
+                errors[row[0]] = [leftover_error]
+
+        result['inserted'] += len(inserted)
+        result['updated'] += len(updated)
+        for row_no, row_errors in sorted(errors.items()):
+            BulkImport._add_error(result, row_no, row_errors)
+
+    @staticmethod
+    def _add_error(result, row_no, errors):
+        result['failed'] += 1
+        if len(result['errors']) < BulkImport.MAX_REPORTED_ERRORS:
+            result['errors'].append({'row': row_no, 'errors': errors})
+
+    @staticmethod
+    def import_stream(kind, stream, fmt, user_id):
+        """Validate, stage and upsert every record in the stream in batches; returns a summary"""
+        result = {'processed': 0, 'inserted': 0, 'updated': 0, 'failed': 0, 'errors': []}
+        seen = set()
+        batch = []
+        started = time.monotonic()
+
+        for row_no, record, parse_error in BulkImport.iter_records(stream, fmt):
+            result['processed'] += 1
+            if parse_error:
+                BulkImport._add_error(result, row_no, [parse_error])
+                continue
+
+            row, errors = BulkImport.validate_record(kind, record, user_id)
+            if errors:
+                BulkImport._add_error(result, row_no, errors)
+                continue
+
+            key = BulkImport._dedupe_key(kind, row)
+            if key is not None:
+                if key in seen:
+                    BulkImport._add_error(result, row_no, ['Duplicate of an earlier row in this import'])
+                    continue
+                seen.add(key)
+
+            batch.append([row_no] + row)
+            if len(batch) >= BulkImport.BATCH_SIZE:
+                BulkImport._flush(kind, user_id, batch, result)
+                batch = []
+
+        BulkImport._flush(kind, user_id, batch, result)
+
+        elapsed = time.monotonic() - started
+        result['seconds'] = round(elapsed, 3)
+        logging.info(f"Imported {kind} for user {user_id}: {result['inserted']} inserted, "
+                     f"{result['updated']} updated, {result['failed']} failed in {elapsed:.2f}s")
+        return result
+
+    @staticmethod
+    def import_records(kind):
+        """POST /api/import/<kind>?user_id=&format=csv|ndjson with a raw body or a multipart 'file'"""
+        try:
+            if kind not in BulkImport.KINDS:
+                return jsonify({'success': False, 'error': f'Invalid import type. Must be one of: {", ".join(BulkImport.KINDS)}'}), 400
+
+            user_id = request.args.get('user_id')
+            if not user_id:
+                return jsonify({'success': False, 'error': 'user_id is required'}), 400
+
+            upload = request.files.get('file')
+            fmt = request.args.get('format')
+            if not fmt:
+                name = (upload.filename if upload else '') or ''
+                content_type = (upload.mimetype if upload else request.mimetype) or ''
+                fmt = 'ndjson' if name.endswith(('.ndjson', '.jsonl')) or 'ndjson' in content_type else 'csv'
+            if fmt not in BulkImport.FORMATS:
+                return jsonify({'success': False, 'error': f'Invalid format. Must be one of: {", ".join(BulkImport.FORMATS)}'}), 400
+
+            resolved_id = UserResolver.resolve(user_id, create=True)
+            stream = upload.stream if upload else request.stream
+
+            result = BulkImport.import_stream(kind, stream, fmt, str(resolved_id))
+            return jsonify({'success': True, 'type': kind, **result}), 200
+
+        except Exception as e:
+            db.session.rollback()
+            logging.error(f"Error importing {kind}: {str(e)}", exc_info=True)
+            return jsonify({'success': False, 'error': f'Failed to import {kind}'}), 500
@@ -1,6 +1,8 @@
 from flask import request, jsonify
 from db import db
 from models import Business
+from user_resolver import UserResolver
+from autocomplete import autocomplete_query
 from datetime import datetime
 import uuid
 import logging
@@ -9,6 +11,9 @@ import logging
 class Businesses:
     """CRUD operations for Business model"""
 
+    # Maximum businesses per user on the current plan
+    BUSINESS_LIMIT = 2
+
     @staticmethod
     def validate_uuid(uuid_string):
         """Validate UUID format"""
@@ -58,37 +63,17 @@ class Businesses:
             # Get user ID from request
             user_id = data['user_id']
             
-            # Check if this is a Supabase user ID (stored in google_id field)
-            from models import User
-            user = User.query.filter_by(google_id=user_id).first()
-            
-            if not user:
-                # Try to find by regular user ID
-                user = User.query.filter_by(id=user_id).first()
-                
-                if not user:
-                    # Create a new user automatically for Supabase Auth users
-                    user = User(
-                        email=f"user_{user_id[:8]}@temp.com",
-                        first_name="",
-                        last_name="",
-                        google_id=user_id,
-                        password_hash=None
-                    )
-                    db.session.add(user)
-                    db.session.commit()
-            
-            # Use the actual user ID from the database
-            actual_user_id = str(user.id)
+            # Resolve Supabase (google_id) or internal ID, creating the user for new Supabase Auth users
+            actual_user_id = str(UserResolver.resolve(user_id, create=True))
 
             # Check business limit (2 businesses per user)
             business_count = Business.query.filter_by(user_id=actual_user_id).count()
-            if business_count >= 2:
+            if business_count >= Businesses.BUSINESS_LIMIT:
                 return jsonify({
                     'success': False,
                     'error': 'Business limit reached',
                     'limit_reached': True,
-                    'message': 'You have reached the maximum limit of 2 businesses. Please upgrade your plan to add more businesses.'
+                    'message': f'You have reached the maximum limit of {Businesses.BUSINESS_LIMIT} businesses. Please upgrade your plan to add more businesses.'
                 }), 403
 
             # Check if business with same email already exists for this user
@@ -121,8 +106,8 @@ class Businesses:
             return jsonify({
                 'success': True,
                 'business': {
-                    'id': str(business.id),
-                    'user_id': str(business.user_id),
+                    'id': business.id,
+                    'user_id': business.user_id,
                     'name': business.name,
                     'email': business.email,
                     'address': business.address,
@@ -130,8 +115,8 @@ class Businesses:
                     'website': business.website,
                     'logo_url': business.logo_url,
                     'tax_id': business.tax_id,
-                    'created_at': business.created_at.isoformat() if business.created_at else None,
-                    'updated_at': business.updated_at.isoformat() if business.updated_at else None
+                    'created_at': business.created_at,
+                    'updated_at': business.updated_at
                 }
             }), 201
 
@@ -140,6 +125,21 @@ class Businesses:
             logging.error(f"Error creating business: {str(e)}", exc_info=True)
             return jsonify({'success': False, 'error': 'Failed to create business'}), 500
 
+    @staticmethod
+    def list_query(user_id, search=''):
+        """The user's businesses, newest first, optionally filtered by a name/email/phone substring"""
+        query = db.select(Business).where(Business.user_id == user_id)
+        if search:
+            search_term = f"%{search}%"
+            query = query.where(
+                db.or_(
+                    Business.name.ilike(search_term),
+                    Business.email.ilike(search_term),
+                    Business.phone.ilike(search_term)
+                )
+            )
+        return query.order_by(Business.created_at.desc())
+
     @staticmethod
     def get_businesses():
         """Get all businesses for a user with optional filtering and pagination"""
@@ -151,19 +151,13 @@ class Businesses:
             if not Businesses.validate_uuid(user_id):
                 return jsonify({'success': False, 'error': 'Invalid user_id format'}), 400
 
-            # Check if this is a Supabase user ID (stored in google_id field)
-            from models import User
-            user = User.query.filter_by(google_id=user_id).first()
-            
-            if not user:
-                # Try to find by regular user ID
-                user = User.query.filter_by(id=user_id).first()
-                
-                if not user:
-                    return jsonify({'success': False, 'error': 'User not found'}), 404
-            
+            # Resolve Supabase (google_id) or internal ID to the actual user ID
+            resolved_id = UserResolver.resolve(user_id)
+            if not resolved_id:
+                return jsonify({'success': False, 'error': 'User not found'}), 404
+
             # Use the actual user ID from the database
-            actual_user_id = str(user.id)
+            actual_user_id = str(resolved_id)
 
             # Pagination parameters
             page = int(request.args.get('page', 1))
@@ -171,27 +165,14 @@ class Businesses:
             search = request.args.get('search', '')
             limit = int(request.args.get('limit', 0))  # For autocomplete, limit results
 
-            # Build query
-            query = Business.query.filter_by(user_id=actual_user_id)
-
-            # Apply search filter if provided
-            if search:
-                search_term = f"%{search}%"
-                query = query.filter(
-                    db.or_(
-                        Business.name.ilike(search_term),
-                        Business.email.ilike(search_term),
-                        Business.phone.ilike(search_term)
-                    )
-                )
-
-            # Order by created_at descending
-            query = query.order_by(Business.created_at.desc())
+            query = Businesses.list_query(actual_user_id, search=search)
 
             # Apply limit for autocomplete
             if limit > 0:
-                businesses = query.limit(limit).all()
-                total_count = query.count()
+                businesses = db.session.execute(query.limit(limit)).scalars().all()
+                total_count = db.session.execute(
+                    db.select(db.func.count()).select_from(query.order_by(None).subquery())
+                ).scalar()
                 pagination = {
                     'total': total_count,
                     'pages': 1,
@@ -202,7 +183,8 @@ class Businesses:
                 }
             else:
                 # Paginate
-                paginated = query.paginate(
+                paginated = db.paginate(
+                    query,
                     page=page,
                     per_page=per_page,
                     error_out=False
@@ -224,8 +206,8 @@ class Businesses:
                 invoice_count = len(business.invoices) if business.invoices else 0
 
                 business_list.append({
-                    'id': str(business.id),
-                    'user_id': str(business.user_id),
+                    'id': business.id,
+                    'user_id': business.user_id,
                     'name': business.name,
                     'email': business.email,
                     'address': business.address,
@@ -234,8 +216,8 @@ class Businesses:
                     'logo_url': business.logo_url,
                     'tax_id': business.tax_id,
                     'invoice_count': invoice_count,
-                    'created_at': business.created_at.isoformat() if business.created_at else None,
-                    'updated_at': business.updated_at.isoformat() if business.updated_at else None
+                    'created_at': business.created_at,
+                    'updated_at': business.updated_at
                 })
 
             return jsonify({
@@ -248,6 +230,50 @@ class Businesses:
             logging.error(f"Error getting businesses: {str(e)}", exc_info=True)
             return jsonify({'success': False, 'error': 'Failed to get businesses'}), 500
 
+    @staticmethod
+    def autocomplete_query(user_id, term, limit):
+        """Suggestion rows for `term` ranked by trigram similarity, or the newest when `term` is empty"""
+        columns = [Business.id, Business.name, Business.email, Business.phone, Business.address,
+                   Business.website, Business.logo_url, Business.tax_id]
+        return autocomplete_query(Business, columns, user_id, term, limit)
+
+    @staticmethod
+    def autocomplete_businesses():
+        """Ranked business suggestions for autocomplete, backed by pg_trgm indexes (no total count)"""
+        try:
+            user_id = request.args.get('user_id')
+            if not user_id:
+                return jsonify({'success': False, 'error': 'user_id is required'}), 400
+
+            term = (request.args.get('q') or '').strip()
+            try:
+                limit = min(max(int(request.args.get('limit', 10)), 1), 50)
+            except ValueError:
+                return jsonify({'success': False, 'error': 'limit must be an integer'}), 400
+
+            resolved_id = UserResolver.resolve(user_id)
+            if not resolved_id:
+                return jsonify({'success': False, 'error': 'User not found'}), 404
+
+            results = []
+            for row in db.session.execute(Businesses.autocomplete_query(resolved_id, term, limit)).all():
+                results.append({
+                    'id': row.id,
+                    'name': row.name,
+                    'email': row.email,
+                    'phone': row.phone,
+                    'address': row.address,
+                    'website': row.website,
+                    'logo_url': row.logo_url,
+                    'tax_id': row.tax_id
+                })
+
+            return jsonify({'success': True, 'businesses': results}), 200
+
+        except Exception as e:
+            logging.error(f"Error autocompleting businesses: {str(e)}", exc_info=True)
+            return jsonify({'success': False, 'error': 'Failed to get businesses'}), 500
+
     @staticmethod
     def get_business(business_id):
         """Get a specific business by ID"""
@@ -265,8 +291,8 @@ class Businesses:
             return jsonify({
                 'success': True,
                 'business': {
-                    'id': str(business.id),
-                    'user_id': str(business.user_id),
+                    'id': business.id,
+                    'user_id': business.user_id,
                     'name': business.name,
                     'email': business.email,
                     'address': business.address,
@@ -275,8 +301,8 @@ class Businesses:
                     'logo_url': business.logo_url,
                     'tax_id': business.tax_id,
                     'invoice_count': invoice_count,
-                    'created_at': business.created_at.isoformat() if business.created_at else None,
-                    'updated_at': business.updated_at.isoformat() if business.updated_at else None
+                    'created_at': business.created_at,
+                    'updated_at': business.updated_at
                 }
             })
 
@@ -342,8 +368,8 @@ class Businesses:
             return jsonify({
                 'success': True,
                 'business': {
-                    'id': str(business.id),
-                    'user_id': str(business.user_id),
+                    'id': business.id,
+                    'user_id': business.user_id,
                     'name': business.name,
                     'email': business.email,
                     'address': business.address,
@@ -352,8 +378,8 @@ class Businesses:
                     'logo_url': business.logo_url,
                     'tax_id': business.tax_id,
                     'invoice_count': invoice_count,
-                    'created_at': business.created_at.isoformat() if business.created_at else None,
-                    'updated_at': business.updated_at.isoformat() if business.updated_at else None
+                    'created_at': business.created_at,
+                    'updated_at': business.updated_at
                 }
             })
 
@@ -1,6 +1,11 @@
 from flask import request, jsonify
 from db import db
-from models import Client
+from sqlalchemy import any_, bindparam
+from sqlalchemy.dialects.postgresql import ARRAY
+from models import Client, Invoice
+from user_resolver import UserResolver
+from autocomplete import autocomplete_query
+from fx import FxRateError, summarize_by_currency
 from datetime import datetime
 import uuid
 import logging
@@ -9,6 +14,9 @@ import logging
 class Clients:
     """CRUD operations for Client model"""
 
+    # Maximum clients per user on the current plan
+    CLIENT_LIMIT = 10
+
     @staticmethod
     def validate_uuid(uuid_string):
         """Validate UUID format"""
@@ -58,37 +66,17 @@ class Clients:
             # Get user ID from request
             user_id = data['user_id']
             
-            # Check if this is a Supabase user ID (stored in google_id field)
-            from models import User
-            user = User.query.filter_by(google_id=user_id).first()
-            
-            if not user:
-                # Try to find by regular user ID
-                user = User.query.filter_by(id=user_id).first()
-                
-                if not user:
-                    # Create a new user automatically for Supabase Auth users
-                    user = User(
-                        email=f"user_{user_id[:8]}@temp.com",
-                        first_name="",
-                        last_name="",
-                        google_id=user_id,
-                        password_hash=None
-                    )
-                    db.session.add(user)
-                    db.session.commit()
-            
-            # Use the actual user ID from the database
-            actual_user_id = str(user.id)
+            # Resolve Supabase (google_id) or internal ID, creating the user for new Supabase Auth users
+            actual_user_id = str(UserResolver.resolve(user_id, create=True))
 
             # Check client limit (10 clients per user)
             client_count = Client.query.filter_by(user_id=actual_user_id).count()
-            if client_count >= 10:
+            if client_count >= Clients.CLIENT_LIMIT:
                 return jsonify({
                     'success': False,
                     'error': 'Client limit reached',
                     'limit_reached': True,
-                    'message': 'You have reached the maximum limit of 10 clients. Please upgrade your plan to add more clients.'
+                    'message': f'You have reached the maximum limit of {Clients.CLIENT_LIMIT} clients. Please upgrade your plan to add more clients.'
                 }), 403
 
             # Check if client with same email already exists for this user
@@ -118,14 +106,14 @@ class Clients:
             return jsonify({
                 'success': True,
                 'client': {
-                    'id': str(client.id),
-                    'user_id': str(client.user_id),
+                    'id': client.id,
+                    'user_id': client.user_id,
                     'name': client.name,
                     'email': client.email,
                     'address': client.address,
                     'phone': client.phone,
-                    'created_at': client.created_at.isoformat() if client.created_at else None,
-                    'updated_at': client.updated_at.isoformat() if client.updated_at else None
+                    'created_at': client.created_at,
+                    'updated_at': client.updated_at
                 }
             }), 201
 
@@ -134,6 +122,48 @@ class Clients:
             logging.error(f"Error creating client: {str(e)}", exc_info=True)
             return jsonify({'success': False, 'error': 'Failed to create client'}), 500
 
+    @staticmethod
+    def list_query(user_id, search='', include_stats=False):
+        """
+        The user's clients, newest first, with invoice counts from one LEFT JOIN ... GROUP BY.
+
+        Rows carry the Client, invoice_count, total_count (matching clients, via a window so paging
+        needs no second COUNT query) and, with stats, last_invoice_at. Balances come from balances_query().
+        """
+        columns = [Client, db.func.count(Invoice.id).label('invoice_count'), db.func.count().over().label('total_count')]
+        if include_stats:
+            columns.append(db.func.max(Invoice.created_at).label('last_invoice_at'))
+        query = db.select(*columns).outerjoin(
+            Invoice, Invoice.client_id == Client.id
+        ).where(Client.user_id == user_id).group_by(Client.id)
+
+        if search:
+            search_term = f"%{search}%"
+            query = query.where(
+                db.or_(
+                    Client.name.ilike(search_term),
+                    Client.email.ilike(search_term),
+                    Client.phone.ilike(search_term)
+                )
+            )
+        return query.order_by(Client.created_at.desc())
+
+    @staticmethod
+    def balances_query(client_ids):
+        """Invoice count and summed amount per (client, currency, status), the same amounts the dashboard sums"""
+        return (
+            db.select(
+                Invoice.client_id,
+                Invoice.data_currency().label('currency'),
+                db.func.lower(Invoice.status).label('status'),
+                db.func.count().label('count'),
+                db.func.coalesce(db.func.sum(Invoice.data_amount()), 0).label('amount'),
+            )
+            .where(Invoice.client_id == any_(bindparam('client_ids', list(client_ids),
+                                                         type_=ARRAY(db.UUID(as_uuid=True)))))
+            .group_by(db.text('1'), db.text('2'), db.text('3'))
+        )
+
     @staticmethod
     def get_clients():
         """Get all clients for a user with optional filtering and pagination"""
@@ -145,89 +175,74 @@ class Clients:
             if not Clients.validate_uuid(user_id):
                 return jsonify({'success': False, 'error': 'Invalid user_id format'}), 400
 
-            # Check if this is a Supabase user ID (stored in google_id field)
-            from models import User
-            user = User.query.filter_by(google_id=user_id).first()
-            
-            if not user:
-                # Try to find by regular user ID
-                user = User.query.filter_by(id=user_id).first()
-                
-                if not user:
-                    return jsonify({'success': False, 'error': 'User not found'}), 404
-            
+            # Resolve Supabase (google_id) or internal ID to the actual user ID
+            resolved_id = UserResolver.resolve(user_id)
+            if not resolved_id:
+                return jsonify({'success': False, 'error': 'User not found'}), 404
+
             # Use the actual user ID from the database
-            actual_user_id = str(user.id)
+            actual_user_id = str(resolved_id)
 
             # Pagination parameters
             page = int(request.args.get('page', 1))
             per_page = int(request.args.get('per_page', 10))
             search = request.args.get('search', '')
             limit = int(request.args.get('limit', 0))  # For autocomplete, limit results
+            include_stats = request.args.get('include_stats', '').lower() in ('1', 'true', 'yes')
 
-            # Build query
-            query = Client.query.filter_by(user_id=actual_user_id)
-
-            # Apply search filter if provided
-            if search:
-                search_term = f"%{search}%"
-                query = query.filter(
-                    db.or_(
-                        Client.name.ilike(search_term),
-                        Client.email.ilike(search_term),
-                        Client.phone.ilike(search_term)
-                    )
-                )
-
-            # Order by created_at descending
-            query = query.order_by(Client.created_at.desc())
+            query = Clients.list_query(actual_user_id, search=search, include_stats=include_stats)
 
-            # Apply limit for autocomplete
+            # A limit (autocomplete) is a single first page
             if limit > 0:
-                clients = query.limit(limit).all()
-                total_count = query.count()
-                pagination = {
-                    'total': total_count,
-                    'pages': 1,
-                    'per_page': limit,
-                    'current_page': 1,
-                    'has_prev': False,
-                    'has_next': False
-                }
+                page, per_page = 1, limit
+            page, per_page = max(page, 1), max(per_page, 1)
+            clients = db.session.execute(query.limit(per_page).offset((page - 1) * per_page)).all()
+            if clients:
+                total_count = clients[0].total_count
             else:
-                # Paginate
-                paginated = query.paginate(
-                    page=page,
-                    per_page=per_page,
-                    error_out=False
-                )
-                clients = paginated.items
-                total_count = paginated.total
-                pagination = {
-                    'total': paginated.total,
-                    'pages': paginated.pages,
-                    'per_page': per_page,
-                    'current_page': page,
-                    'has_prev': paginated.has_prev,
-                    'has_next': paginated.has_next
-                }
+                # Past the last page the window has no rows to report on
+                total_count = 0 if page == 1 else db.session.execute(
+                    db.select(db.func.count()).select_from(query.order_by(None).subquery())
+                ).scalar()
+            pages = 1 if limit > 0 else -(-total_count // per_page)
+            pagination = {
+                'total': total_count,
+                'pages': pages,
+                'per_page': per_page,
+                'current_page': page,
+                'has_prev': page > 1,
+                'has_next': page < pages
+            }
+
+            balances = {}
+            if include_stats and clients:
+                client_ids = [row.Client.id for row in clients]
+                for balance in db.session.execute(Clients.balances_query(client_ids)):
+                    balances.setdefault(balance.client_id, []).append(balance)
 
             client_list = []
-            for client in clients:
-                # Count invoices for this client
-                invoice_count = len(client.invoices) if client.invoices else 0
-
-                client_list.append({
-                    'id': str(client.id),
-                    'user_id': str(client.user_id),
+            for row in clients:
+                client = row.Client
+                client_data = {
+                    'id': client.id,
+                    'user_id': client.user_id,
                     'name': client.name,
                     'email': client.email,
                     'address': client.address,
                     'phone': client.phone,
-                    'invoice_count': invoice_count,
-                    'created_at': client.created_at.isoformat() if client.created_at else None,
-                    'updated_at': client.updated_at.isoformat() if client.updated_at else None
-                })
+                    'invoice_count': row.invoice_count,
+                    'created_at': client.created_at,
+                    'updated_at': client.updated_at
+                }
+                if include_stats:
+                    # Converted to reporting_currency (?reporting_currency=, ?fx_version=); by_currency is unconverted
+                    summary = summarize_by_currency(balances.get(client.id, []), {
+                        'total_billed': ('sent', 'paid', 'overdue'),
+                        'outstanding': ('sent', 'overdue'),
+                    }, request.args.get('reporting_currency'), request.args.get('fx_version'))
+                    client_data.update({key: float(value) for key, value in summary.pop('totals').items()},
+                                       last_invoice_at=row.last_invoice_at, **summary)
+                client_list.append(client_data)
 
             return jsonify({
                 'success': True,
@@ -235,10 +250,52 @@ class Clients:
                 'pagination': pagination
             }), 200
 
+        except FxRateError as e:
+            return jsonify({'success': False, 'error': str(e)}), 400
         except Exception as e:
             logging.error(f"Error getting clients: {str(e)}", exc_info=True)
             return jsonify({'success': False, 'error': 'Failed to get clients'}), 500
 
+    @staticmethod
+    def autocomplete_query(user_id, term, limit):
+        """Suggestion rows for `term` ranked by trigram similarity, or the newest when `term` is empty"""
+        columns = [Client.id, Client.name, Client.email, Client.phone, Client.address]
+        return autocomplete_query(Client, columns, user_id, term, limit)
+
+    @staticmethod
+    def autocomplete_clients():
+        """Ranked client suggestions for autocomplete, backed by pg_trgm indexes (no total count)"""
+        try:
+            user_id = request.args.get('user_id')
+            if not user_id:
+                return jsonify({'success': False, 'error': 'user_id is required'}), 400
+
+            term = (request.args.get('q') or '').strip()
+            try:
+                limit = min(max(int(request.args.get('limit', 10)), 1), 50)
+            except ValueError:
+                return jsonify({'success': False, 'error': 'limit must be an integer'}), 400
+
+            resolved_id = UserResolver.resolve(user_id)
+            if not resolved_id:
+                return jsonify({'success': False, 'error': 'User not found'}), 404
+
+            results = []
+            for row in db.session.execute(Clients.autocomplete_query(resolved_id, term, limit)).all():
+                results.append({
+                    'id': row.id,
+                    'name': row.name,
+                    'email': row.email,
+                    'phone': row.phone,
+                    'address': row.address
+                })
+
+            return jsonify({'success': True, 'clients': results}), 200
+
+        except Exception as e:
+            logging.error(f"Error autocompleting clients: {str(e)}", exc_info=True)
+            return jsonify({'success': False, 'error': 'Failed to get clients'}), 500
+
     @staticmethod
     def get_client(client_id):
         """Get a specific client by ID"""
@@ -256,15 +313,15 @@ class Clients:
             return jsonify({
                 'success': True,
                 'client': {
-                    'id': str(client.id),
-                    'user_id': str(client.user_id),
+                    'id': client.id,
+                    'user_id': client.user_id,
                     'name': client.name,
                     'email': client.email,
                     'address': client.address,
                     'phone': client.phone,
                     'invoice_count': invoice_count,
-                    'created_at': client.created_at.isoformat() if client.created_at else None,
-                    'updated_at': client.updated_at.isoformat() if client.updated_at else None
+                    'created_at': client.created_at,
+                    'updated_at': client.updated_at
                 }
             })
 
@@ -324,15 +381,15 @@ class Clients:
             return jsonify({
                 'success': True,
                 'client': {
-                    'id': str(client.id),
-                    'user_id': str(client.user_id),
+                    'id': client.id,
+                    'user_id': client.user_id,
                     'name': client.name,
                     'email': client.email,
                     'address': client.address,
                     'phone': client.phone,
                     'invoice_count': invoice_count,
-                    'created_at': client.created_at.isoformat() if client.created_at else None,
-                    'updated_at': client.updated_at.isoformat() if client.updated_at else None
+                    'created_at': client.created_at,
+                    'updated_at': client.updated_at
                 }
             })
 
@@ -372,6 +429,20 @@ class Clients:
             logging.error(f"Error deleting client {client_id}: {str(e)}", exc_info=True)
             return jsonify({'success': False, 'error': 'Failed to delete client'}), 500
 
+    @staticmethod
+    def invoices_query(client_id):
+        """A client's invoices, pulling only the needed keys out of the JSONB data instead of every blob"""
+        return db.select(
+            Invoice.id,
+            Invoice.data_text('invoice_number').label('invoice_number'),
+            Invoice.data_total().label('total'),
+            Invoice.data_text('currency').label('currency'),
+            Invoice.status,
+            Invoice.issued_date,
+            Invoice.due_date,
+            Invoice.created_at
+        ).where(Invoice.client_id == client_id)
+
     @staticmethod
     def get_client_invoices(client_id):
         """Get all invoices for a specific client"""
@@ -383,30 +454,25 @@ class Clients:
             if not client:
                 return jsonify({'success': False, 'error': 'Client not found'}), 404
 
-            invoices = []
-            for invoice in client.invoices:
-                amount = 0.0
-                if isinstance(invoice.data, dict):
-                    try:
-                        amount = float(invoice.data.get('total', 0))
-                    except (ValueError, TypeError):
-                        pass
+            rows = db.session.execute(Clients.invoices_query(client.id)).all()
 
+            invoices = []
+            for invoice in rows:
                 invoices.append({
-                    'id': str(invoice.id),
-                    'invoice_number': invoice.data.get('invoice_number', '') if isinstance(invoice.data, dict) else '',
-                    'amount': amount,
-                    'currency': invoice.data.get('currency', 'USD') if isinstance(invoice.data, dict) else 'USD',
+                    'id': invoice.id,
+                    'invoice_number': invoice.invoice_number or '',
+                    'amount': float(invoice.total) if invoice.total is not None else 0.0,
+                    'currency': invoice.currency or 'USD',
                     'status': invoice.status,
-                    'issued_date': invoice.issued_date.isoformat() if invoice.issued_date else None,
-                    'due_date': invoice.due_date.isoformat() if invoice.due_date else None,
-                    'created_at': invoice.created_at.isoformat() if invoice.created_at else None
+                    'issued_date': invoice.issued_date,
+                    'due_date': invoice.due_date,
+                    'created_at': invoice.created_at
                 })
 
             return jsonify({
                 'success': True,
                 'client': {
-                    'id': str(client.id),
+                    'id': client.id,
                     'name': client.name,
                     'email': client.email
                 },
@@ -435,22 +501,22 @@ class Clients:
                 if not Clients.validate_uuid(client_id):
                     return jsonify({'success': False, 'error': f'Invalid client ID format: {client_id}'}), 400
 
-            # Get all clients
-            clients = Client.query.filter(Client.id.in_(client_ids)).all()
-
-            # Check for clients with invoices
-            clients_with_invoices = []
-            clients_to_delete = []
+            ids = list(dict.fromkeys(uuid.UUID(client_id) for client_id in client_ids))
+            id_filter = Client.id == any_(bindparam('ids', ids, type_=ARRAY(db.UUID(as_uuid=True))))
 
-            for client in clients:
-                if client.invoices:
-                    clients_with_invoices.append({
-                        'id': str(client.id),
-                        'name': client.name,
-                        'invoice_count': len(client.invoices)
-                    })
-                else:
-                    clients_to_delete.append(client)
+            # Check for clients with invoices in one grouped query
+            clients_with_invoices = [
+                {
+                    'id': row.id,
+                    'name': row.name,
+                    'invoice_count': row.invoice_count
+                }
+                for row in db.session.query(
+                    Client.id,
+                    Client.name,
+                    db.func.count(Invoice.id).label('invoice_count')
+                ).join(Invoice, Invoice.client_id == Client.id).filter(id_filter).group_by(Client.id).all()
+            ]
 
             if clients_with_invoices:
                 return jsonify({
@@ -459,11 +525,15 @@ class Clients:
                     'clients_with_invoices': clients_with_invoices
                 }), 400
 
-            # Delete all clients without invoices
-            deleted_count = 0
-            for client in clients_to_delete:
-                db.session.delete(client)
-                deleted_count += 1
+            # Delete all clients without invoices in one statement
+            has_invoices = db.session.query(Invoice.id).filter(Invoice.client_id == Client.id).exists()
+            stmt = (
+                db.delete(Client)
+                .where(id_filter, ~has_invoices)
+                .returning(Client.id)
+                .execution_options(synchronize_session=False)
+            )
+            deleted_count = len(db.session.execute(stmt).all())
 
             db.session.commit()
 
@@ -0,0 +1,159 @@
+from flask import request
+from datetime import date, datetime, timedelta
+import logging
+import brotli
+import uuid
+import time
+import zlib
+import json
+import os
+
+BROTLI_LEVEL = int(os.getenv('COMPRESS_BROTLI_LEVEL', 4))
+GZIP_LEVEL = int(os.getenv('COMPRESS_GZIP_LEVEL', 6))
+
+# Smallest body worth compressing, per content type; anything not listed is sent as-is
+COMPRESS_MIN_SIZES = {
+    'application/json': int(os.getenv('COMPRESS_MIN_SIZE_JSON', 1024)),
+    'application/x-ndjson': int(os.getenv('COMPRESS_MIN_SIZE_JSON', 1024)),
+    'text/csv': int(os.getenv('COMPRESS_MIN_SIZE_TEXT', 1024)),
+    'text/html': int(os.getenv('COMPRESS_MIN_SIZE_TEXT', 1024)),
+    'text/plain': int(os.getenv('COMPRESS_MIN_SIZE_TEXT', 1024)),
+    'image/svg+xml': int(os.getenv('COMPRESS_MIN_SIZE_TEXT', 1024)),
+}
+
+
+def choose_encoding(accept_encodings):
+    """Pick 'br' or 'gzip' from the request's Accept-Encoding, or None"""
+    candidates = [('br', accept_encodings.quality('br')), ('gzip', accept_encodings.quality('gzip'))]
+    encoding, quality = max(candidates, key=lambda c: c[1])
+    return encoding if quality > 0 else None
+
+
+class GzipCompressor:
+    """zlib stream with a gzip header, exposing the same process()/finish() API as brotli.Compressor"""
+
+    def __init__(self, level=GZIP_LEVEL):
+        self._zlib = zlib.compressobj(level, zlib.DEFLATED, 31)
+
+    def process(self, data):
+        return self._zlib.compress(data)
+
+    def finish(self):
+        return self._zlib.flush()
+
+
+def compressor(encoding):
+    """Incremental compressor for 'br' or 'gzip'"""
+    if encoding == 'br':
+        return brotli.Compressor(quality=BROTLI_LEVEL)
+    return GzipCompressor()
+
+
+def compress(data, encoding):
+    c = compressor(encoding)
+    return c.process(data) + c.finish()
+
+
+def _compress_stream(chunks, encoding):
+    c = compressor(encoding)
+    for chunk in chunks:
+        if isinstance(chunk, str):
+            chunk = chunk.encode('utf-8')
+        out = c.process(chunk)
+        if out:
+            yield out
+    yield c.finish()
+
+
+def compress_response(response):
+    """Compress a response in place when the client accepts it and the body is large enough to benefit"""
+    if (response.status_code < 200 or response.status_code in (204, 304)
+            or request.method == 'HEAD'
+            or response.direct_passthrough
+            or 'Content-Encoding' in response.headers):
+        return response
+
+    min_size = COMPRESS_MIN_SIZES.get(response.mimetype)
+    if min_size is None:
+        return response
+
+    response.vary.add('Accept-Encoding')
+    encoding = choose_encoding(request.accept_encodings)
+    if encoding is None:
+        return response
+
+    if response.is_streamed:
+        # Generator responses (exports) are compressed chunk by chunk as they are produced
+        response.response = _compress_stream(response.response, encoding)
+        response.headers.pop('Content-Length', None)
+    else:
+        body = response.get_data()
+        if len(body) < min_size:
+            return response
+        response.set_data(compress(body, encoding))
+
+    response.headers['Content-Encoding'] = encoding
+    # The compressed representation is not byte-identical, so a strong validator becomes weak
+    etag, weak = response.get_etag()
+    if etag and not weak:
+        response.set_etag(etag, weak=True)
+    return response
+
+
+def init_compression(app):
+    app.after_request(compress_response)
+
+
+def sample_invoice_list(count):
+    """Synthetic /api/invoices payload with `count` invoices carrying typical data blobs, as model values"""
+    user_id, issued, due = uuid.uuid4(), date(2026, 10, 1), date(2026, 10, 31)
+    return {'success': True, 'invoices': [
+        {
+            'id': uuid.uuid4(),
+            'user_id': user_id,
+            'business_id': None,
+            'client_id': uuid.uuid4(),
+            'invoice_number': f'INV-{i:06d}',
+            'data': {
+                'invoice_number': f'INV-{i:06d}', 'currency': 'USD', 'date': '2026-10-01', 'due_date': '2026-10-31',
+                'from': 'Acme Studio\n12 Market Street\nSpringfield', 'to': f'Client {i % 50}\n{i} Main Road',
+                'items': [{'name': f'Item {j}', 'description': 'Design and development hours',
+                           'quantity': j + 1, 'unit_cost': 75 + j} for j in range(i % 5 + 1)],
+                'tax': 10, 'discount': 0, 'shipping': 0, 'notes': 'Thank you for your business.',
+                'terms': 'Payment due within 30 days.', 'total': 75 * (i % 5 + 1),
+            },
+            'issued_date': issued,
+            'due_date': due,
+            'created_at': datetime(2026, 10, 1, 9, 30) + timedelta(minutes=i),
+            'status': ('draft', 'sent', 'paid', 'overdue')[i % 4],
+            'currency': 'USD',
+        }
+        for i in range(count)
+    ]}
+
+
+def benchmark_compression(payload, rounds=5):
+    """CPU time and bytes saved for each encoding/level on a JSON-serialisable payload"""
+    body = json.dumps(payload, default=str).encode('utf-8')
+    settings = [('gzip', level) for level in (1, 6, 9)] + [('br', level) for level in (1, 4, 6, 11)]
+
+    results = []
+    for encoding, level in settings:
+        started = time.process_time()
+        for _ in range(rounds):
+            if encoding == 'br':
+                size = len(brotli.compress(body, quality=level))
+            else:
+                size = len(zlib.compress(body, level, wbits=31))
+        elapsed = (time.process_time() - started) / rounds
+        results.append({
+            'encoding': encoding,
+            'level': level,
+            'raw_bytes': len(body),
+            'compressed_bytes': size,
+            'ratio': round(size / len(body), 3),
+            'cpu_ms': round(elapsed * 1000, 2),
+            'mb_per_cpu_s': round(len(body) / elapsed / 1e6, 1) if elapsed else None,
+        })
+    logging.info(f"[COMPRESS] Benchmarked {len(settings)} settings on {len(body)} bytes")
+    return results
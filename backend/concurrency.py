@@ -0,0 +1,20 @@
+def in_gevent_worker():
+    """True when running under a monkey-patched gevent worker"""
+    try:
+        from gevent import monkey
+    except ImportError:
+        return False
+    return monkey.is_module_patched('socket')
+
+
+def run_off_loop(func, *args, **kwargs):
+    """
+    Run a blocking, CPU-heavy call without stalling the gevent event loop.
+
+    Under gevent the call goes to the hub's native threadpool, so other greenlets keep
+    serving requests while it runs; otherwise it is called directly.
+    """
+    if in_gevent_worker():
+        import gevent
+        return gevent.get_hub().threadpool.apply(func, args, kwargs)
+    return func(*args, **kwargs)
@@ -0,0 +1,105 @@
+from flask import has_request_context, request
+from sqlalchemy import event
+import threading
+import logging
+import time
+import os
+
+HOLD_WARN_SECONDS = float(os.getenv('DB_CONNECTION_HOLD_WARN_SECONDS', 10))
+SATURATION_WARN_RATIO = float(os.getenv('DB_POOL_SATURATION_WARN_RATIO', 0.8))
+
+_lock = threading.Lock()
+_counters = {
+    'checkouts': 0,
+    'checkins': 0,
+    'long_held_warnings': 0,
+    'saturation_warnings': 0,
+    'max_checked_out': 0,
+}
+_held = {}  # id(connection_record) -> (checked out at, route)
+_warned = set()  # keys of _held already reported as long-held
+_pool = None
+
+
+def _current_route():
+    if has_request_context():
+        return f"{request.method} {request.path}"
+    return '<no request>'
+
+
+def _capacity(pool):
+    """Maximum connections the pool hands out (pool_size + max_overflow), or None if unbounded"""
+    try:
+        overflow = pool._max_overflow
+        return None if overflow < 0 else pool.size() + overflow
+    except AttributeError:
+        return None
+
+
+def _on_checkout(dbapi_connection, connection_record, connection_proxy):
+    now = time.monotonic()
+    route = _current_route()
+    with _lock:
+        _counters['checkouts'] += 1
+        _held[id(connection_record)] = (now, route)
+        in_use = len(_held)
+        _counters['max_checked_out'] = max(_counters['max_checked_out'], in_use)
+        # Connections still out past the threshold point at a route that never released its session;
+        # each one is reported once here and again when (if) it is returned
+        stale = [(key, now - started, held_route) for key, (started, held_route) in _held.items()
+                 if now - started > HOLD_WARN_SECONDS and key not in _warned]
+        for key, _, _ in stale:
+            _warned.add(key)
+            _counters['long_held_warnings'] += 1
+
+    for _, held_for, held_route in stale:
+        logging.warning(f"[DB POOL] Connection held for {held_for:.1f}s by {held_route}")
+
+    capacity = _capacity(_pool) if _pool is not None else None
+    if capacity and in_use >= capacity * SATURATION_WARN_RATIO:
+        with _lock:
+            _counters['saturation_warnings'] += 1
+        logging.warning(f"[DB POOL] {in_use}/{capacity} connections in use (checkout by {route})")
+
+
+def _on_checkin(dbapi_connection, connection_record):
+    with _lock:
+        _counters['checkins'] += 1
+        checked_out = _held.pop(id(connection_record), None)
+        _warned.discard(id(connection_record))
+
+    if checked_out:
+        started, route = checked_out
+        held_for = time.monotonic() - started
+        if held_for > HOLD_WARN_SECONDS:
+            with _lock:
+                _counters['long_held_warnings'] += 1
+            logging.warning(f"[DB POOL] Connection returned after {held_for:.1f}s by {route}")
+
+
+def init_pool_instrumentation(app, db):
+    """Attach checkout/checkin listeners to the app's engine pool"""
+    global _pool
+    with app.app_context():
+        _pool = db.engine.pool
+        event.listen(db.engine, 'checkout', _on_checkout)
+        event.listen(db.engine, 'checkin', _on_checkin)
+
+
+def pool_stats():
+    """Snapshot of pool usage, saturation and currently held connections"""
+    now = time.monotonic()
+    with _lock:
+        stats = dict(_counters)
+        held = sorted(((now - started, route) for started, route in _held.values()), reverse=True)
+
+    stats['checked_out'] = len(held)
+    if _pool is not None:
+        stats['pool_size'] = _pool.size() if hasattr(_pool, 'size') else None
+        stats['overflow'] = _pool.overflow() if hasattr(_pool, 'overflow') else None
+        stats['capacity'] = _capacity(_pool)
+        stats['saturation'] = round(len(held) / stats['capacity'], 3) if stats['capacity'] else None
+    stats['held_connections'] = [
+        {'route': route, 'held_seconds': round(held_for, 3)} for held_for, route in held[:20]
+    ]
+    return stats
@@ -0,0 +1,208 @@
+from flask import g, has_app_context
+from decimal import Decimal, InvalidOperation
+from datetime import date, datetime
+from models import FxRate
+from db import db
+import logging
+import json
+import csv
+import re
+import os
+
+CURRENCY_RE = re.compile(r'^[A-Z]{3}$')
+# Reporting currency when a caller doesn't ask for one; unset means the loaded rate table's base
+REPORTING_CURRENCY = os.getenv('REPORTING_CURRENCY', '').strip().upper() or None
+# Last resort when neither the caller, REPORTING_CURRENCY nor a rate table names one
+FALLBACK_REPORTING_CURRENCY = 'USD'
+CENT = Decimal('0.01')
+
+
+class FxRateError(ValueError):
+    pass
+
+
+def _currency(value):
+    code = str(value or '').strip().upper()
+    if not CURRENCY_RE.match(code):
+        raise FxRateError(f'Invalid currency code: {value!r}')
+    return code
+
+
+def _rate(currency, value):
+    try:
+        rate = Decimal(str(value).strip())
+    except (InvalidOperation, ValueError):
+        raise FxRateError(f'Invalid rate for {currency}: {value!r}')
+    if not rate.is_finite() or rate <= 0:
+        raise FxRateError(f'Rate for {currency} must be a positive number')
+    return rate
+
+
+def parse_rates_file(path):
+    """
+    Read a rate file into (rates, base_currency, effective_date).
+
+    CSV files have `currency,rate` columns (plus an optional `base_currency`); JSON files look like
+    {"base": "USD", "date": "2026-10-19", "rates": {"EUR": 0.92, ...}}. Rates are units of the
+    currency per one base unit. Base and date are None when the file doesn't say.
+    """
+    base_currency, effective_date = None, None
+    if path.endswith('.json'):
+        with open(path, encoding='utf-8') as f:
+            payload = json.load(f)
+        if not isinstance(payload, dict) or not isinstance(payload.get('rates'), dict):
+            raise FxRateError('JSON rate files need a "rates" object')
+        base_currency = payload.get('base') or payload.get('base_currency')
+        effective_date = payload.get('date') or payload.get('effective_date')
+        rates = payload['rates']
+    else:
+        rates = {}
+        with open(path, newline='', encoding='utf-8-sig') as f:
+            for row in csv.DictReader(f):
+                if not row.get('currency'):
+                    continue
+                rates[row['currency']] = row.get('rate')
+                base_currency = base_currency or row.get('base_currency') or None
+    return rates, base_currency, effective_date
+
+
+def load_rates(rates, base_currency, version=None, effective_date=None, source=None):
+    """
+    Store `rates` as one rate version in a single transaction, replacing any version of the same name.
+
+    The version defaults to the effective date (or today). The base currency is always stored with
+    rate 1. Returns the version name.
+    """
+    base_currency = _currency(base_currency)
+    if isinstance(effective_date, str):
+        try:
+            effective_date = date.fromisoformat(effective_date)
+        except ValueError:
+            raise FxRateError(f'Invalid effective date: {effective_date!r}')
+    version = (version or (effective_date or date.today()).isoformat()).strip()
+    if not version or len(version) > 64:
+        raise FxRateError('Version must be 1-64 characters')
+
+    parsed = {_currency(code): _rate(code, value) for code, value in rates.items()}
+    if parsed.get(base_currency, Decimal(1)) != 1:
+        raise FxRateError(f'Base currency {base_currency} must have rate 1')
+    parsed[base_currency] = Decimal(1)
+
+    loaded_at = datetime.utcnow()
+    try:
+        db.session.execute(db.delete(FxRate).where(FxRate.version == version))
+        db.session.execute(db.insert(FxRate), [
+            {'version': version, 'currency': code, 'base_currency': base_currency, 'rate': rate,
+             'effective_date': effective_date, 'source': source, 'loaded_at': loaded_at}
+            for code, rate in parsed.items()
+        ])
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+
+    if has_app_context():
+        g.pop('fx_rates', None)
+    logging.info(f"[FX] Loaded {len(parsed)} rates as version {version} (base {base_currency})")
+    return version
+
+
+def get_rates(version=None):
+    """
+    Rates of `version`, or of the most recently loaded version, as
+    {'version', 'base_currency', 'effective_date', 'rates': {currency: Decimal}}; None if nothing is loaded.
+
+    Looked up once and kept on `g` for the rest of the request.
+    """
+    cache = g.setdefault('fx_rates', {}) if has_app_context() else {}
+    if version in cache:
+        return cache[version]
+
+    resolved = version
+    if resolved is None:
+        resolved = db.session.execute(
+            db.select(FxRate.version).order_by(FxRate.loaded_at.desc()).limit(1)
+        ).scalar()
+    rows = db.session.execute(
+        db.select(FxRate.currency, FxRate.rate, FxRate.base_currency, FxRate.effective_date)
+        .where(FxRate.version == resolved)
+    ).all() if resolved is not None else []
+
+    table = None
+    if rows:
+        table = {
+            'version': resolved,
+            'base_currency': rows[0].base_currency,
+            'effective_date': rows[0].effective_date,
+            'rates': {row.currency: row.rate for row in rows},
+        }
+    cache[version] = table
+    if version is None and table is not None:
+        cache[resolved] = table
+    return table
+
+
+def conversion_factors(currencies, reporting_currency=None, version=None):
+    """
+    One multiplier per currency for converting amounts to the reporting currency.
+
+    Without a requested reporting currency, a single-currency set reports in that currency and needs
+    no rates; otherwise REPORTING_CURRENCY, the rate table's base, then USD is used. Currencies
+    without a rate are left out of the factors and listed as missing.
+    Returns (reporting_currency, factors, fx_version, missing).
+    """
+    currencies = sorted(set(currencies))
+    reporting_currency = _currency(reporting_currency) if reporting_currency else REPORTING_CURRENCY
+    if reporting_currency is None and len(currencies) == 1:
+        reporting_currency = currencies[0]
+    if version is None and all(code == reporting_currency for code in currencies):
+        return reporting_currency or FALLBACK_REPORTING_CURRENCY, {code: Decimal(1) for code in currencies}, None, []
+
+    table = get_rates(version)
+    if table is None:
+        if version is not None:
+            raise FxRateError(f'Unknown FX rate version: {version}')
+        reporting_currency = reporting_currency or FALLBACK_REPORTING_CURRENCY
+        factors = {code: Decimal(1) for code in currencies if code == reporting_currency}
+        return reporting_currency, factors, None, [code for code in currencies if code not in factors]
+
+    rates = table['rates']
+    reporting_currency = reporting_currency or table['base_currency']
+    if reporting_currency not in rates:
+        raise FxRateError(f"No rate for {reporting_currency} in FX version {table['version']}")
+    target = rates[reporting_currency]
+    factors = {code: target / rates[code] for code in currencies if code in rates}
+    return reporting_currency, factors, table['version'], [code for code in currencies if code not in factors]
+
+
+def summarize_by_currency(rows, buckets, reporting_currency=None, version=None):
+    """
+    Per-currency and converted totals from grouped (currency, status, count, amount) rows.
+
+    `buckets` maps an output key to the statuses it sums, or None for every status. Amounts are
+    only ever added within a currency; conversion applies one factor per currency to those sums,
+    so the cost does not grow with the number of invoices. Converted totals are always numbers;
+    amounts in unconverted_currencies are left out of them and only appear in by_currency.
+    """
+    by_currency = {}
+    for row in rows:
+        entry = by_currency.setdefault(row.currency, dict({'invoices': 0}, **{key: Decimal(0) for key in buckets}))
+        entry['invoices'] += row.count
+        for key, statuses in buckets.items():
+            if statuses is None or row.status in statuses:
+                entry[key] += row.amount or 0
+
+    reporting_currency, factors, fx_version, missing = conversion_factors(by_currency, reporting_currency, version)
+    totals = {
+        key: sum((entry[key] * factors[code] for code, entry in by_currency.items() if code in factors),
+                 Decimal(0)).quantize(CENT)
+        for key in buckets
+    }
+
+    return {
+        'totals': totals,
+        'by_currency': by_currency,
+        'reporting_currency': reporting_currency,
+        'fx_version': fx_version,
+        'unconverted_currencies': missing,
+    }
@@ -0,0 +1,43 @@
+# backend/gunicorn.conf.py
+# Production server profile: `gunicorn -c gunicorn.conf.py app:app`
+import multiprocessing
+import os
+
+bind = f"0.0.0.0:{os.getenv('PORT', '5000')}"
+
+# gevent workers serve many concurrent I/O-bound requests each; set
+# GUNICORN_WORKER_CLASS=sync to fall back to one request per worker
+worker_class = os.getenv('GUNICORN_WORKER_CLASS', 'gevent')
+workers = int(os.getenv('WEB_CONCURRENCY', min(multiprocessing.cpu_count() * 2 + 1, 4)))
+worker_connections = int(os.getenv('GUNICORN_WORKER_CONNECTIONS', 100))
+
+timeout = int(os.getenv('GUNICORN_TIMEOUT', 120))
+graceful_timeout = int(os.getenv('GUNICORN_GRACEFUL_TIMEOUT', 30))
+keepalive = int(os.getenv('GUNICORN_KEEPALIVE', 5))
+
+# Recycle workers periodically to cap memory growth from PDF rendering
+max_requests = int(os.getenv('GUNICORN_MAX_REQUESTS', 1000))
+max_requests_jitter = int(os.getenv('GUNICORN_MAX_REQUESTS_JITTER', 100))
+
+accesslog = '-'
+errorlog = '-'
+loglevel = os.getenv('GUNICORN_LOG_LEVEL', 'info')
+
+
+def post_fork(server, worker):
+    """Make psycopg2 cooperative before the app (and its engine) is loaded in the worker"""
+    if worker_class != 'gevent':
+        return
+
+    from psycogreen.gevent import patch_psycopg
+    patch_psycopg()
+    server.log.info(f"Worker {worker.pid}: psycopg2 patched for gevent")
+
+
+def post_worker_init(worker):
+    """Size the native threadpool that PDF/PNG renders are offloaded to"""
+    if worker_class != 'gevent':
+        return
+
+    import gevent
+    gevent.get_hub().threadpool.maxsize = int(os.getenv('RENDER_THREADS', 4))
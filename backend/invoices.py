@@ -1,9 +1,18 @@
-from flask import request, jsonify
+from flask import request, jsonify, Response, stream_with_context, current_app
 from db import db
+from sqlalchemy import any_, bindparam
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.dialects.postgresql import ARRAY, JSONB
 from models import Invoice
+from user_resolver import UserResolver
+from fx import FxRateError, summarize_by_currency
 from datetime import datetime
 import uuid
 import logging
+import re
+import csv
+import io
+import json
 
 
 class InvoiceOperations:
@@ -87,10 +96,9 @@ class InvoiceOperations:
                 'success': True,
                 'message': f'Invoice status updated from {old_status} to {new_status}',
                 'invoice': {
-                    'id': str(invoice.id),
+                    'id': invoice.id,
                     'status': invoice.status,
-                    'updated_at': invoice.updated_at.isoformat() if hasattr(invoice,
-                                                                            'updated_at') and invoice.updated_at else None
+                    'updated_at': invoice.updated_at
                 }
             })
 
@@ -99,6 +107,203 @@ class InvoiceOperations:
             logging.error(f"Error updating invoice status {invoice_id}: {str(e)}", exc_info=True)
             return jsonify({'success': False, 'error': 'Failed to update invoice status'}), 500
 
+    @staticmethod
+    def bulk_update_invoice_status():
+        """Set one status on many invoices with a single UPDATE ... RETURNING"""
+        try:
+            data = request.get_json()
+            if not data or 'invoice_ids' not in data:
+                return jsonify({'success': False, 'error': 'invoice_ids are required'}), 400
+
+            invoice_ids = data['invoice_ids']
+            new_status = data.get('status')
+            user_id = data.get('user_id')
+
+            if not isinstance(invoice_ids, list) or not invoice_ids:
+                return jsonify({'success': False, 'error': 'invoice_ids must be a non-empty list'}), 400
+
+            if not user_id:
+                return jsonify({'success': False, 'error': 'user_id is required'}), 400
+
+            if not new_status:
+                return jsonify({'success': False, 'error': 'Status is required'}), 400
+
+            if not InvoiceOperations.validate_status(new_status):
+                return jsonify({
+                    'success': False,
+                    'error': f'Invalid status. Must be one of: {", ".join(InvoiceOperations.VALID_STATUSES)}'
+                }), 400
+
+            # Validate all invoice IDs
+            for invoice_id in invoice_ids:
+                if not InvoiceOperations.validate_uuid(invoice_id):
+                    return jsonify({'success': False, 'error': f'Invalid invoice ID format: {invoice_id}'}), 400
+
+            resolved_id = UserResolver.resolve(user_id)
+            if not resolved_id:
+                return jsonify({'success': False, 'error': 'User not found'}), 404
+
+            new_status = new_status.lower()
+            now = datetime.utcnow()
+            values = {'status': new_status, 'updated_at': now}
+
+            # If marking as paid, stamp paid_date into the JSON server-side
+            if new_status == 'paid':
+                values['data'] = Invoice.data.op('||')(db.func.jsonb_build_object('paid_date', now.isoformat()))
+
+            ids = list(dict.fromkeys(uuid.UUID(invoice_id) for invoice_id in invoice_ids))
+            stmt = (
+                db.update(Invoice)
+                .where(
+                    Invoice.id == any_(bindparam('ids', ids, type_=ARRAY(db.UUID(as_uuid=True)))),
+                    Invoice.user_id == resolved_id
+                )
+                .values(**values)
+                .returning(Invoice.id, Invoice.status, Invoice.updated_at)
+                .execution_options(synchronize_session=False)
+            )
+            updated = {row.id: row for row in db.session.execute(stmt)}
+            db.session.commit()
+
+            results = []
+            for invoice_id in ids:
+                row = updated.get(invoice_id)
+                if row:
+                    results.append({
+                        'id': row.id,
+                        'success': True,
+                        'status': row.status,
+                        'updated_at': row.updated_at
+                    })
+                else:
+                    results.append({
+                        'id': str(invoice_id),
+                        'success': False,
+                        'error': 'Invoice not found or access denied'
+                    })
+
+            logging.info(f"Bulk status update to '{new_status}' by user {resolved_id}: "
+                         f"{len(updated)}/{len(ids)} invoices updated")
+
+            return jsonify({
+                'success': True,
+                'message': f'Updated {len(updated)} of {len(ids)} invoices to {new_status}',
+                'updated_count': len(updated),
+                'results': results
+            })
+
+        except Exception as e:
+            db.session.rollback()
+            logging.error(f"Error bulk updating invoice status: {str(e)}", exc_info=True)
+            return jsonify({'success': False, 'error': 'Failed to update invoice status'}), 500
+
+    @staticmethod
+    def etag_for(updated_at):
+        """ETag for an invoice version, derived from updated_at"""
+        return f'"{updated_at.isoformat()}"' if updated_at else None
+
+    @staticmethod
+    def patch_invoice(invoice_id):
+        """Apply an RFC 7396 JSON merge patch to invoice data in place, guarded by If-Match"""
+        try:
+            if not InvoiceOperations.validate_uuid(invoice_id):
+                return jsonify({'success': False, 'error': 'Invalid invoice ID format'}), 400
+
+            patch = request.get_json(force=True, silent=True)
+            if not isinstance(patch, dict):
+                return jsonify({'success': False, 'error': 'Body must be a JSON merge patch object'}), 400
+
+            values = {
+                'data': db.func.jsonb_merge_patch(Invoice.data, db.cast(patch, JSONB)),
+                'updated_at': datetime.utcnow()
+            }
+
+            # Keep the date columns in step with the dates inside data
+            for key in ('issued_date', 'due_date'):
+                if key in patch:
+                    try:
+                        values[key] = datetime.strptime(patch[key], '%Y-%m-%d').date() if patch[key] else None
+                    except (TypeError, ValueError):
+                        return jsonify({'success': False, 'error': f'Invalid {key}, expected YYYY-MM-DD'}), 400
+
+            # ...and invoice_number/currency, which have columns of their own
+            if 'invoice_number' in patch:
+                number = patch['invoice_number']
+                if not isinstance(number, str) or not number.strip() \
+                        or len(number) > Invoice.invoice_number.type.length:
+                    return jsonify({'success': False, 'error': 'invoice_number must be a non-empty string of at most '
+                                                               f'{Invoice.invoice_number.type.length} characters'}), 400
+                values['invoice_number'] = number
+            if 'currency' in patch:
+                currency = patch['currency']
+                if currency is not None and (not isinstance(currency, str)
+                                             or len(currency) > Invoice.currency.type.length):
+                    return jsonify({'success': False, 'error': 'currency must be a string of at most '
+                                                               f'{Invoice.currency.type.length} characters'}), 400
+                # Removing it from data falls back to the column default, as bulk import does
+                values['currency'] = currency or 'USD'
+
+            access = [Invoice.id == invoice_id]
+
+            user_id = request.args.get('user_id')
+            if user_id:
+                resolved_id = UserResolver.resolve(user_id)
+                if not resolved_id:
+                    return jsonify({'success': False, 'error': 'Invoice not found or access denied'}), 404
+                access.append(Invoice.user_id == resolved_id)
+
+            # Optimistic concurrency: only apply if the client saw the current version
+            conditions = list(access)
+            if_match = request.headers.get('If-Match')
+            if if_match and if_match.strip() != '*':
+                try:
+                    expected = datetime.fromisoformat(if_match.strip().removeprefix('W/').strip('"'))
+                except ValueError:
+                    return jsonify({'success': False, 'error': 'Invalid If-Match header'}), 400
+                conditions.append(Invoice.updated_at == expected)
+
+            stmt = (
+                db.update(Invoice)
+                .where(*conditions)
+                .values(**values)
+                .returning(Invoice.id, Invoice.updated_at)
+                .execution_options(synchronize_session=False)
+            )
+            row = db.session.execute(stmt).first()
+            db.session.commit()
+
+            if not row:
+                # Nothing matched: either the invoice is missing or its version moved on
+                exists = db.session.query(Invoice.updated_at).filter(*access).first()
+                if not exists:
+                    return jsonify({'success': False, 'error': 'Invoice not found or access denied'}), 404
+                response = jsonify({
+                    'success': False,
+                    'error': 'Invoice was modified by another request',
+                    'updated_at': exists.updated_at
+                })
+                if exists.updated_at:
+                    response.headers['ETag'] = InvoiceOperations.etag_for(exists.updated_at)
+                return response, 412
+
+            response = jsonify({
+                'success': True,
+                'invoice': {
+                    'id': row.id,
+                    'updated_at': row.updated_at
+                }
+            })
+            response.headers['ETag'] = InvoiceOperations.etag_for(row.updated_at)
+            return response
+
+        except IntegrityError:
+            db.session.rollback()
+            return jsonify({'success': False, 'error': 'Invoice number already in use'}), 409
+        except Exception as e:
+            db.session.rollback()
+            logging.error(f"Error patching invoice {invoice_id}: {str(e)}", exc_info=True)
+            return jsonify({'success': False, 'error': 'Failed to update invoice'}), 500
+
     @staticmethod
     def delete_invoice(invoice_id):
         """Delete an invoice"""
@@ -174,38 +379,30 @@ class InvoiceOperations:
                 if not InvoiceOperations.validate_uuid(invoice_id):
                     return jsonify({'success': False, 'error': f'Invalid invoice ID format: {invoice_id}'}), 400
 
-            # Get all invoices with optional user filtering
+            ids = list(dict.fromkeys(uuid.UUID(invoice_id) for invoice_id in invoice_ids))
+            id_filter = [Invoice.id == any_(bindparam('ids', ids, type_=ARRAY(db.UUID(as_uuid=True))))]
             if user_id:
-                invoices = Invoice.query.filter(
-                    Invoice.id.in_(invoice_ids),
-                    Invoice.user_id == user_id
-                ).all()
-            else:
-                invoices = Invoice.query.filter(Invoice.id.in_(invoice_ids)).all()
+                id_filter.append(Invoice.user_id == user_id)
 
-            if len(invoices) != len(invoice_ids):
+            invoice_number = db.func.coalesce(Invoice.data_text('invoice_number'), 'N/A')
+
+            # One guard query: how many ids matched, and which of them are paid
+            found_count, paid_invoices = db.session.query(
+                db.func.count(Invoice.id),
+                db.func.jsonb_agg(db.func.jsonb_build_object(
+                    'id', db.cast(Invoice.id, db.Text),
+                    'invoice_number', invoice_number,
+                    'status', Invoice.status
+                )).filter(Invoice.status == 'paid')
+            ).filter(*id_filter).one()
+
+            if found_count != len(ids):
                 return jsonify({
                     'success': False,
                     'error': 'Some invoices were not found or you do not have permission to delete them'
                 }), 404
 
             # Check for paid invoices (optional business rule)
-            paid_invoices = []
-            invoices_to_delete = []
-
-            for invoice in invoices:
-                if invoice.status == 'paid':
-                    invoice_number = 'N/A'
-                    if isinstance(invoice.data, dict):
-                        invoice_number = invoice.data.get('invoice_number', 'N/A')
-                    paid_invoices.append({
-                        'id': str(invoice.id),
-                        'invoice_number': invoice_number,
-                        'status': invoice.status
-                    })
-                else:
-                    invoices_to_delete.append(invoice)
-
             if paid_invoices:
                 return jsonify({
                     'success': False,
@@ -213,18 +410,16 @@ class InvoiceOperations:
                     'paid_invoices': paid_invoices
                 }), 400
 
-            # Delete all non-paid invoices
-            deleted_count = 0
-            deleted_numbers = []
-
-            for invoice in invoices_to_delete:
-                invoice_number = 'N/A'
-                if isinstance(invoice.data, dict):
-                    invoice_number = invoice.data.get('invoice_number', 'N/A')
-                deleted_numbers.append(invoice_number)
-
-                db.session.delete(invoice)
-                deleted_count += 1
+            # Delete all non-paid invoices in one statement; the status predicate
+            # also covers invoices paid since the guard query ran
+            stmt = (
+                db.delete(Invoice)
+                .where(*id_filter, Invoice.status.is_distinct_from('paid'))
+                .returning(invoice_number)
+                .execution_options(synchronize_session=False)
+            )
+            deleted_numbers = db.session.execute(stmt).scalars().all()
+            deleted_count = len(deleted_numbers)
 
             db.session.commit()
 
@@ -243,71 +438,300 @@ class InvoiceOperations:
             logging.error(f"Error bulk deleting invoices: {str(e)}", exc_info=True)
             return jsonify({'success': False, 'error': 'Failed to delete invoices'}), 500
 
+    @staticmethod
+    def list_query(user_id, status=None, currency=None, invoice_number=None, sort=None, order=None):
+        """
+        The user's invoices with the GET /api/invoices filters and sorting (e.g. sort='total', order='desc').
+        Raises ValueError for an unknown sort key.
+        """
+        query = db.select(Invoice).where(Invoice.user_id == user_id)
+
+        # Optional filters on invoice content, served by the JSONB indexes
+        if status:
+            query = query.where(Invoice.status == status.lower())
+        if currency:
+            query = query.where(Invoice.data_text('currency') == currency)
+        if invoice_number:
+            query = query.where(Invoice.data_text('invoice_number') == invoice_number)
+
+        if sort:
+            sort_columns = {
+                'created_at': Invoice.created_at,
+                'due_date': Invoice.due_date,
+                'invoice_number': Invoice.data_text('invoice_number'),
+                'total': Invoice.data_total(),
+            }
+            if sort not in sort_columns:
+                raise ValueError(f'Invalid sort. Must be one of: {", ".join(sort_columns)}')
+            column = sort_columns[sort]
+            query = query.order_by((column.asc() if order == 'asc' else column.desc()).nulls_last())
+        return query
+
+    @staticmethod
+    def currency_totals_query(user_id):
+        """Invoice count and summed amount per (currency, status) for a user, grouped in SQL"""
+        return (
+            db.select(
+                Invoice.data_currency().label('currency'),
+                db.func.lower(Invoice.status).label('status'),
+                db.func.count().label('count'),
+                db.func.coalesce(db.func.sum(Invoice.data_amount()), 0).label('amount'),
+            )
+            .where(Invoice.user_id == user_id)
+            # Positional: in GROUP BY, bare names would resolve to the raw currency/status columns
+            .group_by(db.text('1'), db.text('2'))
+        )
+
+    @staticmethod
+    def recent_query(user_id, limit):
+        """(Invoice, amount, currency) for the user's newest invoices"""
+        return db.select(Invoice, Invoice.data_amount().label('amount'), Invoice.data_currency().label('currency')) \
+            .where(Invoice.user_id == user_id).order_by(Invoice.created_at.desc()).limit(limit)
+
+    @staticmethod
+    def client_count_query(user_id):
+        """Number of distinct clients the user has invoiced"""
+        return db.select(db.func.count(db.distinct(Invoice.client_id))).where(Invoice.user_id == user_id)
+
+    @staticmethod
+    def currency_totals(user_id):
+        return db.session.execute(InvoiceOperations.currency_totals_query(user_id)).all()
+
     @staticmethod
     def get_invoice_statistics(user_id):
-        """Get invoice statistics for a user"""
+        """Get invoice statistics for a user, per currency and converted to ?reporting_currency="""
         try:
             if not InvoiceOperations.validate_uuid(user_id):
                 return jsonify({'success': False, 'error': 'Invalid user ID format'}), 400
 
-            # Get all invoices for the user
-            invoices = Invoice.query.filter_by(user_id=user_id).all()
+            # Accept Supabase (google_id) as well as internal IDs
+            user_id = str(UserResolver.resolve(user_id) or user_id)
+
+            rows = InvoiceOperations.currency_totals(user_id)
+            summary = summarize_by_currency(rows, {
+                'total_amount': None,
+                'paid_amount': ('paid',),
+                'outstanding_amount': ('sent', 'overdue'),
+            }, request.args.get('reporting_currency'), request.args.get('fx_version'))
 
-            # Calculate statistics
             stats = {
-                'total_invoices': len(invoices),
+                'total_invoices': sum(row.count for row in rows),
                 'draft': 0,
                 'sent': 0,
                 'paid': 0,
                 'overdue': 0,
                 'cancelled': 0,
-                'total_amount': 0.0,
-                'paid_amount': 0.0,
-                'outstanding_amount': 0.0
+                # Converted to reporting_currency; by_currency has the unconverted sums
+                **summary.pop('totals'),
+                **summary
             }
-
-            for invoice in invoices:
-                # Count by status
-                status = invoice.status.lower()
-                if status in stats:
-                    stats[status] += 1
-
-                # Calculate amounts based on your existing data structure
-                try:
-                    amount = 0.0
-                    if isinstance(invoice.data, dict):
-                        # Try to get total from data, fallback to calculating from items
-                        amount = float(invoice.data.get('total', 0))
-                        if amount == 0 and 'items' in invoice.data:
-                            # Calculate from items like in your parse_invoice_data function
-                            items = invoice.data.get('items', [])
-                            subtotal = sum(
-                                float(item.get('quantity', 0)) * float(item.get('unit_cost', 0))
-                                for item in items
-                            )
-
-                            # Add tax, shipping, subtract discount (simplified)
-                            tax_amount = float(invoice.data.get('tax_amount', 0))
-                            shipping_amount = float(invoice.data.get('shipping_amount', 0))
-                            discount_amount = float(invoice.data.get('discount_amount', 0))
-
-                            amount = subtotal + tax_amount + shipping_amount - discount_amount
-
-                    stats['total_amount'] += amount
-
-                    if status == 'paid':
-                        stats['paid_amount'] += amount
-                    elif status in ['sent', 'overdue']:
-                        stats['outstanding_amount'] += amount
-
-                except (ValueError, TypeError, KeyError):
-                    continue
+            for row in rows:
+                if row.status in InvoiceOperations.VALID_STATUSES:
+                    stats[row.status] += row.count
 
             return jsonify({
                 'success': True,
                 'statistics': stats
             })
 
+        except FxRateError as e:
+            return jsonify({'success': False, 'error': str(e)}), 400
         except Exception as e:
             logging.error(f"Error getting invoice statistics for user {user_id}: {str(e)}", exc_info=True)
-            return jsonify({'success': False, 'error': 'Failed to get invoice statistics'}), 500
\ No newline at end of file
+            return jsonify({'success': False, 'error': 'Failed to get invoice statistics'}), 500
+
+    @staticmethod
+    def build_search_query(text):
+        """Turn free text into a prefix-matching tsquery string, e.g. 'acme web' -> 'acme:* & web:*'"""
+        terms = re.findall(r'\w+', text or '')
+        return ' & '.join(f"{term.lower()}:*" for term in terms[:10])
+
+    @staticmethod
+    def search_query(user_id, ts_query, limit):
+        """(Invoice, rank) rows matching a build_search_query() string, best first"""
+        query = db.func.to_tsquery('simple', ts_query)
+        rank = db.func.ts_rank_cd(Invoice.search_vector, query).label('rank')
+        return db.select(Invoice, rank).where(
+            Invoice.user_id == user_id,
+            Invoice.search_vector.op('@@')(query)
+        ).order_by(rank.desc(), Invoice.created_at.desc()).limit(limit)
+
+    @staticmethod
+    def search_invoices():
+        """Full-text search over invoice numbers, parties, line items and terms"""
+        try:
+            user_id = request.args.get('user_id')
+            if not user_id:
+                return jsonify({'success': False, 'error': 'user_id is required'}), 400
+
+            ts_query = InvoiceOperations.build_search_query(request.args.get('q'))
+            if not ts_query:
+                return jsonify({'success': False, 'error': 'q is required'}), 400
+
+            try:
+                limit = min(max(int(request.args.get('limit', 20)), 1), 100)
+            except ValueError:
+                return jsonify({'success': False, 'error': 'limit must be an integer'}), 400
+
+            resolved_id = UserResolver.resolve(user_id)
+            if not resolved_id:
+                return jsonify({'success': False, 'error': 'User not found'}), 404
+
+            results = db.session.execute(InvoiceOperations.search_query(resolved_id, ts_query, limit)).all()
+
+            invoices = []
+            for invoice, score in results:
+                invoices.append({
+                    'id': invoice.id,
+                    'user_id': invoice.user_id,
+                    'business_id': invoice.business_id,
+                    'client_id': invoice.client_id,
+                    'invoice_number': invoice.invoice_number,
+                    'data': invoice.data,
+                    'issued_date': invoice.issued_date,
+                    'due_date': invoice.due_date,
+                    'status': invoice.status,
+                    'currency': invoice.data.get('currency', 'USD') if isinstance(invoice.data, dict) else 'USD',
+                    'rank': float(score)
+                })
+
+            return jsonify({
+                'success': True,
+                'invoices': invoices,
+                'total_results': len(invoices)
+            })
+
+        except Exception as e:
+            logging.error(f"Error searching invoices: {str(e)}", exc_info=True)
+            return jsonify({'success': False, 'error': 'Failed to search invoices'}), 500
+
+    EXPORT_FORMATS = ('csv', 'ndjson')
+    EXPORT_BATCH_SIZE = 1000
+    EXPORT_CSV_COLUMNS = [
+        'invoice_id', 'invoice_number', 'status', 'currency', 'issued_date', 'due_date', 'created_at',
+        'client_id', 'business_id', 'from', 'to', 'total',
+        'item_index', 'item_name', 'item_description', 'item_quantity', 'item_unit_cost', 'item_subtotal'
+    ]
+
+    @staticmethod
+    def _export_rows(user_id):
+        """Stream the user's invoices through a server-side cursor, EXPORT_BATCH_SIZE rows at a time"""
+        stmt = db.select(
+            Invoice.id,
+            Invoice.invoice_number,
+            Invoice.status,
+            Invoice.issued_date,
+            Invoice.due_date,
+            Invoice.created_at,
+            Invoice.client_id,
+            Invoice.business_id,
+            Invoice.data
+        ).where(Invoice.user_id == user_id).order_by(Invoice.created_at).execution_options(
+            yield_per=InvoiceOperations.EXPORT_BATCH_SIZE
+        )
+        return db.session.execute(stmt)
+
+    @staticmethod
+    def _as_text(value):
+        if value is None or isinstance(value, str):
+            return value
+        return json.dumps(value)
+
+    @staticmethod
+    def _export_csv(rows):
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(InvoiceOperations.EXPORT_CSV_COLUMNS)
+
+        for count, row in enumerate(rows, start=1):
+            data = row.data if isinstance(row.data, dict) else {}
+            invoice_columns = [
+                str(row.id),
+                data.get('invoice_number') or row.invoice_number,
+                row.status,
+                data.get('currency', 'USD'),
+                row.issued_date.isoformat() if row.issued_date else None,
+                row.due_date.isoformat() if row.due_date else None,
+                row.created_at.isoformat() if row.created_at else None,
+                str(row.client_id) if row.client_id else None,
+                str(row.business_id) if row.business_id else None,
+                InvoiceOperations._as_text(data.get('from')),
+                InvoiceOperations._as_text(data.get('to')),
+                data.get('total')
+            ]
+
+            # One row per line item; invoices without items still get one row
+            items = data.get('items') if isinstance(data.get('items'), list) else []
+            if not items:
+                writer.writerow(invoice_columns + [None] * 6)
+            for index, item in enumerate(items, start=1):
+                item = item if isinstance(item, dict) else {}
+                writer.writerow(invoice_columns + [
+                    index,
+                    item.get('name'),
+                    item.get('description'),
+                    item.get('quantity'),
+                    item.get('unit_cost'),
+                    item.get('subtotal')
+                ])
+
+            if count % 100 == 0:
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate(0)
+
+        yield buffer.getvalue()
+
+    @staticmethod
+    def _export_ndjson(rows):
+        chunk = []
+        for row in rows:
+            chunk.append(current_app.json.dumps({
+                'id': row.id,
+                'invoice_number': row.invoice_number,
+                'status': row.status,
+                'issued_date': row.issued_date,
+                'due_date': row.due_date,
+                'created_at': row.created_at,
+                'client_id': row.client_id,
+                'business_id': row.business_id,
+                'data': row.data
+            }) + '\n')
+            if len(chunk) >= 100:
+                yield ''.join(chunk)
+                chunk = []
+        yield ''.join(chunk)
+
+    @staticmethod
+    def export_invoices():
+        """Stream all of a user's invoices as CSV (one row per line item) or NDJSON, in constant memory"""
+        try:
+            user_id = request.args.get('user_id')
+            if not user_id:
+                return jsonify({'success': False, 'error': 'user_id is required'}), 400
+
+            fmt = request.args.get('format', 'csv')
+            if fmt not in InvoiceOperations.EXPORT_FORMATS:
+                return jsonify({
+                    'success': False,
+                    'error': f'Invalid format. Must be one of: {", ".join(InvoiceOperations.EXPORT_FORMATS)}'
+                }), 400
+
+            resolved_id = UserResolver.resolve(user_id)
+            if not resolved_id:
+                return jsonify({'success': False, 'error': 'User not found'}), 404
+
+            rows = InvoiceOperations._export_rows(resolved_id)
+            if fmt == 'csv':
+                body, mimetype = InvoiceOperations._export_csv(rows), 'text/csv'
+            else:
+                body, mimetype = InvoiceOperations._export_ndjson(rows), 'application/x-ndjson'
+
+            filename = f"invoices_{datetime.utcnow().strftime('%Y%m%d-%H%M%S')}.{fmt}"
+            return Response(stream_with_context(body), mimetype=mimetype, headers={
+                'Content-Disposition': f'attachment; filename={filename}'
+            })
+
+        except Exception as e:
+            logging.error(f"Error exporting invoices: {str(e)}", exc_info=True)
+            return jsonify({'success': False, 'error': 'Failed to export invoices'}), 500
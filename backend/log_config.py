@@ -0,0 +1,149 @@
+from logging.handlers import QueueHandler, QueueListener
+from datetime import datetime, timezone
+import logging
+import atexit
+import random
+import queue
+import json
+import sys
+import os
+
+LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO').upper()
+LOG_QUEUE_SIZE = int(os.getenv('LOG_QUEUE_SIZE', 10000))
+LOG_MAX_VALUE_LENGTH = int(os.getenv('LOG_MAX_VALUE_LENGTH', 200))
+LOG_MAX_ITEMS = int(os.getenv('LOG_MAX_ITEMS', 20))
+LOG_MAX_MESSAGE_LENGTH = int(os.getenv('LOG_MAX_MESSAGE_LENGTH', 2000))
+LOG_MAX_DEPTH = 4
+# Default share of per-request records kept, and per-route overrides: "/api/invoices=0.1,/db-health=0"
+LOG_SAMPLE_RATE = float(os.getenv('LOG_SAMPLE_RATE', 1.0))
+LOG_SAMPLE_RATES = {
+    route.strip(): float(rate)
+    for route, _, rate in (item.partition('=') for item in os.getenv('LOG_SAMPLE_RATES', '').split(','))
+    if route.strip() and rate
+}
+
+REDACTED = '[REDACTED]'
+REDACT_KEYS = {
+    'password', 'password_hash', 'new_password', 'token', 'access_token', 'refresh_token', 'id_token',
+    'authorization', 'credential', 'secret', 'api_key', 'bank_account', 'account_number', 'iban', 'tax_id',
+}
+
+# Attributes every LogRecord has; anything else was passed through `extra=` and is emitted as a field
+_RECORD_ATTRS = set(vars(logging.makeLogRecord({}))) | {'message', 'asctime', 'taskName'}
+
+_listener = None
+
+
+def redact(value, depth=0):
+    """Copy `value` with secret keys masked and long strings, lists and nesting truncated"""
+    if isinstance(value, dict):
+        if depth >= LOG_MAX_DEPTH:
+            return f'<dict of {len(value)} keys>'
+        items = list(value.items())
+        result = {
+            str(k): REDACTED if str(k).lower() in REDACT_KEYS else redact(v, depth + 1)
+            for k, v in items[:LOG_MAX_ITEMS]
+        }
+        if len(items) > LOG_MAX_ITEMS:
+            result['...'] = f'{len(items) - LOG_MAX_ITEMS} more keys'
+        return result
+    if isinstance(value, (list, tuple)):
+        if depth >= LOG_MAX_DEPTH:
+            return f'<list of {len(value)} items>'
+        result = [redact(v, depth + 1) for v in value[:LOG_MAX_ITEMS]]
+        if len(value) > LOG_MAX_ITEMS:
+            result.append(f'... {len(value) - LOG_MAX_ITEMS} more items')
+        return result
+    if isinstance(value, (int, float, bool)) or value is None:
+        return value
+    value = str(value)
+    if len(value) > LOG_MAX_VALUE_LENGTH:
+        return f'{value[:LOG_MAX_VALUE_LENGTH]}... ({len(value)} chars)'
+    return value
+
+
+class RouteSampler(logging.Filter):
+    """Keep a per-route share of records tagged with `route`; warnings and errors always pass"""
+
+    def filter(self, record):
+        route = getattr(record, 'route', None)
+        if route is None or record.levelno >= logging.WARNING:
+            return True
+        rate = LOG_SAMPLE_RATES.get(route, LOG_SAMPLE_RATE)
+        return rate >= 1 or random.random() < rate
+
+
+class NonBlockingQueueHandler(QueueHandler):
+    """Hands records to the listener without formatting them; drops instead of blocking when the queue is full"""
+
+    dropped = 0
+
+    def prepare(self, record):
+        # Resolve the message and snapshot `extra` fields now, since the caller may mutate them later
+        record.message = record.getMessage()
+        record.msg, record.args = record.message, None
+        for key in set(vars(record)) - _RECORD_ATTRS:
+            setattr(record, key, redact(getattr(record, key)))
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            NonBlockingQueueHandler.dropped += 1
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line: timestamp, level, logger, message, `extra` fields and exception"""
+
+    def format(self, record):
+        message = record.getMessage()
+        if len(message) > LOG_MAX_MESSAGE_LENGTH:
+            message = f'{message[:LOG_MAX_MESSAGE_LENGTH]}... ({len(message)} chars)'
+        entry = {
+            'ts': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': message,
+        }
+        for key in set(vars(record)) - _RECORD_ATTRS:
+            entry[key] = getattr(record, key)
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+        # Report records dropped on a full queue since the last line written
+        dropped, NonBlockingQueueHandler.dropped = NonBlockingQueueHandler.dropped, 0
+        if dropped:
+            entry['dropped_records'] = dropped
+        return json.dumps(entry, default=str)
+
+
+def init_logging():
+    """
+    Route all logging through a bounded queue drained by a single listener thread.
+
+    Request threads only enqueue; JSON formatting and stream writes happen on the listener.
+    Idempotent, so importing the app twice (e.g. the CLI) does not start a second listener.
+    """
+    global _listener
+    if _listener is not None:
+        return _listener
+
+    stream_handler = logging.StreamHandler(sys.stdout)
+    stream_handler.setFormatter(JsonFormatter())
+
+    log_queue = queue.Queue(maxsize=LOG_QUEUE_SIZE)
+    queue_handler = NonBlockingQueueHandler(log_queue)
+    # Also on the handler: Flask sets app.logger to DEBUG when app.debug is on, whatever LOG_LEVEL says
+    queue_handler.setLevel(LOG_LEVEL)
+    queue_handler.addFilter(RouteSampler())
+
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(queue_handler)
+    root.setLevel(LOG_LEVEL)
+
+    _listener = QueueListener(log_queue, stream_handler, respect_handler_level=True)
+    _listener.start()
+    atexit.register(_listener.stop)
+    return _listener
@@ -0,0 +1,231 @@
+from flask import request, current_app, abort
+from werkzeug.utils import safe_join, send_file
+from PIL import Image, ImageOps, UnidentifiedImageError
+from urllib.parse import urlparse, unquote, quote
+from functools import lru_cache
+from pathlib import Path
+from io import BytesIO
+from rendering import rasterize_svg
+from concurrency import run_off_loop
+import threading
+import hashlib
+import logging
+import uuid
+import re
+import os
+
+UPLOAD_FOLDER = os.path.abspath('uploads')
+MAX_LOGO_BYTES = int(os.getenv('MAX_LOGO_BYTES', 10 * 1024 * 1024))
+
+# Bounding boxes in pixels; the template draws logos 60px (0.625in) tall, so 'print' is ~300dpi
+# for that and 'preview' matches the 200dpi PNG preview
+LOGO_VARIANTS = {
+    'print': (1200, 200),
+    'preview': (600, 125),
+}
+RASTER_FORMATS = {'PNG': 'png', 'JPEG': 'jpg', 'GIF': 'gif', 'WEBP': 'webp', 'BMP': 'bmp'}
+
+# <sha256>.<ext> or <sha256>-<variant>.png
+HASHED_FILENAME_RE = re.compile(r'^[0-9a-f]{64}(?:-[a-z]+)?\.[a-z]+$')
+
+# Hashed files never change, so they are cached for a year; legacy filenames can be overwritten
+UPLOAD_CACHE_SECONDS = 365 * 24 * 3600
+LEGACY_UPLOAD_CACHE_SECONDS = int(os.getenv('LEGACY_UPLOAD_CACHE_SECONDS', 3600))
+# 'x-accel-redirect' (nginx) or 'x-sendfile' (Apache/lighttpd) hands large files to the front proxy
+UPLOADS_OFFLOAD = os.getenv('UPLOADS_OFFLOAD', '').lower()
+UPLOADS_ACCEL_PREFIX = os.getenv('UPLOADS_ACCEL_PREFIX', '/internal-uploads/')
+UPLOADS_OFFLOAD_MIN_BYTES = int(os.getenv('UPLOADS_OFFLOAD_MIN_BYTES', 64 * 1024))
+
+_lock = threading.Lock()
+_serving = {
+    'responses': 0,
+    'not_modified': 0,
+    'bytes_from_python': 0,
+    'offloaded': 0,
+    'bytes_offloaded': 0,
+}
+
+
+class InvalidLogo(ValueError):
+    pass
+
+
+def variant_filename(digest, variant):
+    return f'{digest}-{variant}.png'
+
+
+def _write_once(filename, data):
+    """Write `data` under `filename` unless it already exists; returns False when deduplicated"""
+    path = os.path.join(UPLOAD_FOLDER, filename)
+    if os.path.exists(path):
+        return False
+    # Unique per writer: concurrent stores of the same logo in one process must not share a temp file
+    tmp_path = f'{path}.{uuid.uuid4().hex}.tmp'
+    try:
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return True
+
+
+def _sniff_svg(data):
+    head = data[:1024].lstrip().lower()
+    return head.startswith(b'<svg') or (head.startswith(b'<?xml') and b'<svg' in data[:4096].lower())
+
+
+def _render_variants(data):
+    """Normalized PNG bytes for each variant: EXIF-rotated, downscaled to fit, alpha preserved"""
+    try:
+        with Image.open(BytesIO(data)) as image:
+            if image.format not in RASTER_FORMATS:
+                raise InvalidLogo(f'Unsupported image format: {image.format}')
+            ext = RASTER_FORMATS[image.format]
+            image = ImageOps.exif_transpose(image)
+            has_alpha = image.mode in ('RGBA', 'LA', 'PA') or 'transparency' in image.info
+            image = image.convert('RGBA' if has_alpha else 'RGB')
+
+            variants = {}
+            for name, box in LOGO_VARIANTS.items():
+                resized = image.copy()
+                resized.thumbnail(box, Image.LANCZOS)
+                out = BytesIO()
+                resized.save(out, format='PNG', optimize=True)
+                variants[name] = out.getvalue()
+            return ext, variants
+    except (UnidentifiedImageError, OSError, Image.DecompressionBombError) as e:
+        logging.warning(f"[LOGO] Rejected upload: {str(e)}")
+        raise InvalidLogo('Unsupported or corrupt image file')
+
+
+def store_logo(data):
+    """
+    Store an uploaded logo under its SHA-256 content hash, with pre-sized PNG variants.
+
+    Identical uploads map to the same files, so re-uploads are deduplicated rather than
+    written again. SVGs keep their original and get the same PNG variants, rasterized once.
+    Returns {'digest', 'original', 'variants', 'deduplicated'}.
+    """
+    if len(data) > MAX_LOGO_BYTES:
+        raise InvalidLogo(f'Logo exceeds {MAX_LOGO_BYTES // (1024 * 1024)} MB')
+
+    digest = hashlib.sha256(data).hexdigest()
+    svg = _sniff_svg(data)
+
+    existing = {name: variant_filename(digest, name) for name in LOGO_VARIANTS}
+    if all(os.path.exists(os.path.join(UPLOAD_FOLDER, f)) for f in existing.values()):
+        for ext in (('svg',) if svg else RASTER_FORMATS.values()):
+            if os.path.exists(os.path.join(UPLOAD_FOLDER, f'{digest}.{ext}')):
+                return {'digest': digest, 'original': f'{digest}.{ext}', 'variants': existing, 'deduplicated': True}
+
+    if svg:
+        # Rasterized once here so renders embed a PNG instead of re-parsing the SVG every time
+        try:
+            raster = rasterize_svg(data, LOGO_VARIANTS['print'])
+        except Exception as e:
+            logging.warning(f"[LOGO] Could not rasterize SVG: {str(e)}")
+            raise InvalidLogo('Unsupported or corrupt SVG file')
+        ext, rendered = 'svg', run_off_loop(_render_variants, raster)[1]
+    else:
+        ext, rendered = run_off_loop(_render_variants, data)
+    original = f'{digest}.{ext}'
+    _write_once(original, data)
+    for name, variant_data in rendered.items():
+        _write_once(variant_filename(digest, name), variant_data)
+
+    logging.info(f"[LOGO] Stored {original} ({len(data)} bytes) with variants "
+                 + ', '.join(f'{name}={len(d)}B' for name, d in rendered.items()))
+    return {'digest': digest, 'original': original, 'variants': existing, 'deduplicated': False}
+
+
+@lru_cache(maxsize=256)
+def _stored_upload(filename, mtime_ns, size):
+    """store_logo() result for a file already in uploads/, cached per file version; None if unusable"""
+    with open(os.path.join(UPLOAD_FOLDER, filename), 'rb') as f:
+        data = f.read()
+    try:
+        return store_logo(data)
+    except InvalidLogo:
+        return None
+
+
+def logo_render_source(logo_url, variant):
+    """
+    Local file:// URI of the `variant` of an uploaded logo, for WeasyPrint to embed.
+
+    Avoids an HTTP round trip to ourselves and embeds the pre-sized PNG instead of the original,
+    so SVG logos cost the same as raster ones. Legacy uploads get their variants derived once,
+    keyed by content hash. URLs outside /uploads/ pass through unchanged.
+    """
+    if not logo_url:
+        return logo_url
+    path = urlparse(logo_url).path
+    if not path.startswith('/uploads/'):
+        return logo_url
+    filename = unquote(path[len('/uploads/'):])
+
+    if HASHED_FILENAME_RE.match(filename):
+        variant_path = os.path.join(UPLOAD_FOLDER, variant_filename(filename[:64], variant))
+        if os.path.exists(variant_path):
+            return Path(variant_path).as_uri()
+
+    local_path = safe_join(UPLOAD_FOLDER, filename)
+    if local_path is None or not os.path.isfile(local_path):
+        return logo_url
+    stat = os.stat(local_path)
+    stored = _stored_upload(filename, stat.st_mtime_ns, stat.st_size)
+    if stored and variant in stored['variants']:
+        return Path(os.path.join(UPLOAD_FOLDER, stored['variants'][variant])).as_uri()
+    return Path(local_path).as_uri()
+
+
+def serve_upload(filename):
+    """
+    Send an uploaded file with validators and cache headers, so repeat fetches are 304s or cache hits.
+
+    Hashed filenames are immutable and cached for a year with the content hash as ETag. Files
+    of at least UPLOADS_OFFLOAD_MIN_BYTES are handed to the front proxy when UPLOADS_OFFLOAD is set.
+    """
+    path = safe_join(UPLOAD_FOLDER, filename)
+    if path is None or not os.path.isfile(path):
+        abort(404)
+
+    hashed = HASHED_FILENAME_RE.match(filename) is not None
+    size = os.path.getsize(path)
+    offload = UPLOADS_OFFLOAD in ('x-accel-redirect', 'x-sendfile') and size >= UPLOADS_OFFLOAD_MIN_BYTES
+
+    response = send_file(
+        path,
+        request.environ,
+        etag=filename.split('.', 1)[0] if hashed else True,
+        max_age=UPLOAD_CACHE_SECONDS if hashed else LEGACY_UPLOAD_CACHE_SECONDS,
+        use_x_sendfile=offload,
+        response_class=current_app.response_class,
+        conditional=True,
+    )
+    response.cache_control.public = True
+    if hashed:
+        response.cache_control.immutable = True
+    if offload and UPLOADS_OFFLOAD == 'x-accel-redirect' and 'X-Sendfile' in response.headers:
+        del response.headers['X-Sendfile']
+        response.headers['X-Accel-Redirect'] = f'{UPLOADS_ACCEL_PREFIX}{quote(filename)}'
+
+    with _lock:
+        _serving['responses'] += 1
+        if response.status_code == 304:
+            _serving['not_modified'] += 1
+        elif offload:
+            _serving['offloaded'] += 1
+            _serving['bytes_offloaded'] += size
+        else:
+            _serving['bytes_from_python'] += response.content_length or 0
+    return response
+
+
+def serving_stats():
+    """Counters for /uploads responses, including bytes streamed by Python versus the front proxy"""
+    with _lock:
+        return dict(_serving)
@@ -0,0 +1,81 @@
+"""Add businesses table and invoices.business_id / invoice_number
+
+Until now these came from db.create_all() and migration.sql on every worker boot, so
+every statement is idempotent: databases that already have them upgrade cleanly. On a
+fresh database the earlier revisions skip the businesses indexes, so they are created here.
+
+Revision ID: 22fef8c7d0e9
+Revises: 5c1f7e3d9b20
+Create Date: 2026-10-19 15:05:44.208113
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '22fef8c7d0e9'
+down_revision = '5c1f7e3d9b20'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.execute("""
+        CREATE TABLE IF NOT EXISTS businesses (
+            id UUID PRIMARY KEY DEFAULT gen_random_uuid(),
+            user_id UUID NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+            name VARCHAR(255) NOT NULL,
+            email VARCHAR(255),
+            address TEXT,
+            phone VARCHAR(50),
+            website VARCHAR(255),
+            logo_url VARCHAR(500),
+            tax_id VARCHAR(100),
+            created_at TIMESTAMP,
+            updated_at TIMESTAMP
+        )
+    """)
+
+    # Add missing columns to invoices table
+    op.execute("ALTER TABLE invoices ADD COLUMN IF NOT EXISTS business_id UUID "
+               "REFERENCES businesses(id) ON DELETE SET NULL")
+    op.execute("ALTER TABLE invoices ADD COLUMN IF NOT EXISTS invoice_number VARCHAR(100)")
+
+    # Backfill invoice numbers, then enforce NOT NULL and uniqueness
+    op.execute("""
+        UPDATE invoices
+        SET invoice_number = 'INV-' || EXTRACT(EPOCH FROM created_at)::BIGINT::TEXT || '-' || id::TEXT
+        WHERE invoice_number IS NULL OR invoice_number = ''
+    """)
+    op.execute("ALTER TABLE invoices ALTER COLUMN invoice_number SET NOT NULL")
+    op.execute("""
+        DO $$
+        BEGIN
+            IF NOT EXISTS (
+                SELECT 1 FROM pg_indexes
+                WHERE tablename = 'invoices' AND indexdef LIKE 'CREATE UNIQUE INDEX%(invoice_number)'
+            ) THEN
+                ALTER TABLE invoices ADD CONSTRAINT invoices_invoice_number_key UNIQUE (invoice_number);
+            END IF;
+        END
+        $$
+    """)
+
+    op.create_index('idx_invoices_business_id', 'invoices', ['business_id'], if_not_exists=True)
+    op.create_index('idx_businesses_user_id', 'businesses', ['user_id'], if_not_exists=True)
+    op.create_index('idx_businesses_user_created_at', 'businesses', ['user_id', sa.text('created_at DESC')],
+                    if_not_exists=True)
+    for column in ('name', 'email', 'phone'):
+        op.execute(f"CREATE INDEX IF NOT EXISTS idx_businesses_{column}_trgm ON businesses "
+                   f"USING gin ({column} gin_trgm_ops)")
+
+
+def downgrade():
+    # The businesses indexes from earlier revisions go with the table
+    op.drop_index('idx_businesses_user_id', table_name='businesses', if_exists=True)
+    op.drop_index('idx_invoices_business_id', table_name='invoices', if_exists=True)
+    op.execute("ALTER TABLE invoices DROP CONSTRAINT IF EXISTS invoices_invoice_number_key")
+    op.execute("ALTER TABLE invoices DROP COLUMN IF EXISTS invoice_number")
+    op.execute("ALTER TABLE invoices DROP COLUMN IF EXISTS business_id")
+    op.execute("DROP TABLE IF EXISTS businesses")
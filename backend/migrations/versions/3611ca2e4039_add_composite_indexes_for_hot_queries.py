@@ -0,0 +1,67 @@
+"""Add composite indexes for hot per-user queries
+
+Revision ID: 3611ca2e4039
+Revises: a6509e0b61b1
+Create Date: 2026-10-19 11:26:05.871134
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3611ca2e4039'
+down_revision = 'a6509e0b61b1'
+branch_labels = None
+depends_on = None
+
+
+def _has_table(name):
+    return op.get_bind().execute(sa.text('SELECT to_regclass(:name) IS NOT NULL'), {'name': name}).scalar()
+
+
+def upgrade():
+    # CONCURRENTLY avoids blocking writes on large tables, but can't run inside a transaction
+    with op.get_context().autocommit_block():
+        op.create_index('idx_invoices_user_created_at', 'invoices', ['user_id', sa.text('created_at DESC')],
+                        if_not_exists=True, postgresql_concurrently=True)
+        op.create_index('idx_invoices_user_status', 'invoices', ['user_id', 'status'],
+                        if_not_exists=True, postgresql_concurrently=True)
+        op.create_index('idx_invoices_client_id', 'invoices', ['client_id'],
+                        if_not_exists=True, postgresql_concurrently=True)
+        op.create_index('idx_clients_user_created_at', 'clients', ['user_id', sa.text('created_at DESC')],
+                        if_not_exists=True, postgresql_concurrently=True)
+        # Fresh databases get businesses (and this index) from 22fef8c7d0e9
+        if _has_table('businesses'):
+            op.create_index('idx_businesses_user_created_at', 'businesses', ['user_id', sa.text('created_at DESC')],
+                            if_not_exists=True, postgresql_concurrently=True)
+
+    # users.google_id is normally covered by its UNIQUE constraint; only add an index
+    # for databases where that constraint was never created
+    op.execute("""
+        DO $$
+        BEGIN
+            IF NOT EXISTS (
+                SELECT 1 FROM pg_indexes
+                WHERE tablename = 'users' AND indexdef LIKE '%(google_id)'
+            ) THEN
+                CREATE INDEX idx_users_google_id ON users (google_id);
+            END IF;
+        END
+        $$
+    """)
+
+
+def downgrade():
+    op.execute("DROP INDEX IF EXISTS idx_users_google_id")
+    with op.get_context().autocommit_block():
+        op.drop_index('idx_businesses_user_created_at', table_name='businesses', if_exists=True,
+                      postgresql_concurrently=True)
+        op.drop_index('idx_clients_user_created_at', table_name='clients', if_exists=True,
+                      postgresql_concurrently=True)
+        op.drop_index('idx_invoices_client_id', table_name='invoices', if_exists=True,
+                      postgresql_concurrently=True)
+        op.drop_index('idx_invoices_user_status', table_name='invoices', if_exists=True,
+                      postgresql_concurrently=True)
+        op.drop_index('idx_invoices_user_created_at', table_name='invoices', if_exists=True,
+                      postgresql_concurrently=True)
@@ -0,0 +1,83 @@
+"""Add trigger-maintained tsvector column for invoice full-text search
+
+Revision ID: 4b6e585d4a8c
+Revises: 77b0aa44a6f6
+Create Date: 2026-10-19 10:03:17.554219
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision = '4b6e585d4a8c'
+down_revision = '77b0aa44a6f6'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('invoices', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('search_vector', postgresql.TSVECTOR(), nullable=True))
+
+    # Parties may be plain strings or objects (name/email/address), so index both forms
+    op.execute("""
+        CREATE OR REPLACE FUNCTION invoice_party_tsvector(party jsonb) RETURNS tsvector
+        LANGUAGE sql IMMUTABLE PARALLEL SAFE AS $$
+            SELECT CASE jsonb_typeof(party)
+                WHEN 'object' THEN jsonb_to_tsvector('simple', party, '["string", "numeric"]')
+                WHEN 'string' THEN to_tsvector('simple', party #>> '{}')
+                ELSE ''::tsvector
+            END
+        $$
+    """)
+
+    # Invoice number ranks highest, then parties, then line items, then terms and notes
+    op.execute("""
+        CREATE OR REPLACE FUNCTION invoice_search_vector(data jsonb) RETURNS tsvector
+        LANGUAGE sql IMMUTABLE PARALLEL SAFE AS $$
+            SELECT
+                setweight(to_tsvector('simple', coalesce(data->>'invoice_number', '')), 'A') ||
+                setweight(invoice_party_tsvector(data->'to') || invoice_party_tsvector(data->'from'), 'B') ||
+                setweight(to_tsvector('simple', coalesce((
+                    SELECT string_agg(concat_ws(' ', item->>'name', item->>'description'), ' ')
+                    FROM jsonb_array_elements(
+                        CASE WHEN jsonb_typeof(data->'items') = 'array' THEN data->'items' ELSE '[]'::jsonb END
+                    ) AS item
+                ), '')), 'C') ||
+                setweight(to_tsvector('simple', concat_ws(' ',
+                    data->>'terms', data->>'notes', data->>'payment_instructions'
+                )), 'D')
+        $$
+    """)
+
+    op.execute("""
+        CREATE OR REPLACE FUNCTION invoices_search_vector_trigger() RETURNS trigger
+        LANGUAGE plpgsql AS $$
+        BEGIN
+            NEW.search_vector := invoice_search_vector(NEW.data);
+            RETURN NEW;
+        END
+        $$
+    """)
+    op.execute("""
+        CREATE TRIGGER invoices_search_vector_update
+        BEFORE INSERT OR UPDATE OF data ON invoices
+        FOR EACH ROW EXECUTE FUNCTION invoices_search_vector_trigger()
+    """)
+
+    # Backfill existing rows, then index
+    op.execute("UPDATE invoices SET search_vector = invoice_search_vector(data)")
+    op.execute("CREATE INDEX IF NOT EXISTS idx_invoices_search_vector ON invoices USING gin (search_vector)")
+
+
+def downgrade():
+    op.execute("DROP INDEX IF EXISTS idx_invoices_search_vector")
+    op.execute("DROP TRIGGER IF EXISTS invoices_search_vector_update ON invoices")
+    op.execute("DROP FUNCTION IF EXISTS invoices_search_vector_trigger()")
+    op.execute("DROP FUNCTION IF EXISTS invoice_search_vector(jsonb)")
+    op.execute("DROP FUNCTION IF EXISTS invoice_party_tsvector(jsonb)")
+
+    with op.batch_alter_table('invoices', schema=None) as batch_op:
+        batch_op.drop_column('search_vector')
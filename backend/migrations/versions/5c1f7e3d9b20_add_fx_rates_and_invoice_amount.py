@@ -0,0 +1,67 @@
+"""Add versioned fx_rates table and invoice_amount() for per-currency aggregates
+
+Revision ID: 5c1f7e3d9b20
+Revises: a8e2a8af9489
+Create Date: 2026-10-19 17:05:41.218306
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5c1f7e3d9b20'
+down_revision = 'a8e2a8af9489'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # One row per (version, currency): units of `currency` per one `base_currency`
+    op.create_table('fx_rates',
+    sa.Column('version', sa.String(length=64), nullable=False),
+    sa.Column('currency', sa.String(length=3), nullable=False),
+    sa.Column('base_currency', sa.String(length=3), nullable=False),
+    sa.Column('rate', sa.Numeric(precision=20, scale=10), nullable=False),
+    sa.Column('effective_date', sa.Date(), nullable=True),
+    sa.Column('source', sa.String(length=255), nullable=True),
+    sa.Column('loaded_at', sa.DateTime(), server_default=sa.text('now()'), nullable=False),
+    sa.CheckConstraint('rate > 0', name='ck_fx_rates_rate_positive'),
+    sa.PrimaryKeyConstraint('version', 'currency')
+    )
+    op.create_index('idx_fx_rates_loaded_at', 'fx_rates', ['loaded_at'])
+
+    # Numeric view of a JSON text value that never raises
+    op.execute("""
+        CREATE OR REPLACE FUNCTION jsonb_numeric(value text) RETURNS numeric
+        LANGUAGE sql IMMUTABLE PARALLEL SAFE AS $$
+            SELECT CASE
+                WHEN value ~ '^\\s*-?[0-9]+(\\.[0-9]+)?\\s*$' THEN value::numeric
+            END
+        $$
+    """)
+
+    # data->>'total', or items + tax + shipping - discount when the total is missing or zero
+    op.execute("""
+        CREATE OR REPLACE FUNCTION invoice_amount(data jsonb) RETURNS numeric
+        LANGUAGE sql IMMUTABLE PARALLEL SAFE AS $$
+            SELECT COALESCE(
+                NULLIF(invoice_total(data), 0),
+                CASE WHEN jsonb_typeof(data->'items') = 'array' THEN
+                    COALESCE((SELECT sum(COALESCE(jsonb_numeric(item->>'quantity'), 0)
+                                         * COALESCE(jsonb_numeric(item->>'unit_cost'), 0))
+                              FROM jsonb_array_elements(data->'items') AS item), 0)
+                    + COALESCE(jsonb_numeric(data->>'tax_amount'), 0)
+                    + COALESCE(jsonb_numeric(data->>'shipping_amount'), 0)
+                    - COALESCE(jsonb_numeric(data->>'discount_amount'), 0)
+                END,
+                0)
+        $$
+    """)
+
+
+def downgrade():
+    op.execute("DROP FUNCTION IF EXISTS invoice_amount(jsonb)")
+    op.execute("DROP FUNCTION IF EXISTS jsonb_numeric(text)")
+    op.drop_index('idx_fx_rates_loaded_at', table_name='fx_rates')
+    op.drop_table('fx_rates')
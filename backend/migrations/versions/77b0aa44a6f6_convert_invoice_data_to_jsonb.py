@@ -0,0 +1,58 @@
+"""Convert invoices.data to JSONB with GIN and expression indexes
+
+Revision ID: 77b0aa44a6f6
+Revises: ca632e07f0c9
+Create Date: 2026-10-19 09:12:40.118502
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision = '77b0aa44a6f6'
+down_revision = 'ca632e07f0c9'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('invoices', schema=None) as batch_op:
+        batch_op.alter_column('data',
+               existing_type=sa.JSON(),
+               type_=postgresql.JSONB(astext_type=sa.Text()),
+               existing_nullable=False,
+               postgresql_using='data::jsonb')
+
+    # Numeric view of data->>'total' that never raises, so it can back an index
+    op.execute("""
+        CREATE OR REPLACE FUNCTION invoice_total(data jsonb) RETURNS numeric
+        LANGUAGE sql IMMUTABLE PARALLEL SAFE AS $$
+            SELECT CASE
+                WHEN data->>'total' ~ '^\\s*-?[0-9]+(\\.[0-9]+)?\\s*$' THEN (data->>'total')::numeric
+            END
+        $$
+    """)
+
+    # Containment queries (data @> '{...}')
+    op.execute("CREATE INDEX IF NOT EXISTS idx_invoices_data_gin ON invoices USING gin (data jsonb_path_ops)")
+    # Hot keys used for filtering and sorting
+    op.execute("CREATE INDEX IF NOT EXISTS idx_invoices_data_invoice_number ON invoices ((data->>'invoice_number'))")
+    op.execute("CREATE INDEX IF NOT EXISTS idx_invoices_user_data_currency ON invoices (user_id, (data->>'currency'))")
+    op.execute("CREATE INDEX IF NOT EXISTS idx_invoices_user_data_total ON invoices (user_id, invoice_total(data))")
+
+
+def downgrade():
+    op.execute("DROP INDEX IF EXISTS idx_invoices_user_data_total")
+    op.execute("DROP INDEX IF EXISTS idx_invoices_user_data_currency")
+    op.execute("DROP INDEX IF EXISTS idx_invoices_data_invoice_number")
+    op.execute("DROP INDEX IF EXISTS idx_invoices_data_gin")
+    op.execute("DROP FUNCTION IF EXISTS invoice_total(jsonb)")
+
+    with op.batch_alter_table('invoices', schema=None) as batch_op:
+        batch_op.alter_column('data',
+               existing_type=postgresql.JSONB(astext_type=sa.Text()),
+               type_=sa.JSON(),
+               existing_nullable=False,
+               postgresql_using='data::json')
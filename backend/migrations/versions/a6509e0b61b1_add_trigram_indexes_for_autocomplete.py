@@ -0,0 +1,39 @@
+"""Add pg_trgm GIN indexes for client and business autocomplete
+
+Revision ID: a6509e0b61b1
+Revises: 4b6e585d4a8c
+Create Date: 2026-10-19 10:41:52.093310
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a6509e0b61b1'
+down_revision = '4b6e585d4a8c'
+branch_labels = None
+depends_on = None
+
+
+TRIGRAM_INDEXES = [
+    ('idx_clients_name_trgm', 'clients', 'name'),
+    ('idx_clients_email_trgm', 'clients', 'email'),
+    ('idx_clients_phone_trgm', 'clients', 'phone'),
+    ('idx_businesses_name_trgm', 'businesses', 'name'),
+    ('idx_businesses_email_trgm', 'businesses', 'email'),
+    ('idx_businesses_phone_trgm', 'businesses', 'phone'),
+]
+
+
+def upgrade():
+    op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    for name, table, column in TRIGRAM_INDEXES:
+        # Fresh databases get businesses (and its indexes) from 22fef8c7d0e9
+        if op.get_bind().execute(sa.text('SELECT to_regclass(:name) IS NOT NULL'), {'name': table}).scalar():
+            op.execute(f"CREATE INDEX IF NOT EXISTS {name} ON {table} USING gin ({column} gin_trgm_ops)")
+
+
+def downgrade():
+    for name, _, _ in TRIGRAM_INDEXES:
+        op.execute(f"DROP INDEX IF EXISTS {name}")
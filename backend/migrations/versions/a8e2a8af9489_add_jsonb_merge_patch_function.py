@@ -0,0 +1,55 @@
+"""Add jsonb_merge_patch() for RFC 7396 partial invoice updates
+
+Revision ID: a8e2a8af9489
+Revises: da7d841f1961
+Create Date: 2026-10-19 14:30:09.662851
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a8e2a8af9489'
+down_revision = 'da7d841f1961'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Objects merge recursively, null removes a key, anything else replaces the target value
+    op.execute("""
+        CREATE OR REPLACE FUNCTION jsonb_merge_patch(target jsonb, patch jsonb) RETURNS jsonb
+        LANGUAGE plpgsql IMMUTABLE AS $$
+        DECLARE
+            result jsonb;
+            patch_key text;
+            patch_value jsonb;
+        BEGIN
+            IF jsonb_typeof(patch) IS DISTINCT FROM 'object' THEN
+                RETURN patch;
+            END IF;
+
+            IF jsonb_typeof(target) IS DISTINCT FROM 'object' THEN
+                result := '{}'::jsonb;
+            ELSE
+                result := target;
+            END IF;
+
+            FOR patch_key, patch_value IN SELECT * FROM jsonb_each(patch) LOOP
+                IF jsonb_typeof(patch_value) = 'null' THEN
+                    result := result - patch_key;
+                ELSE
+                    result := jsonb_set(result, ARRAY[patch_key],
+                                        jsonb_merge_patch(result -> patch_key, patch_value));
+                END IF;
+            END LOOP;
+
+            RETURN result;
+        END
+        $$
+    """)
+
+
+def downgrade():
+    op.execute("DROP FUNCTION IF EXISTS jsonb_merge_patch(jsonb, jsonb)")
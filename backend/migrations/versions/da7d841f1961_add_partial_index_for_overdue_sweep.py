@@ -0,0 +1,29 @@
+"""Add partial index on sent invoices' due_date for the overdue sweep
+
+Revision ID: da7d841f1961
+Revises: 3611ca2e4039
+Create Date: 2026-10-19 13:48:21.407396
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'da7d841f1961'
+down_revision = '3611ca2e4039'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.get_context().autocommit_block():
+        op.create_index('idx_invoices_sent_due_date', 'invoices', ['due_date'],
+                        postgresql_where=sa.text("status = 'sent'"),
+                        if_not_exists=True, postgresql_concurrently=True)
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        op.drop_index('idx_invoices_sent_due_date', table_name='invoices', if_exists=True,
+                      postgresql_concurrently=True)
@@ -1,5 +1,6 @@
 import uuid
 from datetime import datetime
+from sqlalchemy.dialects.postgresql import JSONB, TSVECTOR
 from db import db  # <-- import db from db.py
 
 
@@ -55,10 +56,43 @@ class Invoice(db.Model):
     client_id = db.Column(db.UUID(as_uuid=True), db.ForeignKey('clients.id', ondelete='SET NULL'), nullable=True)
     business_id = db.Column(db.UUID(as_uuid=True), db.ForeignKey('businesses.id', ondelete='SET NULL'), nullable=True)
     invoice_number = db.Column(db.String(100), unique=True, nullable=False)
-    data = db.Column(db.JSON, nullable=False)
+    data = db.Column(JSONB, nullable=False)
     issued_date = db.Column(db.Date)
     due_date = db.Column(db.Date)
     status = db.Column(db.String(50), default='draft')
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
-    currency = db.Column(db.String(10), default='USD')
\ No newline at end of file
+    currency = db.Column(db.String(10), default='USD')
+    # Maintained by the invoices_search_vector_update trigger; deferred so list queries don't load it
+    search_vector = db.deferred(db.Column(TSVECTOR))
+
+    @classmethod
+    def data_text(cls, key):
+        """data->>key, matching the expression indexes on invoice content"""
+        return cls.data[key].astext
+
+    @classmethod
+    def data_total(cls):
+        """Numeric data->>'total' via the indexed invoice_total() function"""
+        return db.func.invoice_total(cls.data, type_=db.Numeric)
+
+    @classmethod
+    def data_amount(cls):
+        """invoice_amount(): the total, or items + tax + shipping - discount when it is missing"""
+        return db.func.invoice_amount(cls.data, type_=db.Numeric)
+
+    @classmethod
+    def data_currency(cls):
+        """Upper-cased data->>'currency', then the currency column, then USD"""
+        return db.func.upper(db.func.coalesce(db.func.nullif(cls.data_text('currency'), ''), cls.currency, 'USD'))
+
+class FxRate(db.Model):
+    __tablename__ = 'fx_rates'
+    # Units of `currency` per one `base_currency`; a load writes a whole version at once
+    version = db.Column(db.String(64), primary_key=True)
+    currency = db.Column(db.String(3), primary_key=True)
+    base_currency = db.Column(db.String(3), nullable=False)
+    rate = db.Column(db.Numeric(20, 10), nullable=False)
+    effective_date = db.Column(db.Date)
+    source = db.Column(db.String(255))
+    loaded_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
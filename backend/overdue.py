@@ -0,0 +1,72 @@
+from db import db
+from sqlalchemy import text
+import logging
+import time
+import os
+
+# Advisory lock key held by whichever process is currently sweeping
+OVERDUE_SWEEP_LOCK_KEY = 72640381
+BATCH_SIZE = int(os.getenv('OVERDUE_SWEEP_BATCH_SIZE', 1000))
+
+SWEEP_BATCH_SQL = text("""
+    UPDATE invoices SET status = 'overdue', updated_at = timezone('utc', now())
+    WHERE id IN (
+        SELECT id FROM invoices
+        WHERE status = 'sent' AND due_date < timezone('utc', now())::date
+        LIMIT :batch_size
+        FOR UPDATE SKIP LOCKED
+    )
+    RETURNING user_id
+""")
+
+
+def sweep_overdue_invoices(batch_size=BATCH_SIZE):
+    """
+    Flip sent invoices past their due date to overdue.
+
+    Runs in short batches, each committed on its own, so row locks are held briefly.
+    A Postgres advisory lock makes sure only one process sweeps at a time; returns
+    None if another process holds it, otherwise {'updated': n, 'batches': n, 'users': n}.
+    """
+    with db.engine.connect() as conn:
+        acquired = conn.execute(
+            text('SELECT pg_try_advisory_lock(:key)'), {'key': OVERDUE_SWEEP_LOCK_KEY}
+        ).scalar()
+        conn.commit()
+        if not acquired:
+            logging.info("[OVERDUE] Another process is sweeping, skipping")
+            return None
+
+        started = time.monotonic()
+        updated, batches, users = 0, 0, set()
+        try:
+            while True:
+                user_ids = conn.execute(SWEEP_BATCH_SQL, {'batch_size': batch_size}).scalars().all()
+                conn.commit()
+                if not user_ids:
+                    break
+                batches += 1
+                updated += len(user_ids)
+                users.update(user_ids)
+        finally:
+            conn.execute(text('SELECT pg_advisory_unlock(:key)'), {'key': OVERDUE_SWEEP_LOCK_KEY})
+            conn.commit()
+
+    logging.info(f"[OVERDUE] Marked {updated} invoices overdue for {len(users)} users "
+                 f"in {batches} batches ({time.monotonic() - started:.2f}s)")
+    return {'updated': updated, 'batches': batches, 'users': len(users)}
+
+
+def run_overdue_scheduler(interval, batch_size=BATCH_SIZE):
+    """
+    Sweep every `interval` seconds until the process is stopped.
+
+    Runs in the foreground of its own process (the Procfile `clock` entry), never in web
+    workers; the advisory lock still keeps a second clock from sweeping at the same time.
+    """
+    while True:
+        try:
+            sweep_overdue_invoices(batch_size)
+        except Exception as e:
+            logging.error(f"[OVERDUE] Sweep failed: {str(e)}", exc_info=True)
+        time.sleep(interval)
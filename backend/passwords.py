@@ -0,0 +1,118 @@
+from werkzeug.security import generate_password_hash, check_password_hash, DEFAULT_PBKDF2_ITERATIONS
+from concurrent.futures import ThreadPoolExecutor
+from concurrency import in_gevent_worker
+from collections import deque
+import threading
+import logging
+import time
+import os
+
+
+class PasswordHasherBusy(Exception):
+    """Raised when too many hash operations are already queued; callers should answer 503"""
+
+
+class PasswordHasher:
+    """Runs password hashing and verification on a small bounded pool of native threads, with latency metrics"""
+
+    # Any Werkzeug method string, e.g. 'scrypt:32768:8:1' (n, r, p) or 'pbkdf2:sha256:600000'
+    METHOD = os.getenv('PASSWORD_HASH_METHOD', 'scrypt:32768:8:1')
+    WORKERS = int(os.getenv('PASSWORD_HASH_WORKERS', 2))
+    # Operations waiting or running at once; beyond this, requests are rejected instead of piling up
+    MAX_PENDING = int(os.getenv('PASSWORD_HASH_MAX_PENDING', 32))
+
+    _pool = None
+    _method_prefix = None
+    _lock = threading.Lock()
+    _pending = 0
+    _stats = {'peak_pending': 0, 'rejected': 0, 'rehashed': 0}
+    _latencies = {'hash': deque(maxlen=1000), 'verify': deque(maxlen=1000)}  # seconds, most recent
+
+    @classmethod
+    def _submit(cls, func, *args):
+        if cls._pool is None:
+            with cls._lock:
+                if cls._pool is None:
+                    if in_gevent_worker():
+                        # Native threads outside the hub, so hashing never blocks other greenlets
+                        from gevent.threadpool import ThreadPool
+                        cls._pool = ThreadPool(cls.WORKERS)
+                    else:
+                        cls._pool = ThreadPoolExecutor(cls.WORKERS, thread_name_prefix='password-hash')
+        if isinstance(cls._pool, ThreadPoolExecutor):
+            return cls._pool.submit(func, *args).result()
+        return cls._pool.spawn(func, *args).get()
+
+    @classmethod
+    def _run(cls, operation, func, *args):
+        with cls._lock:
+            if cls._pending >= cls.MAX_PENDING:
+                cls._stats['rejected'] += 1
+                raise PasswordHasherBusy()
+            cls._pending += 1
+            cls._stats['peak_pending'] = max(cls._stats['peak_pending'], cls._pending)
+
+        started = time.monotonic()
+        try:
+            return cls._submit(func, *args)
+        finally:
+            elapsed = time.monotonic() - started
+            with cls._lock:
+                cls._pending -= 1
+                cls._latencies[operation].append(elapsed)
+            if elapsed > 1:
+                logging.warning(f"[PASSWORD] {operation} took {elapsed:.2f}s ({cls._pending} pending)")
+
+    @classmethod
+    def hash(cls, password):
+        """Hash a password with the configured method"""
+        return cls._run('hash', generate_password_hash, password, cls.METHOD)
+
+    @classmethod
+    def verify(cls, pw_hash, password):
+        """True if `password` matches `pw_hash`"""
+        if not pw_hash:
+            return False
+        return cls._run('verify', check_password_hash, pw_hash, password)
+
+    @staticmethod
+    def method_prefix(method):
+        """The method part Werkzeug writes in front of a hash made with `method`, e.g. 'scrypt' -> 'scrypt:32768:8:1'"""
+        name, *args = method.split(':')
+        if name == 'scrypt':
+            n, r, p = map(int, args) if args else (2 ** 15, 8, 1)
+            return f'scrypt:{n}:{r}:{p}'
+        if name == 'pbkdf2':
+            hash_name = args[0] if args else 'sha256'
+            iterations = int(args[1]) if len(args) > 1 else DEFAULT_PBKDF2_ITERATIONS
+            return f'pbkdf2:{hash_name}:{iterations}'
+        raise ValueError(f"Invalid hash method '{method}'.")
+
+    @classmethod
+    def needs_rehash(cls, pw_hash):
+        """True if `pw_hash` was made with different parameters than the configured method"""
+        if cls._method_prefix is None:
+            cls._method_prefix = cls.method_prefix(cls.METHOD)
+        return pw_hash.split('$', 1)[0] != cls._method_prefix
+
+    @classmethod
+    def record_rehash(cls):
+        with cls._lock:
+            cls._stats['rehashed'] += 1
+
+    @classmethod
+    def stats(cls):
+        """Queue depth, rejections, rehashes and per-operation latency percentiles in milliseconds"""
+        with cls._lock:
+            stats = dict(cls._stats, pending=cls._pending, workers=cls.WORKERS,
+                         max_pending=cls.MAX_PENDING, method=cls.METHOD)
+            latencies = {op: sorted(values) for op, values in cls._latencies.items()}
+
+        for op, values in latencies.items():
+            stats[op] = {
+                'samples': len(values),
+                'p50_ms': round(values[len(values) // 2] * 1000, 1) if values else None,
+                'p95_ms': round(values[int(len(values) * 0.95)] * 1000, 1) if values else None,
+                'max_ms': round(values[-1] * 1000, 1) if values else None,
+            }
+        return stats
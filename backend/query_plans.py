@@ -0,0 +1,153 @@
+from db import db
+from models import User, Client, Invoice
+from invoices import InvoiceOperations
+from clients import Clients
+from businesses import Businesses
+from user_resolver import UserResolver
+from sqlalchemy import text
+from datetime import datetime, timedelta
+import logging
+import uuid
+
+
+def hot_queries(user_id, client_id):
+    """
+    The queries behind the hot endpoints, taken from the same builders the routes execute.
+    Returns (name, statement, tables that must not be sequentially scanned).
+    """
+    return [
+        ('resolve user by internal id (UserResolver.resolve)',
+         UserResolver.lookup_query(user_id),
+         {'users'}),
+        ('resolve user by non-UUID external id (UserResolver.resolve)',
+         UserResolver.lookup_query('104857600123456789012'),
+         {'users'}),
+        ('list invoices (GET /api/invoices)',
+         InvoiceOperations.list_query(user_id),
+         {'invoices'}),
+        ('filter by status (GET /api/invoices?status=)',
+         InvoiceOperations.list_query(user_id, status='sent'),
+         {'invoices'}),
+        ('filter by currency (GET /api/invoices?currency=)',
+         InvoiceOperations.list_query(user_id, currency='USD'),
+         {'invoices'}),
+        ('invoice number lookup (GET /api/invoices?invoice_number=)',
+         InvoiceOperations.list_query(user_id, invoice_number='INV-000001'),
+         {'invoices'}),
+        ('sort by total (GET /api/invoices?sort=total)',
+         InvoiceOperations.list_query(user_id, sort='total', order='desc'),
+         {'invoices'}),
+        ('totals per currency (statistics, dashboard)',
+         InvoiceOperations.currency_totals_query(user_id),
+         {'invoices'}),
+        ('client invoices (GET /api/clients/<id>/invoices)',
+         Clients.invoices_query(client_id),
+         {'invoices'}),
+        ('recent invoices (GET /api/dashboard)',
+         InvoiceOperations.recent_query(user_id, 5),
+         {'invoices'}),
+        ('invoiced clients (GET /api/dashboard)',
+         InvoiceOperations.client_count_query(user_id),
+         {'invoices'}),
+        ('invoice search (GET /api/invoices/search)',
+         InvoiceOperations.search_query(user_id, InvoiceOperations.build_search_query('acme'), 20),
+         {'invoices'}),
+        ('list clients (GET /api/clients)',
+         Clients.list_query(user_id).limit(10),
+         {'clients', 'invoices'}),
+        ('list clients with stats (GET /api/clients?include_stats=1&search=)',
+         Clients.list_query(user_id, search='acme', include_stats=True).limit(10),
+         {'clients', 'invoices'}),
+        ('client balances (GET /api/clients?include_stats=1)',
+         Clients.balances_query([client_id]),
+         {'invoices'}),
+        ('client autocomplete (GET /api/clients/autocomplete?q=)',
+         Clients.autocomplete_query(user_id, 'acm', 10),
+         {'clients'}),
+        ('client autocomplete, no term (GET /api/clients/autocomplete)',
+         Clients.autocomplete_query(user_id, '', 10),
+         {'clients'}),
+        ('list businesses (GET /api/businesses)',
+         Businesses.list_query(user_id).limit(10),
+         {'businesses'}),
+        ('business autocomplete (GET /api/businesses/autocomplete?q=)',
+         Businesses.autocomplete_query(user_id, 'acm', 10),
+         {'businesses'}),
+    ]
+
+
+def explain(statement):
+    """Top node of EXPLAIN (FORMAT JSON) for `statement`, run on the session's connection"""
+    connection = db.session.connection()
+    # render_postcompile expands IN (...) lists, which EXPLAIN over exec_driver_sql can't bind later
+    compiled = statement.compile(dialect=connection.dialect, compile_kwargs={'render_postcompile': True})
+    return connection.exec_driver_sql(f'EXPLAIN (FORMAT JSON) {compiled}', compiled.params).scalar()[0]['Plan']
+
+
+def find_seq_scans(plan, tables):
+    """Walk an EXPLAIN (FORMAT JSON) plan and return the watched tables it sequentially scans"""
+    found = []
+    if plan.get('Node Type') == 'Seq Scan' and plan.get('Relation Name') in tables:
+        found.append(plan['Relation Name'])
+    for child in plan.get('Plans', []):
+        found.extend(find_seq_scans(child, tables))
+    return found
+
+
+def seed_sample_data(rows):
+    """Insert a synthetic user with `rows` clients and invoices; the caller rolls it back"""
+    user = User(email=f"plan_check_{uuid.uuid4().hex[:8]}@example.com", google_id=str(uuid.uuid4()))
+    db.session.add(user)
+    db.session.flush()
+
+    now = datetime.utcnow()
+    clients = [{'id': uuid.uuid4(), 'user_id': user.id, 'name': f'Client {i}', 'created_at': now}
+               for i in range(rows)]
+    db.session.execute(db.insert(Client), clients)
+    db.session.execute(db.insert(Invoice), [
+        {
+            'id': uuid.uuid4(),
+            'user_id': user.id,
+            'client_id': clients[i % len(clients)]['id'],
+            'invoice_number': f'PLAN-{uuid.uuid4().hex}',
+            'data': {'invoice_number': f'INV-{i:06d}', 'currency': 'USD', 'total': i, 'to': f'Client {i}',
+                     'items': [{'name': 'Consulting', 'description': 'Hours', 'quantity': 1, 'unit_cost': i}]},
+            'status': ('draft', 'sent', 'paid', 'overdue')[i % 4],
+            'due_date': (now + timedelta(days=i % 60 - 30)).date(),
+            'created_at': now - timedelta(minutes=i)
+        }
+        for i in range(rows)
+    ])
+    for table in ('users', 'clients', 'invoices', 'businesses'):
+        db.session.execute(text(f'ANALYZE {table}'))
+    return user.id, clients[0]['id']
+
+
+def check_query_plans(seed_rows=0):
+    """
+    EXPLAIN every hot query and return a list of (name, seq-scanned tables) failures.
+
+    Sequential scans are disabled for the check, so a Seq Scan in the plan means no usable
+    index exists rather than the planner preferring a scan of a small table. Everything runs
+    in one transaction that is rolled back, so seeded rows never persist.
+    """
+    failures = []
+    try:
+        db.session.execute(text('SET LOCAL enable_seqscan = off'))
+        if seed_rows:
+            user_id, client_id = seed_sample_data(seed_rows)
+        else:
+            user_id, client_id = uuid.uuid4(), uuid.uuid4()
+
+        for name, statement, tables in hot_queries(user_id, client_id):
+            plan = explain(statement)
+            scanned = find_seq_scans(plan, tables)
+            if scanned:
+                failures.append((name, scanned))
+                logging.error(f"[QUERY PLAN] {name}: sequential scan on {', '.join(scanned)}")
+            else:
+                logging.info(f"[QUERY PLAN] {name}: ok ({plan['Node Type']})")
+    finally:
+        db.session.rollback()
+
+    return failures
@@ -0,0 +1,63 @@
+from weasyprint import HTML
+from concurrency import run_off_loop
+from io import BytesIO
+import base64
+
+# SVG logos are rasterized at this multiple of their target box, then downscaled for quality
+SVG_OVERSAMPLE = 2
+
+
+def _html_to_pdf(html):
+    return HTML(string=html).write_pdf()
+
+
+def _html_to_png(html):
+    # Render PDF first, then convert the first page to PNG using pdf2image
+    from pdf2image import convert_from_bytes
+    images = convert_from_bytes(_html_to_pdf(html), first_page=1, last_page=1)
+    img_io = BytesIO()
+    images[0].save(img_io, format='PNG')
+    return img_io.getvalue()
+
+
+def _deny_external_fetch(url, *args, **kwargs):
+    # Uploaded SVGs are untrusted: only their own inline data: URIs may be loaded
+    if not url.startswith('data:'):
+        raise ValueError(f'External resource blocked: {url[:100]}')
+    from weasyprint import default_url_fetcher
+    return default_url_fetcher(url, *args, **kwargs)
+
+
+def _svg_to_png(svg, width, height):
+    from pdf2image import convert_from_bytes
+    src = 'data:image/svg+xml;base64,' + base64.b64encode(svg).decode('ascii')
+    html = (
+        f'<style>@page {{ size: {width}px {height}px; margin: 0 }} body {{ margin: 0 }}'
+        f'img {{ display: block; max-width: {width}px; max-height: {height}px }}</style>'
+        f'<img src="{src}">'
+    )
+    pdf = HTML(string=html, url_fetcher=_deny_external_fetch).write_pdf()
+    image = convert_from_bytes(pdf, dpi=96 * SVG_OVERSAMPLE, fmt='png', transparent=True,
+                               first_page=1, last_page=1)[0].convert('RGBA')
+    # The page is the full box; trim it to the drawn logo
+    bbox = image.getbbox()
+    if bbox:
+        image = image.crop(bbox)
+    img_io = BytesIO()
+    image.save(img_io, format='PNG')
+    return img_io.getvalue()
+
+
+def rasterize_svg(svg, box):
+    """Render SVG bytes to a transparent PNG fitting `box` (width, height) off the event loop"""
+    return run_off_loop(_svg_to_png, svg, *box)
+
+
+def render_pdf(html):
+    """Render invoice HTML to PDF bytes off the event loop"""
+    return run_off_loop(_html_to_pdf, html)
+
+
+def render_png(html):
+    """Render the first page of invoice HTML to PNG bytes off the event loop"""
+    return run_off_loop(_html_to_png, html)
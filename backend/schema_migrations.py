@@ -0,0 +1,58 @@
+from db import db
+from sqlalchemy import text
+from flask import current_app
+from flask_migrate import upgrade, stamp
+import logging
+import time
+
+# Advisory lock key held by whichever process is currently migrating
+MIGRATION_LOCK_KEY = 72640382
+
+# Last revision a database bootstrapped by db.create_all() + migration.sql is known to match
+LEGACY_BASELINE_REVISION = 'ca632e07f0c9'
+
+
+def run_migrations(revision='head'):
+    """
+    Upgrade the schema to `revision` with Alembic, which records applied versions in alembic_version.
+
+    Meant to run once per deploy as a release step, never from worker boot. A Postgres advisory
+    lock serialises concurrent runners: the others wait, then find nothing left to apply.
+    Returns {'from': rev, 'to': rev, 'seconds': n}.
+    """
+    directory = current_app.extensions['migrate'].directory
+    started = time.monotonic()
+
+    with db.engine.connect() as conn:
+        conn.execute(text('SELECT pg_advisory_lock(:key)'), {'key': MIGRATION_LOCK_KEY})
+        conn.commit()
+        try:
+            before = _current_revision(conn)
+            if before is None and _has_table(conn, 'users'):
+                # Schema predates version tracking; later revisions are idempotent over it
+                logging.info(f"[MIGRATE] Untracked schema found, stamping {LEGACY_BASELINE_REVISION}")
+                stamp(directory=directory, revision=LEGACY_BASELINE_REVISION)
+            upgrade(directory=directory, revision=revision)
+            after = _current_revision(conn)
+        finally:
+            conn.execute(text('SELECT pg_advisory_unlock(:key)'), {'key': MIGRATION_LOCK_KEY})
+            conn.commit()
+
+    elapsed = time.monotonic() - started
+    logging.info(f"[MIGRATE] Schema at {after} (was {before}) in {elapsed:.2f}s")
+    return {'from': before, 'to': after, 'seconds': round(elapsed, 2)}
+
+
+def _has_table(conn, name):
+    # to_regclass takes no lock, so a transaction left open would keep missing tables created since
+    exists = conn.execute(text('SELECT to_regclass(:name) IS NOT NULL'), {'name': name}).scalar()
+    conn.commit()
+    return exists
+
+
+def _current_revision(conn):
+    if not _has_table(conn, 'alembic_version'):
+        return None
+    revision = conn.execute(text('SELECT version_num FROM alembic_version')).scalar()
+    conn.commit()
+    return revision
@@ -0,0 +1,73 @@
+import os
+import sys
+import uuid
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import Flask
+from flask_migrate import Migrate
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+from db import db
+from models import User
+from schema_migrations import run_migrations
+
+# e.g. postgresql://postgres@localhost/invoice_test; migrated to head, and test rows are removed afterwards
+TEST_DATABASE_URL = os.getenv('TEST_DATABASE_URL')
+
+
+@pytest.fixture(scope='session')
+def app():
+    """Minimal app bound to TEST_DATABASE_URL with the schema migrated; skips when Postgres is unavailable"""
+    if not TEST_DATABASE_URL:
+        pytest.skip('TEST_DATABASE_URL is not set')
+
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = TEST_DATABASE_URL
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    db.init_app(app)
+    Migrate(app, db, directory=os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'migrations'))
+
+    with app.app_context():
+        try:
+            db.session.execute(text('SELECT 1'))
+        except OperationalError as e:
+            pytest.skip(f'Postgres is unavailable: {e}')
+        db.session.rollback()
+        run_migrations()
+    return app
+
+
+@pytest.fixture
+def app_context(app):
+    with app.test_request_context():
+        yield
+        db.session.rollback()
+
+
+@pytest.fixture
+def user(app_context):
+    """A throwaway user; its clients, businesses and invoices cascade away with it"""
+    user = User(email=f'test_{uuid.uuid4().hex[:12]}@example.com', google_id=str(uuid.uuid4()))
+    db.session.add(user)
+    db.session.commit()
+    user_id = user.id
+    yield user
+    db.session.rollback()
+    db.session.execute(db.delete(User).where(User.id == user_id))
+    db.session.commit()
+
+
+@pytest.fixture
+def non_utc_database(app_context):
+    """New connections get a UTC+14 session time zone, so now() and naive UTC timestamps disagree"""
+    database = db.engine.url.database
+    db.session.execute(text(f"ALTER DATABASE \"{database}\" SET timezone = 'Pacific/Kiritimati'"))
+    db.session.commit()
+    db.engine.dispose()
+    yield
+    db.session.rollback()
+    db.session.execute(text(f"ALTER DATABASE \"{database}\" RESET timezone"))
+    db.session.commit()
+    db.engine.dispose()
@@ -0,0 +1,75 @@
+import io
+import json
+import uuid
+from datetime import datetime, timedelta
+from db import db
+from models import Client, Invoice
+from bulk_import import BulkImport
+
+
+def _ndjson(*records):
+    return io.BytesIO(''.join(json.dumps(record) + '\n' for record in records).encode('utf-8'))
+
+
+def test_invoice_import_inserts_then_updates(user):
+    client = Client(user_id=user.id, name='Acme')
+    db.session.add(client)
+    db.session.commit()
+    number = f'IMP-{uuid.uuid4().hex[:12]}'
+    record = {'invoice_number': number, 'client_id': str(client.id), 'status': 'sent',
+              'data': {'invoice_number': number, 'currency': 'EUR', 'total': 120}}
+
+    result = BulkImport.import_stream('invoices', _ndjson(record), 'ndjson', str(user.id))
+    assert (result['inserted'], result['updated'], result['failed']) == (1, 0, 0), result['errors']
+
+    record['status'] = 'paid'
+    result = BulkImport.import_stream('invoices', _ndjson(record), 'ndjson', str(user.id))
+    assert (result['inserted'], result['updated'], result['failed']) == (0, 1, 0), result['errors']
+
+    invoice = db.session.execute(db.select(Invoice).where(Invoice.invoice_number == number)).scalar_one()
+    assert (invoice.user_id, invoice.client_id, invoice.status) == (user.id, client.id, 'paid')
+
+
+def test_invoice_import_rejects_unknown_client(user):
+    number = f'IMP-{uuid.uuid4().hex[:12]}'
+    record = {'invoice_number': number, 'client_id': str(uuid.uuid4()), 'data': {'total': 1}}
+
+    result = BulkImport.import_stream('invoices', _ndjson(record), 'ndjson', str(user.id))
+
+    assert (result['inserted'], result['failed']) == (0, 1)
+    assert result['errors'][0]['errors'] == ['client_id not found']
+
+
+def test_invoice_import_writes_utc_timestamps(user, non_utc_database):
+    number = f'IMP-{uuid.uuid4().hex[:12]}'
+    result = BulkImport.import_stream('invoices', _ndjson({'invoice_number': number, 'data': {'total': 1}}),
+                                      'ndjson', str(user.id))
+    assert result['inserted'] == 1, result['errors']
+
+    invoice = db.session.execute(db.select(Invoice).where(Invoice.invoice_number == number)).scalar_one()
+    assert abs(invoice.created_at - datetime.utcnow()) < timedelta(minutes=1)
+    assert abs(invoice.updated_at - datetime.utcnow()) < timedelta(minutes=1)
+
+
+def test_overlong_values_fail_only_their_row(user):
+    records = [{'name': 'Ok client'}, {'name': 'x' * 300}, {'name': 'Also ok', 'phone': '1' * 60}]
+
+    result = BulkImport.import_stream('clients', _ndjson(*records), 'ndjson', str(user.id))
+
+    assert (result['inserted'], result['failed']) == (1, 2)
+    assert [error['errors'] for error in result['errors']] == [['name must be at most 255 characters'],
+                                                               ['phone must be at most 50 characters']]
+
+
+def test_batch_failure_is_retried_row_by_row(user):
+    numbers = [f'IMP-{uuid.uuid4().hex[:12]}' for _ in range(3)]
+    records = [{'invoice_number': number, 'data': {'total': 1}} for number in numbers]
+    # Valid JSON that jsonb still rejects, so the whole staged batch fails
+    records[1]['data']['notes'] = 'nul \u0000 byte'
+
+    result = BulkImport.import_stream('invoices', _ndjson(*records), 'ndjson', str(user.id))
+
+    assert (result['inserted'], result['failed']) == (2, 1)
+    assert result['errors'] == [{'row': 2, 'errors': ['Row failed to import']}]
+    imported = db.session.execute(db.select(Invoice.invoice_number).where(Invoice.user_id == user.id)).scalars().all()
+    assert sorted(imported) == sorted([numbers[0], numbers[2]])
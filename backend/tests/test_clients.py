@@ -0,0 +1,55 @@
+import uuid
+from flask import current_app
+from db import db
+from models import Client, Invoice
+from clients import Clients
+
+
+def _get_clients(user, **args):
+    with current_app.test_request_context('/api/clients', query_string={'user_id': str(user.id), **args}):
+        response, status = Clients.get_clients()
+    assert status == 200, response.json
+    return response.json
+
+
+def test_client_stats_are_per_currency_and_use_invoice_amounts(user):
+    client = Client(user_id=user.id, name='Acme')
+    db.session.add(client)
+    db.session.flush()
+    db.session.add_all([
+        Invoice(user_id=user.id, client_id=client.id, invoice_number=f'CL-{uuid.uuid4().hex}', status=status,
+                data={'currency': currency, **data})
+        for currency, status, data in [
+            ('USD', 'paid', {'total': 100}),
+            ('USD', 'sent', {'items': [{'quantity': 2, 'unit_cost': 10}]}),  # no total: amount from items
+            ('EUR', 'overdue', {'total': 50}),
+            ('EUR', 'draft', {'total': 999}),
+        ]
+    ])
+    db.session.commit()
+
+    stats = _get_clients(user, include_stats='1', reporting_currency='USD')['clients'][0]
+
+    assert stats['invoice_count'] == 4
+    by_currency = {currency: {key: float(value) for key, value in sums.items()}
+                   for currency, sums in stats['by_currency'].items()}
+    assert by_currency['USD'] == {'invoices': 2, 'total_billed': 120.0, 'outstanding': 20.0}
+    assert by_currency['EUR'] == {'invoices': 2, 'total_billed': 50.0, 'outstanding': 50.0}
+    assert stats['reporting_currency'] == 'USD'
+    # No FX rates loaded: EUR stays out of the USD totals instead of being added as if it were USD
+    assert stats['unconverted_currencies'] == ['EUR']
+    assert (stats['total_billed'], stats['outstanding']) == (120.0, 20.0)
+
+
+def test_client_paging_counts_matches_without_a_second_query(user):
+    db.session.add_all([Client(user_id=user.id, name=f'Client {i}') for i in range(5)])
+    db.session.commit()
+
+    page = _get_clients(user, per_page='2', page='3')
+    assert (len(page['clients']), page['pagination']['total'], page['pagination']['pages']) == (1, 5, 3)
+
+    limited = _get_clients(user, limit='2')
+    assert (len(limited['clients']), limited['pagination']['total']) == (2, 5)
+
+    past_end = _get_clients(user, per_page='2', page='9')
+    assert (past_end['clients'], past_end['pagination']['total']) == ([], 5)
@@ -0,0 +1,63 @@
+import uuid
+from collections import namedtuple
+from decimal import Decimal
+import pytest
+import fx
+from db import db
+from models import FxRate, Invoice
+from invoices import InvoiceOperations
+
+Row = namedtuple('Row', 'currency status count amount')
+BUCKETS = {'total_revenue': ('paid',), 'pending_amount': ('sent', 'overdue')}
+
+
+def test_totals_stay_numeric_without_rates(monkeypatch):
+    monkeypatch.setattr(fx, 'get_rates', lambda version=None: None)
+    rows = [Row('USD', 'paid', 2, Decimal('100')), Row('EUR', 'sent', 1, Decimal('40'))]
+
+    summary = fx.summarize_by_currency(rows, BUCKETS)
+
+    assert summary['totals'] == {'total_revenue': Decimal('100.00'), 'pending_amount': Decimal('0.00')}
+    assert summary['reporting_currency'] == 'USD'
+    assert summary['unconverted_currencies'] == ['EUR']
+    assert summary['by_currency']['EUR']['pending_amount'] == Decimal('40')
+
+
+def test_single_currency_needs_no_rates(monkeypatch):
+    monkeypatch.setattr(fx, 'get_rates', lambda version=None: pytest.fail('rates looked up'))
+
+    summary = fx.summarize_by_currency([Row('EUR', 'paid', 1, Decimal('12.5'))], BUCKETS)
+
+    assert (summary['reporting_currency'], summary['totals']['total_revenue']) == ('EUR', Decimal('12.50'))
+
+
+@pytest.fixture
+def fx_version(app_context):
+    version = fx.load_rates({'EUR': '0.8', 'GBP': '0.5'}, 'USD', version=f'test-{uuid.uuid4().hex[:8]}')
+    yield version
+    db.session.rollback()
+    db.session.execute(db.delete(FxRate).where(FxRate.version == version))
+    db.session.commit()
+
+
+def test_grouped_totals_convert_to_reporting_currency(user, fx_version):
+    def invoice(currency, status, data):
+        return Invoice(user_id=user.id, invoice_number=f'FX-{uuid.uuid4().hex}', status=status,
+                       data={'currency': currency, **data})
+
+    db.session.add_all([
+        invoice('USD', 'paid', {'total': 100}),
+        invoice('eur', 'paid', {'items': [{'quantity': 2, 'unit_cost': '20'}], 'tax_amount': 5}),
+        invoice('EUR', 'sent', {'total': '40'}),
+        invoice('JPY', 'paid', {'total': 1000}),
+    ])
+    db.session.commit()
+
+    rows = InvoiceOperations.currency_totals(user.id)
+    summary = fx.summarize_by_currency(rows, BUCKETS, 'EUR', fx_version)
+
+    assert summary['by_currency']['EUR'] == {'invoices': 2, 'total_revenue': Decimal('45'),
+                                             'pending_amount': Decimal('40')}
+    # 100 USD -> 80 EUR, plus 45 EUR; JPY has no rate in this version
+    assert summary['totals'] == {'total_revenue': Decimal('125.00'), 'pending_amount': Decimal('40.00')}
+    assert (summary['fx_version'], summary['unconverted_currencies']) == (fx_version, ['JPY'])
@@ -0,0 +1,43 @@
+import uuid
+from flask import current_app
+from db import db
+from models import Invoice
+from invoices import InvoiceOperations
+
+
+def _patch(invoice, patch):
+    with current_app.test_request_context(f'/api/invoices/{invoice.id}', method='PATCH', json=patch):
+        response = InvoiceOperations.patch_invoice(str(invoice.id))
+    response, status = response if isinstance(response, tuple) else (response, response.status_code)
+    return response.json, status
+
+
+def _invoice(user, number):
+    invoice = Invoice(user_id=user.id, invoice_number=number, currency='USD',
+                      data={'invoice_number': number, 'currency': 'USD', 'total': 10})
+    db.session.add(invoice)
+    db.session.commit()
+    return invoice
+
+
+def test_patch_keeps_invoice_number_and_currency_columns_in_step(user):
+    invoice = _invoice(user, f'PATCH-{uuid.uuid4().hex}')
+    number = f'PATCH-{uuid.uuid4().hex}'
+
+    body, status = _patch(invoice, {'invoice_number': number, 'currency': 'EUR'})
+
+    assert status == 200, body
+    db.session.expire_all()
+    row = db.session.get(Invoice, invoice.id)
+    assert (row.invoice_number, row.currency) == (number, 'EUR')
+    assert (row.data['invoice_number'], row.data['currency'], row.data['total']) == (number, 'EUR', 10)
+
+
+def test_patch_rejects_unusable_invoice_numbers(user):
+    invoice = _invoice(user, f'PATCH-{uuid.uuid4().hex}')
+    taken = _invoice(user, f'PATCH-{uuid.uuid4().hex}').invoice_number
+
+    assert _patch(invoice, {'invoice_number': None})[1] == 400
+    assert _patch(invoice, {'invoice_number': taken})[1] == 409
+    db.session.expire_all()
+    assert db.session.get(Invoice, invoice.id).data['invoice_number'] == invoice.invoice_number
@@ -0,0 +1,39 @@
+import os
+import threading
+import pytest
+
+pytest.importorskip('weasyprint')
+import logos
+
+
+def test_concurrent_writes_of_the_same_file_all_succeed(tmp_path, monkeypatch):
+    monkeypatch.setattr(logos, 'UPLOAD_FOLDER', str(tmp_path))
+    filename = 'a' * 64 + '.png'
+    data = os.urandom(64 * 1024)
+    # Both writers pass the exists() check and finish writing before either publishes
+    start, publish = threading.Barrier(2), threading.Barrier(2)
+    replace = os.replace
+
+    def replace_together(src, dst):
+        publish.wait()
+        replace(src, dst)
+
+    monkeypatch.setattr(logos.os, 'replace', replace_together)
+    errors = []
+
+    def store():
+        start.wait()
+        try:
+            logos._write_once(filename, data)
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=store) for _ in range(2)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert errors == []
+    assert os.listdir(tmp_path) == [filename]
+    assert (tmp_path / filename).read_bytes() == data
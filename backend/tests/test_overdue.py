@@ -0,0 +1,19 @@
+import uuid
+from datetime import datetime, timedelta
+from db import db
+from models import Invoice
+from overdue import sweep_overdue_invoices
+
+
+def test_sweep_writes_utc_updated_at(user, non_utc_database):
+    yesterday = (datetime.utcnow() - timedelta(days=1)).date()
+    invoice = Invoice(user_id=user.id, invoice_number=f'OVD-{uuid.uuid4().hex}', status='sent', data={},
+                      due_date=yesterday, updated_at=datetime(2020, 1, 1))
+    db.session.add(invoice)
+    db.session.commit()
+
+    assert sweep_overdue_invoices(batch_size=100)['updated'] >= 1
+
+    db.session.refresh(invoice)
+    assert invoice.status == 'overdue'
+    assert abs(invoice.updated_at - datetime.utcnow()) < timedelta(minutes=1)
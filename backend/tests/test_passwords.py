@@ -0,0 +1,17 @@
+import pytest
+from werkzeug.security import generate_password_hash
+from passwords import PasswordHasher
+
+
+@pytest.mark.parametrize('method', ['scrypt', 'scrypt:16384:8:1', 'pbkdf2', 'pbkdf2:sha512', 'pbkdf2:sha256:1000'])
+def test_method_prefix_matches_werkzeug(method):
+    assert PasswordHasher.method_prefix(method) == generate_password_hash('x', method).split('$', 1)[0]
+
+
+def test_needs_rehash_does_not_hash(monkeypatch):
+    monkeypatch.setattr(PasswordHasher, 'METHOD', 'pbkdf2:sha256:1000')
+    monkeypatch.setattr(PasswordHasher, '_method_prefix', None)
+    monkeypatch.setattr(PasswordHasher, '_run', lambda *args: pytest.fail('hashed to learn the prefix'))
+
+    assert not PasswordHasher.needs_rehash(generate_password_hash('x', 'pbkdf2:sha256:1000'))
+    assert PasswordHasher.needs_rehash(generate_password_hash('x', 'pbkdf2:sha256:2000'))
@@ -0,0 +1,31 @@
+import uuid
+import pytest
+from sqlalchemy import text
+from db import db
+from models import User
+from query_plans import hot_queries, explain, find_seq_scans, seed_sample_data
+
+HOT_QUERIES = [name for name, _, _ in hot_queries(uuid.uuid4(), uuid.uuid4())]
+
+
+@pytest.fixture(scope='module')
+def seeded(app):
+    """A user with a few thousand clients and invoices, analyzed so the planner sees realistic stats"""
+    with app.app_context():
+        user_id, client_id = seed_sample_data(2000)
+        db.session.commit()
+    yield user_id, client_id
+    with app.app_context():
+        db.session.execute(db.delete(User).where(User.id == user_id))
+        db.session.commit()
+
+
+@pytest.mark.parametrize('name', HOT_QUERIES)
+def test_hot_query_uses_an_index(seeded, app_context, name):
+    statement, tables = next((s, t) for n, s, t in hot_queries(*seeded) if n == name)
+    # With sequential scans disabled, a Seq Scan left in the plan means no usable index exists
+    db.session.execute(text('SET LOCAL enable_seqscan = off'))
+
+    plan = explain(statement)
+
+    assert find_seq_scans(plan, tables) == []
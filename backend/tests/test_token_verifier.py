@@ -0,0 +1,24 @@
+import json
+from unittest import mock
+import jwt
+from cryptography.hazmat.primitives.asymmetric import ec
+from token_verifier import TokenVerifier
+
+
+def test_unusable_jwks_entry_does_not_drop_the_others(monkeypatch):
+    private_key = ec.generate_private_key(ec.SECP256R1())
+    good = json.loads(jwt.algorithms.ECAlgorithm.to_jwk(private_key.public_key()))
+    good.update(kid='good', alg='ES256')
+    response = mock.Mock()
+    response.json.return_value = {'keys': [{'kty': 'EC', 'crv': 'P-999', 'kid': 'bad'}, good]}
+
+    monkeypatch.setattr(TokenVerifier, '_jwks_url', 'https://example.supabase.co/auth/v1/keys')
+    monkeypatch.setattr(TokenVerifier, '_keys', {})
+    monkeypatch.setattr(TokenVerifier, '_fetched_at', None)
+    monkeypatch.setattr(TokenVerifier._session, 'get', mock.Mock(return_value=response))
+    TokenVerifier._fetch_keys()
+
+    assert list(TokenVerifier._keys) == ['good']
+    token = jwt.encode({'sub': 'user'}, private_key, algorithm='ES256', headers={'kid': 'good'})
+    monkeypatch.setattr(TokenVerifier, '_start_refresher', classmethod(lambda cls: None))
+    assert TokenVerifier.verify(token)['sub'] == 'user'
@@ -0,0 +1,71 @@
+import threading
+import uuid
+import pytest
+from db import db
+from models import User
+from user_resolver import UserResolver
+
+CONCURRENCY = 20
+
+
+def _concurrent_first_logins(app, google_id, email):
+    """Provision the same Supabase user from CONCURRENCY threads released at once; returns (ids, errors)"""
+    barrier = threading.Barrier(CONCURRENCY)
+    ids, errors = [], []
+
+    def first_login():
+        with app.app_context():
+            barrier.wait()
+            try:
+                ids.append(UserResolver.provision(google_id, email=email, first_name='Ada').id)
+            except Exception as e:
+                errors.append(e)
+            finally:
+                db.session.remove()
+
+    threads = [threading.Thread(target=first_login) for _ in range(CONCURRENCY)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return ids, errors
+
+
+@pytest.fixture
+def identity(app_context):
+    google_id = str(uuid.uuid4())
+    email = f'provision_{google_id[:8]}@example.com'
+    yield google_id, email
+    db.session.rollback()
+    db.session.execute(db.delete(User).where(db.or_(User.google_id == google_id, User.email == email)))
+    db.session.commit()
+    UserResolver.invalidate(google_id)
+
+
+def _rows(google_id, email):
+    by_email = db.session.execute(db.select(User).where(User.email == email)).scalars().all()
+    by_google = db.session.execute(db.select(User).where(User.google_id == google_id)).scalars().all()
+    return by_email, by_google
+
+
+def test_concurrent_first_logins_create_one_user(app, identity):
+    ids, errors = _concurrent_first_logins(app, *identity)
+
+    assert errors == []
+    by_email, by_google = _rows(*identity)
+    assert len(by_email) == 1 and len(by_google) == 1
+    assert set(ids) == {by_google[0].id}
+
+
+def test_concurrent_first_logins_link_existing_email_signup(app, identity):
+    google_id, email = identity
+    signup = User(email=email, password_hash='x')
+    db.session.add(signup)
+    db.session.commit()
+
+    ids, errors = _concurrent_first_logins(app, google_id, email)
+
+    assert errors == []
+    by_email, by_google = _rows(google_id, email)
+    assert [user.id for user in by_email] == [user.id for user in by_google] == [signup.id]
+    assert set(ids) == {signup.id}
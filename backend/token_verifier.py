@@ -0,0 +1,134 @@
+from collections import OrderedDict
+import threading
+import requests
+import hashlib
+import logging
+import time
+import jwt
+import os
+
+
+class TokenVerifier:
+    """Verifies Supabase access tokens against a kid-keyed JWKS store, with a short-lived cache of verified claims"""
+
+    JWKS_TTL_SECONDS = float(os.getenv('JWKS_TTL', 3600))
+    # Unknown kids trigger a refetch (key rotation), but no more often than this
+    JWKS_MIN_REFETCH_SECONDS = float(os.getenv('JWKS_MIN_REFETCH_INTERVAL', 30))
+    CLAIMS_TTL_SECONDS = float(os.getenv('TOKEN_CLAIMS_CACHE_TTL', 60))
+    CLAIMS_MAX_ENTRIES = int(os.getenv('TOKEN_CLAIMS_CACHE_SIZE', 10000))
+    ALGORITHMS = ['RS256', 'ES256']
+
+    _jwks_url = None
+    _keys = {}  # kid -> (parsed public key, algorithm)
+    _fetched_at = None  # monotonic time of the last fetch attempt
+    _keys_lock = threading.Lock()
+    _refresher = None
+    _session = requests.Session()
+
+    _claims = OrderedDict()  # sha256(token) -> (claims, expires_at)
+    _claims_lock = threading.Lock()
+
+    @classmethod
+    def configure(cls, supabase_url):
+        cls._jwks_url = f"{supabase_url}/auth/v1/keys"
+
+    @classmethod
+    def _fetch_keys(cls):
+        """Fetch the JWKS and parse every key once; keeps the previous keys if the fetch fails"""
+        try:
+            res = cls._session.get(cls._jwks_url, timeout=5)
+            res.raise_for_status()
+            keys = {}
+            for jwk in res.json().get('keys', []):
+                try:
+                    parsed = jwt.PyJWK(jwk)
+                except jwt.PyJWTError as e:
+                    # PyJWKError and InvalidKeyError (unknown kty/crv) alike: skip the key, keep the rest
+                    logging.warning(f"[JWKS] Skipping unusable key {jwk.get('kid')}: {str(e)}")
+                    continue
+                keys[jwk.get('kid')] = (parsed.key, jwk.get('alg') or parsed.algorithm_name)
+        except Exception as e:
+            logging.error(f"[JWKS] Failed to fetch {cls._jwks_url}: {str(e)}")
+            with cls._keys_lock:
+                cls._fetched_at = time.monotonic()  # back off until the next refetch window
+            return
+
+        with cls._keys_lock:
+            cls._keys, cls._fetched_at = keys, time.monotonic()
+        logging.info(f"[JWKS] Loaded {len(keys)} signing keys")
+
+    @classmethod
+    def _start_refresher(cls):
+        """Refresh keys in the background before they go stale, so requests never wait on a fetch"""
+        def run():
+            while True:
+                time.sleep(cls.JWKS_TTL_SECONDS * 0.8)
+                cls._fetch_keys()
+
+        with cls._keys_lock:
+            if cls._refresher is not None:
+                return
+            cls._refresher = threading.Thread(target=run, name='jwks-refresher', daemon=True)
+        cls._refresher.start()
+
+    @classmethod
+    def get_key(cls, kid):
+        """Parsed public key and algorithm for `kid`, refetching the JWKS when stale or the kid is unknown"""
+        cls._start_refresher()
+        with cls._keys_lock:
+            entry = cls._keys.get(kid)
+            age = float('inf') if cls._fetched_at is None else time.monotonic() - cls._fetched_at
+
+        if (entry is None and age >= cls.JWKS_MIN_REFETCH_SECONDS) or age >= cls.JWKS_TTL_SECONDS:
+            cls._fetch_keys()
+            with cls._keys_lock:
+                entry = cls._keys.get(kid)
+        return entry
+
+    @classmethod
+    def _get_cached_claims(cls, key):
+        with cls._claims_lock:
+            entry = cls._claims.get(key)
+            if entry is None:
+                return None
+            claims, expires_at = entry
+            if expires_at < time.time():
+                del cls._claims[key]
+                return None
+            cls._claims.move_to_end(key)
+            return claims
+
+    @classmethod
+    def _store_claims(cls, key, claims):
+        # Never cache past the token's own expiry
+        expires_at = min(time.time() + cls.CLAIMS_TTL_SECONDS, claims.get('exp', float('inf')))
+        with cls._claims_lock:
+            cls._claims[key] = (claims, expires_at)
+            cls._claims.move_to_end(key)
+            while len(cls._claims) > cls.CLAIMS_MAX_ENTRIES:
+                cls._claims.popitem(last=False)
+
+    @classmethod
+    def verify(cls, token):
+        """
+        Return the verified claims of a Supabase JWT, raising jwt.InvalidTokenError if it is not valid.
+
+        Repeat verifications of the same token within TOKEN_CLAIMS_CACHE_TTL (capped at the
+        token's exp) are served from memory without touching the signature again.
+        """
+        cache_key = hashlib.sha256(token.encode('utf-8')).hexdigest()
+        claims = cls._get_cached_claims(cache_key)
+        if claims is not None:
+            return claims
+
+        kid = jwt.get_unverified_header(token).get('kid')
+        entry = cls.get_key(kid)
+        if entry is None:
+            raise jwt.InvalidTokenError('Invalid signing key')
+        public_key, algorithm = entry
+        if algorithm not in cls.ALGORITHMS:
+            raise jwt.InvalidTokenError(f'Unsupported signing algorithm: {algorithm}')
+
+        claims = jwt.decode(token, public_key, algorithms=[algorithm], options={"verify_aud": False})
+        cls._store_claims(cache_key, claims)
+        return claims
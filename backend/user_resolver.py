@@ -0,0 +1,175 @@
+from collections import OrderedDict
+from sqlalchemy import text, bindparam
+from sqlalchemy.exc import IntegrityError
+from db import db
+from models import User
+import threading
+import logging
+import time
+import uuid
+import os
+
+
+# One round trip: link an email signup, or insert, or return the existing row for this Supabase id
+PROVISION_USER_SQL = text("""
+    WITH by_google AS (
+        SELECT id FROM users WHERE google_id = :google_id
+    ), linked AS (
+        UPDATE users SET
+            google_id = COALESCE(users.google_id, :google_id),
+            first_name = COALESCE(NULLIF(users.first_name, ''), :first_name),
+            last_name = COALESCE(NULLIF(users.last_name, ''), :last_name),
+            updated_at = timezone('utc', now())
+        WHERE CAST(:email AS varchar) IS NOT NULL AND users.email = :email
+          AND NOT EXISTS (SELECT 1 FROM by_google)
+        RETURNING id, email, first_name, last_name, google_id, false AS created
+    ), upserted AS (
+        INSERT INTO users (id, email, first_name, last_name, google_id, password_hash, is_guest,
+                           created_at, updated_at)
+        SELECT CAST(:new_id AS uuid), COALESCE(:email, :placeholder_email), :first_name, :last_name, :google_id, NULL, false,
+               timezone('utc', now()), timezone('utc', now())
+        WHERE NOT EXISTS (SELECT 1 FROM linked)
+        ON CONFLICT (google_id) DO UPDATE SET
+            first_name = COALESCE(NULLIF(users.first_name, ''), EXCLUDED.first_name),
+            last_name = COALESCE(NULLIF(users.last_name, ''), EXCLUDED.last_name),
+            updated_at = EXCLUDED.updated_at
+        RETURNING id, email, first_name, last_name, google_id, (xmax = 0) AS created
+    )
+    SELECT * FROM linked UNION ALL SELECT * FROM upserted
+""").bindparams(bindparam('new_id', type_=db.UUID(as_uuid=True))).columns(id=db.UUID(as_uuid=True))
+
+
+class UserResolver:
+    """Resolves Supabase/Google ids and internal ids to internal user UUIDs with a bounded TTL cache"""
+
+    MAX_ENTRIES = int(os.getenv('USER_RESOLVER_CACHE_SIZE', 10000))
+    TTL_SECONDS = float(os.getenv('USER_RESOLVER_CACHE_TTL', 300))
+
+    _cache = OrderedDict()  # external or internal id -> (internal UUID, expires_at)
+    _lock = threading.Lock()
+
+    @staticmethod
+    def _as_uuid(value):
+        """Return value as a UUID, or None if it is not one"""
+        try:
+            return uuid.UUID(str(value))
+        except (ValueError, TypeError):
+            return None
+
+    @classmethod
+    def _get_cached(cls, key):
+        with cls._lock:
+            entry = cls._cache.get(key)
+            if entry is None:
+                return None
+            internal_id, expires_at = entry
+            if expires_at < time.monotonic():
+                del cls._cache[key]
+                return None
+            cls._cache.move_to_end(key)
+            return internal_id
+
+    @classmethod
+    def _store(cls, internal_id, *keys):
+        expires_at = time.monotonic() + cls.TTL_SECONDS
+        with cls._lock:
+            for key in keys:
+                if not key:
+                    continue
+                cls._cache[str(key)] = (internal_id, expires_at)
+                cls._cache.move_to_end(str(key))
+            while len(cls._cache) > cls.MAX_ENTRIES:
+                cls._cache.popitem(last=False)
+
+    @classmethod
+    def lookup_query(cls, user_id):
+        """(id, google_id) of the user matching a Supabase id or internal id, Supabase ids first"""
+        user_id = str(user_id)
+        as_uuid = cls._as_uuid(user_id)
+        if as_uuid is not None:
+            match = db.or_(User.google_id == user_id, User.id == as_uuid)
+        else:
+            match = User.google_id == user_id
+        return db.select(User.id, User.google_id).where(match).order_by(
+            (User.google_id == user_id).desc()
+        ).limit(1)
+
+    @classmethod
+    def resolve(cls, user_id, create=False):
+        """
+        Return the internal user UUID for a Supabase/Google id or an internal id.
+
+        Supabase ids (stored in google_id) take precedence over internal ids, as in the
+        original per-route lookups. Both are checked in a single query. With create=True
+        a placeholder user is created for unknown Supabase ids. Returns None if not found.
+        """
+        if not user_id:
+            return None
+        user_id = str(user_id)
+
+        cached = cls._get_cached(user_id)
+        if cached is not None:
+            return cached
+
+        row = db.session.execute(cls.lookup_query(user_id)).first()
+
+        if row is None:
+            if not create:
+                return None
+            # Create a new user automatically for Supabase Auth users
+            return cls.provision(user_id).id
+
+        internal_id, google_id = row
+        cls._store(internal_id, user_id, internal_id, google_id)
+        return internal_id
+
+    @classmethod
+    def provision(cls, google_id, email=None, first_name=None, last_name=None):
+        """
+        Find or create the user for a Supabase id in a single INSERT ... ON CONFLICT (google_id) statement.
+
+        An existing account with the same email (e.g. an email/password signup) is linked to the
+        Supabase id instead of creating a second user. Concurrent first logins converge on one row;
+        the rare race that trips the email constraint instead is retried once. Returns a row with
+        id, email, first_name, last_name, google_id and created.
+        """
+        params = {
+            'google_id': str(google_id),
+            'email': email or None,
+            'placeholder_email': f"user_{str(google_id)[:8]}@temp.com",
+            'first_name': first_name or "",
+            'last_name': last_name or "",
+        }
+        for attempt in range(2):
+            try:
+                row = db.session.execute(PROVISION_USER_SQL, dict(params, new_id=uuid.uuid4())).one()
+                db.session.commit()
+                break
+            except IntegrityError:
+                db.session.rollback()
+                if attempt:
+                    raise
+
+        if row.created:
+            logging.info(f"Provisioned new user {row.id} for Supabase user {google_id}")
+        cls.invalidate(row.id, google_id)
+        cls._store(row.id, google_id, row.id)
+        return row
+
+    @classmethod
+    def invalidate(cls, *keys):
+        """Drop cached mappings for the given ids, and every other key pointing at the same user"""
+        with cls._lock:
+            targets = {str(key) for key in keys if key}
+            internal_ids = {cls._cache[key][0] for key in targets if key in cls._cache}
+            internal_ids.update(cls._as_uuid(key) for key in targets)
+            for key in [k for k, (internal_id, _) in cls._cache.items()
+                        if k in targets or internal_id in internal_ids]:
+                del cls._cache[key]
+        logging.debug(f"Invalidated user resolver cache for {sorted(targets)}")
+
+    @classmethod
+    def clear(cls):
+        """Drop every cached mapping"""
+        with cls._lock:
+            cls._cache.clear()
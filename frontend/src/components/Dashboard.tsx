@@ -26,6 +26,7 @@ interface Invoice {
   client_name: string;
   client_email: string;
   amount: number;
+  currency?: string;
   status: 'draft' | 'sent' | 'paid' | 'overdue';
   created_date: string;
   due_date: string;
@@ -40,6 +41,11 @@ interface DashboardStats {
   paid_invoices: number;
   overdue_invoices: number;
   monthly_growth: number;
+  // total_revenue and pending_amount are in reporting_currency; by_currency holds the unconverted sums
+  reporting_currency?: string;
+  fx_version?: string | null;
+  by_currency?: Record<string, { invoices: number; total_revenue: number; pending_amount: number }>;
+  unconverted_currencies?: string[];
 }
 
 interface DashboardData {
@@ -102,10 +108,10 @@ const Dashboard: React.FC = () => {
     }
   };
 
-  const formatCurrency = (amount: number) => {
+  const formatCurrency = (amount: number, currency: string = 'USD') => {
     return new Intl.NumberFormat('en-US', {
       style: 'currency',
-      currency: 'USD',
+      currency,
     }).format(amount);
   };
 
@@ -221,14 +227,14 @@ const Dashboard: React.FC = () => {
         <div className="grid grid-cols-1 md:grid-cols-2 lg:grid-cols-4 gap-6 mb-8">
           <StatCard
             title="Total Revenue"
-            value={formatCurrency(dashboardData.stats.total_revenue)}
+            value={formatCurrency(dashboardData.stats.total_revenue, dashboardData.stats.reporting_currency)}
             icon={DollarSign}
             trend={`+${dashboardData.stats.monthly_growth}% from last month`}
             color="from-green-500 to-green-600"
           />
           <StatCard
             title="Pending Amount"
-            value={formatCurrency(dashboardData.stats.pending_amount)}
+            value={formatCurrency(dashboardData.stats.pending_amount, dashboardData.stats.reporting_currency)}
             icon={Clock}
             color="from-yellow-500 to-yellow-600"
           />
@@ -331,7 +337,7 @@ const Dashboard: React.FC = () => {
                       <div className="text-sm text-gray-500">{invoice.client_email}</div>
                     </td>
                     <td className="py-4 px-6">
-                      <div className="font-medium text-gray-900">{formatCurrency(invoice.amount)}</div>
+                      <div className="font-medium text-gray-900">{formatCurrency(invoice.amount, invoice.currency)}</div>
                     </td>
                     <td className="py-4 px-6">
                       <span className={`inline-flex items-center px-2.5 py-0.5 rounded-full text-xs font-medium ${getStatusColor(invoice.status)}`}>